@@ -1,28 +1,220 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog, messagebox, simpledialog
+import tkinter.font as tkfont
+import importlib.util
 import math
+from bisect import bisect_left, bisect_right
+import sys
+import types
 import uuid
-import copy # For deep copying states
-import json
-from collections import defaultdict
-
-try:
-    from PIL import ImageGrab, Image, ImageDraw, ImageFont
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
+from collections import Counter, defaultdict, deque
+from functools import lru_cache, partial
+from itertools import repeat
+from operator import itemgetter
+
+# Pillow is only needed for image export, so it is imported on first use (see _ensure_pil)
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+Image = ImageDraw = ImageFont = None
+if not PIL_AVAILABLE:
     print("Pillow library not found. Export to image feature will be disabled.")
     print("Install Pillow with: pip install Pillow")
 
+def _ensure_pil():
+    """Imports Pillow's Image, ImageDraw and ImageFont on first call. Returns False if Pillow can't be loaded."""
+    global PIL_AVAILABLE, Image, ImageDraw, ImageFont
+    if PIL_AVAILABLE and Image is None:
+        try:
+            from PIL import Image as pil_image, ImageDraw as pil_image_draw, ImageFont as pil_image_font
+            Image, ImageDraw, ImageFont = pil_image, pil_image_draw, pil_image_font
+        except ImportError:
+            PIL_AVAILABLE = False
+    return PIL_AVAILABLE
+
+@lru_cache(maxsize=64)
+def _rotation_sin_cos(angle_deg):
+    """
+    (sin, cos) of angle_deg, exact for quarter turns so axis-aligned racks get no floating-point noise and no trig calls.
+    Rack angles come from the few ROTATION_DEGREES steps, so each pair is computed once and then shared by every caller.
+    """
+    quarter_turns, remainder = divmod(angle_deg, 90)
+    if remainder == 0: return ((0, 1), (1, 0), (0, -1), (-1, 0))[int(quarter_turns) % 4]
+    angle_rad = math.radians(angle_deg)
+    return math.sin(angle_rad), math.cos(angle_rad)
+
+@lru_cache(maxsize=64)
+def _square_corner_offsets(half_size, angle_deg):
+    """Flat (dx0, dy0, ..., dx3, dy3) of a square's corners about its center, rotated by angle_deg; shared by a rack's tubes."""
+    sin_a, cos_a = _rotation_sin_cos(angle_deg)
+    # Each corner is the previous one turned a quarter, (x, y) -> (-y, x), which commutes with the rotation: only the
+    # first corner is multiplied out, the other three are exact sign/swap copies of it
+    dx, dy = -half_size * cos_a + half_size * sin_a, -half_size * sin_a - half_size * cos_a
+    return (dx, dy, -dy, dx, -dx, -dy, dy, -dx)
+
+def _grid_rotation_matrix(angle, cols, rows):
+    """
+    Returns ((a, b, c), (d, e, f)) such that an original (col, row) cell of a cols x rows grid lands at
+    visual_col = a*col + b*row + c, visual_row = d*col + e*row + f when the rack is shown rotated by angle.
+    Works for Crate (columns x rows) and Fan (segments x tubes per segment) alike.
+    """
+    if angle == 90: return ((0, 1, 0), (-1, 0, cols - 1))
+    if angle == 180: return ((-1, 0, cols - 1), (0, -1, rows - 1))
+    if angle == 270: return ((0, -1, rows - 1), (1, 0, 0))
+    return ((1, 0, 0), (0, 1, 0)) # 0 degrees (and fallback)
+
+def _dialog_tube_steps(rack_type, angle, tube_size, spacing, seg_spacing):
+    """Returns (step_x, step_y): distance between neighbouring tube origins along each dialog axis."""
+    if rack_type == "Fan":
+        if angle == 90 or angle == 270: # Original segments now run along the dialog rows
+            return tube_size + spacing, tube_size + seg_spacing
+        return tube_size + seg_spacing, tube_size + spacing
+    return tube_size + spacing, tube_size + spacing
+
+def _compute_tube_positions(rack_type, cols, rows, angle, tube_size, spacing, seg_spacing, padding):
+    """
+    Returns (xs, ys): top-left dialog coordinates of every tube, indexed like rack_config['tubes'].
+    The rotation case is resolved once up front, and each coordinate is the sum of a per-column and a
+    per-row offset, so the per-tube work is two additions.
+    """
+    (a, b, c), (d, e, f) = _grid_rotation_matrix(angle, cols, rows)
+    step_x, step_y = _dialog_tube_steps(rack_type, angle, tube_size, spacing, seg_spacing)
+
+    # Offset tables: O(cols + rows) multiplications instead of per-tube div/mod and products
+    x_from_col = [padding + (a * col + c) * step_x for col in range(cols)]
+    y_from_col = [padding + (d * col + f) * step_y for col in range(cols)]
+    x_from_row = [b * row * step_x for row in range(rows)]
+    y_from_row = [e * row * step_y for row in range(rows)]
+
+    if rack_type == "Fan": # Segment-major: tube index = segment * rows + tube within segment
+        xs = [x_from_col[col] + x_from_row[row] for col in range(cols) for row in range(rows)]
+        ys = [y_from_col[col] + y_from_row[row] for col in range(cols) for row in range(rows)]
+    else: # Row-major: tube index = row * cols + col
+        xs = [x_from_col[col] + x_from_row[row] for row in range(rows) for col in range(cols)]
+        ys = [y_from_col[col] + y_from_row[row] for row in range(rows) for col in range(cols)]
+    return xs, ys
+
+def _grid_cell_to_tube_index(rack_type, cols, rows, angle, visual_col, visual_row):
+    """
+    Inverse of the dialog layout: maps a dialog (col, row) cell back to the tube index, or None if the
+    cell is outside the rack. The rotation matrix is orthogonal, so its inverse is the transpose.
+    """
+    (a, b, c), (d, e, f) = _grid_rotation_matrix(angle, cols, rows)
+    col = a * (visual_col - c) + d * (visual_row - f)
+    row = b * (visual_col - c) + e * (visual_row - f)
+    if not (0 <= col < cols and 0 <= row < rows): return None
+    return col * rows + row if rack_type == "Fan" else row * cols + col # Fan tubes are segment-major
+
+def _clone_tubes(tubes):
+    """Copies a rack's tube list. Tubes are flat dicts of primitives, so one dict() each is enough (no deepcopy)."""
+    return [dict(t) for t in tubes]
+
+def _tube_visuals(tubes):
+    """(color, type, cue) per tube, the only tube fields drawing reads, pulled out of the tube dicts in one pass."""
+    return [(t['color'], t.get('type', "Standard"), t.get('cue', '')) for t in tubes]
+
+def _clone_rack(rack):
+    """Copies a rack config for the undo history: a dict() of its own plus copies of its tubes, the only nested data edited in place."""
+    clone = dict(rack)
+    if 'tubes' in clone: clone['tubes'] = _clone_tubes(clone['tubes'])
+    return clone
+
+def _share_unchanged(items, previous_items, clone):
+    """
+    History copies of a list of id'd dicts: an item equal to the one with its id in previous_items (an earlier snapshot,
+    never modified) reuses that copy, anything else is clone()d. Memory per history entry grows with what changed.
+    """
+    previous_by_id = {item['id']: item for item in previous_items}
+    copies = []
+    for item in items:
+        previous_item = previous_by_id.get(item['id'])
+        copies.append(previous_item if previous_item is not None and previous_item == item else clone(item))
+    return copies
+
+def _is_axis_aligned_quad(points):
+    """True if the 4 points close into a rectangle whose edges are exactly horizontal or vertical (e.g. a rack at 0/90/180/270)."""
+    return len(points) == 4 and all(p[0] == q[0] or p[1] == q[1] for p, q in zip(points, points[1:] + points[:1]))
+
+def _point_in_polygon(x_w, y_w, poly_v_w):
+    """Even-odd ray cast: True if the world point is inside the polygon given as a list of (x, y) world vertices."""
+    if len(poly_v_w) < 3: return False
+    ins = False; p1x_w, p1y_w = poly_v_w[-1] # Start on the closing edge, so each edge is visited once without i%nv
+    for p2x_w, p2y_w in poly_v_w:
+        # Edge straddles the ray's y (min < y <= max, so never horizontal) and starts left of the point's right
+        if (p1y_w < y_w) != (p2y_w < y_w) and (x_w <= p1x_w or x_w <= p2x_w):
+            if p1x_w == p2x_w or x_w <= (y_w - p1y_w) * (p2x_w - p1x_w) / (p2y_w - p1y_w) + p1x_w: ins = not ins
+        p1x_w, p1y_w = p2x_w, p2y_w
+    return ins
+
+def _rows_out_of_order(wanted_ids, shown_ids):
+    """
+    Set of wanted_ids that must be moved for rows shown as shown_ids to end up in wanted_ids order: every id except
+    a longest run already in the right relative order (found with the O(n log n) patience method), plus unshown ids.
+    """
+    shown_pos = {iid: pos for pos, iid in enumerate(shown_ids)}
+    tails = []; tail_ids = []; previous_id = {}
+    for iid in wanted_ids:
+        pos = shown_pos.get(iid)
+        if pos is None: continue
+        k = bisect_left(tails, pos)
+        previous_id[iid] = tail_ids[k - 1] if k else None
+        if k == len(tails): tails.append(pos); tail_ids.append(iid)
+        else: tails[k] = pos; tail_ids[k] = iid
+    in_order = set(); iid = tail_ids[-1] if tail_ids else None
+    while iid is not None: in_order.add(iid); iid = previous_id[iid]
+    return set(wanted_ids).difference(in_order)
+
+_tube_color_of = itemgetter('color') # C-level key extraction for counting tube colors
+
+def _set_var_if_changed(var, value):
+    """Sets a Tk variable only if it does not already hold value, sparing the write traces and widget refresh of a no-op set."""
+    try:
+        if var.get() == value: return
+    except (tk.TclError, ValueError): pass # e.g. an IntVar showing "---"
+    var.set(value)
+
+def _center_dialog_on_parent(dialog, parent):
+    """
+    Sizes a dialog to its requested size (capped at 90% of the parent) and centers it over the parent
+    with a single layout pass and a single geometry call.
+    """
+    dialog.update_idletasks()
+    parent_width = parent.winfo_width()
+    parent_height = parent.winfo_height()
+    dialog_width = min(dialog.winfo_reqwidth(), int(parent_width * 0.9))
+    dialog_height = min(dialog.winfo_reqheight(), int(parent_height * 0.9))
+    x_pos = parent.winfo_rootx() + (parent_width - dialog_width) // 2
+    y_pos = parent.winfo_rooty() + (parent_height - dialog_height) // 2
+    dialog.geometry(f"{dialog_width}x{dialog_height}+{x_pos}+{y_pos}")
+
 class ToolTip:
+    # All tooltipped widgets share one bindtag whose class bindings are registered once,
+    # instead of three Tcl bindings per widget. Each widget keeps a reference to its ToolTip.
+    BINDTAG = "Tooltipped"
+    _class_bindings_registered = False
+
     def __init__(self, widget, text):
         self.widget = widget
         self.text = text
         self.tooltip_window = None
-        self.widget.bind("<Enter>", self.show_tooltip)
-        self.widget.bind("<Leave>", self.hide_tooltip)
-        self.widget.bind("<ButtonPress>", self.hide_tooltip)
+        widget._tooltip = self
+        if not ToolTip._class_bindings_registered:
+            widget.bind_class(self.BINDTAG, "<Enter>", ToolTip._class_show)
+            widget.bind_class(self.BINDTAG, "<Leave>", ToolTip._class_hide)
+            widget.bind_class(self.BINDTAG, "<ButtonPress>", ToolTip._class_hide)
+            ToolTip._class_bindings_registered = True
+        current_bindtags = widget.bindtags()
+        if self.BINDTAG not in current_bindtags:
+            widget.bindtags(current_bindtags + (self.BINDTAG,))
+
+    @staticmethod
+    def _class_show(event):
+        tooltip = getattr(event.widget, '_tooltip', None)
+        if tooltip: tooltip.show_tooltip(event)
+
+    @staticmethod
+    def _class_hide(event):
+        tooltip = getattr(event.widget, '_tooltip', None)
+        if tooltip: tooltip.hide_tooltip(event)
 
     def show_tooltip(self, event=None):
         if self.tooltip_window or not self.text:
@@ -50,6 +242,9 @@ class TubeRecolorDialog(tk.Toplevel):
     """
     Dialog window for individually recoloring tubes of a selected rack.
     """
+    _OUTLINE_SEL = ("blue", 2) # (outline color, width) for selected tubes
+    _OUTLINE_UNSEL = ("grey", 1)
+
     def __init__(self, parent, rack_config_original, planner_instance, visual_rotation_angle, 
                  global_start_tube_number_for_rack=0, use_global_numbering_in_dialog=False):
         super().__init__(parent)
@@ -62,7 +257,7 @@ class TubeRecolorDialog(tk.Toplevel):
         self.global_start_tube_number_for_rack = global_start_tube_number_for_rack
         self.use_global_numbering_in_dialog = use_global_numbering_in_dialog
 
-        self.current_tubes_data_copy = copy.deepcopy(rack_config_original['tubes'])
+        self.current_tubes_data_copy = _clone_tubes(rack_config_original['tubes'])
         self.num_tubes = len(self.current_tubes_data_copy)
         self.selected_indices_in_dialog = set() 
         self.tube_canvas_mapping = {} 
@@ -80,32 +275,7 @@ class TubeRecolorDialog(tk.Toplevel):
         self._setup_widgets()
         self._draw_tubes_on_dialog_canvas_initial() 
 
-        self.update_idletasks() 
-        parent_x = parent.winfo_rootx()
-        parent_y = parent.winfo_rooty()
-        parent_width = parent.winfo_width()
-        parent_height = parent.winfo_height()
-
-        dialog_width = self.winfo_width()
-        dialog_height = self.winfo_height()
-
-        max_dialog_width = parent_width * 0.9
-        max_dialog_height = parent_height * 0.9
-
-        if dialog_width > max_dialog_width:
-            dialog_width = int(max_dialog_width)
-        if dialog_height > max_dialog_height:
-            dialog_height = int(max_dialog_height)
-        
-        self.geometry(f"{dialog_width}x{dialog_height}")
-        self.update_idletasks() 
-
-        current_dialog_width = self.winfo_width()
-        current_dialog_height = self.winfo_height()
-
-        x_pos = parent_x + (parent_width - current_dialog_width) // 2
-        y_pos = parent_y + (parent_height - current_dialog_height) // 2
-        self.geometry(f"+{x_pos}+{y_pos}")
+        _center_dialog_on_parent(self, parent)
 
 
     def _setup_widgets(self):
@@ -129,6 +299,7 @@ class TubeRecolorDialog(tk.Toplevel):
         canvas_outer_frame.pack(expand=True, fill=tk.BOTH, pady=5)
         self.tubes_canvas = tk.Canvas(canvas_outer_frame, bg="white", highlightthickness=0)
         self.tubes_canvas.pack(side=tk.LEFT, expand=True, fill=tk.BOTH, padx=2, pady=2) 
+        self.tubes_canvas.bind("<Button-1>", self._on_tubes_canvas_click) # One binding for every tube; see _click_to_idx
         ToolTip(self.tubes_canvas, "Click on tubes to select/deselect them for recoloring.")
 
         action_buttons_frame = ttk.Frame(main_frame, padding="5")
@@ -155,14 +326,6 @@ class TubeRecolorDialog(tk.Toplevel):
         cancel_btn.grid(row=0, column=2, padx=5)
         ToolTip(cancel_btn, "Close this dialog without applying any changes.")
 
-    def _update_tube_visual(self, tube_idx):
-        if tube_idx in self.tube_canvas_mapping:
-            rect_id, _ = self.tube_canvas_mapping[tube_idx]
-            fill_color = self.current_tubes_data_copy[tube_idx]['color'] 
-            outline_color = "blue" if tube_idx in self.selected_indices_in_dialog else "grey"
-            outline_width = 2 if tube_idx in self.selected_indices_in_dialog else 1
-            self.tubes_canvas.itemconfig(rect_id, fill=fill_color, outline=outline_color, width=outline_width)
-
     def _draw_tubes_on_dialog_canvas_initial(self):
         self.tubes_canvas.delete("all")
         self.tube_canvas_mapping.clear()
@@ -171,96 +334,34 @@ class TubeRecolorDialog(tk.Toplevel):
         original_configured_rows = self.rack_config_original['y_tubes'] 
         rack_type = self.rack_config_original['type']
 
-        if rack_type == "Crate":
-            if self.visual_rotation_angle == 90 or self.visual_rotation_angle == 270:
-                dialog_display_cols = original_configured_rows 
-                dialog_display_rows = original_configured_cols
-            else: # 0 or 180
-                dialog_display_cols = original_configured_cols
-                dialog_display_rows = original_configured_rows
-            canvas_width = (2 * self._padding + dialog_display_cols * (self._tube_size + self._spacing) - self._spacing)
-            canvas_height = (2 * self._padding + dialog_display_rows * (self._tube_size + self._spacing) - self._spacing)
+        is_rotated_90 = self.visual_rotation_angle in (90, 270) # Dialog columns and rows swap at 90/270
+        padding, tube_size, text_offset = self._padding, self._tube_size, self._text_offset
+        step_x, step_y = _dialog_tube_steps(rack_type, self.visual_rotation_angle, tube_size, self._spacing, self._segment_visual_spacing)
+        self._step_x, self._step_y = step_x, step_y
+        self._grid_shape = (rack_type, original_configured_cols, original_configured_rows, self.visual_rotation_angle) # For _click_to_idx
+
+        # For Fans the original columns are segments and the rows are tubes per segment
+        if is_rotated_90: dialog_display_cols, dialog_display_rows = original_configured_rows, original_configured_cols
+        else: dialog_display_cols, dialog_display_rows = original_configured_cols, original_configured_rows
+        # n tubes plus (n - 1) gaps per axis; a gap is the tube spacing or, across Fan segments, the segment spacing
+        canvas_width = 2 * padding + dialog_display_cols * tube_size + max(0, dialog_display_cols - 1) * (step_x - tube_size)
+        canvas_height = 2 * padding + dialog_display_rows * tube_size + max(0, dialog_display_rows - 1) * (step_y - tube_size)
 
-        elif rack_type == "Fan":
-            num_fans_original = original_configured_cols
-            tubes_per_fan_original = original_configured_rows
-
-            if self.visual_rotation_angle == 90 or self.visual_rotation_angle == 270:
-                dialog_display_cols = tubes_per_fan_original
-                dialog_display_rows = num_fans_original
-                # Width is based on tubes_per_fan (new columns), height on num_fans (new rows)
-                canvas_width = (2 * self._padding + dialog_display_cols * self._tube_size +
-                                    max(0, dialog_display_cols - 1) * self._spacing) # Spacing between tubes
-                canvas_height = (2 * self._padding + dialog_display_rows * self._tube_size +
-                                     max(0, dialog_display_rows - 1) * self._segment_visual_spacing) # Spacing between original segments (now rows)
-            else: # 0 or 180 degrees
-                dialog_display_cols = num_fans_original
-                dialog_display_rows = tubes_per_fan_original
-                canvas_width = (2 * self._padding + dialog_display_cols * self._tube_size +
-                                    max(0, dialog_display_cols - 1) * self._segment_visual_spacing) # Spacing between segments
-                canvas_height = (2 * self._padding + dialog_display_rows * self._tube_size +
-                                max(0, dialog_display_rows - 1) * self._spacing) # Spacing between tubes vertically
-        
         self.tubes_canvas.config(width=max(150, canvas_width), height=max(80, canvas_height)) 
 
-        for i in range(self.num_tubes):
-            original_col_idx = i % original_configured_cols
-            original_row_idx = i // original_configured_cols 
-
-            clickable_group_tag = f"clickable_tube_area_{i}" 
-
-            if rack_type == "Crate":
-                if self.visual_rotation_angle == 0: 
-                    dialog_visual_col = original_col_idx
-                    dialog_visual_row = original_row_idx
-                elif self.visual_rotation_angle == 90: 
-                    dialog_visual_col = original_row_idx 
-                    dialog_visual_row = original_configured_cols - 1 - original_col_idx
-                elif self.visual_rotation_angle == 180: 
-                    dialog_visual_col = original_configured_cols - 1 - original_col_idx
-                    dialog_visual_row = original_configured_rows - 1 - original_row_idx
-                elif self.visual_rotation_angle == 270: 
-                    dialog_visual_col = original_configured_rows - 1 - original_row_idx
-                    dialog_visual_row = original_col_idx
-                
-                x1 = self._padding + dialog_visual_col * (self._tube_size + self._spacing)
-                y1 = self._padding + dialog_visual_row * (self._tube_size + self._spacing)
-
-            elif rack_type == "Fan":
-                num_fans = original_configured_cols
-                tubes_per_fan = original_configured_rows
-                segment_idx = i // tubes_per_fan 
-                tube_in_segment_idx = i % tubes_per_fan
-                
-                # Determine visual column and row based on rotation
-                if self.visual_rotation_angle == 0:
-                    dialog_visual_col = segment_idx
-                    dialog_visual_row = tube_in_segment_idx
-                elif self.visual_rotation_angle == 90:
-                    dialog_visual_col = tube_in_segment_idx
-                    dialog_visual_row = num_fans - 1 - segment_idx
-                elif self.visual_rotation_angle == 180:
-                    dialog_visual_col = num_fans - 1 - segment_idx
-                    dialog_visual_row = tubes_per_fan - 1 - tube_in_segment_idx
-                elif self.visual_rotation_angle == 270:
-                    dialog_visual_col = tubes_per_fan - 1 - tube_in_segment_idx
-                    dialog_visual_row = segment_idx
-                else: # Default to 0 degree orientation
-                    dialog_visual_col = segment_idx
-                    dialog_visual_row = tube_in_segment_idx
-                
-                # Determine x1, y1 based on the *dialog's* display columns/rows and appropriate spacing
-                if self.visual_rotation_angle == 90 or self.visual_rotation_angle == 270:
-                    # When rotated, the "columns" in the dialog are tubes_per_fan, "rows" are num_fans
-                    x1 = self._padding + dialog_visual_col * (self._tube_size + self._spacing) # Spacing between tubes
-                    y1 = self._padding + dialog_visual_row * (self._tube_size + self._segment_visual_spacing) # Spacing between original segments
-                else: # 0 or 180
-                    x1 = self._padding + dialog_visual_col * (self._tube_size + self._segment_visual_spacing)
-                    y1 = self._padding + dialog_visual_row * (self._tube_size + self._spacing)
-
-            x2 = x1 + self._tube_size
-            y2 = y1 + self._tube_size
-            color_val = self.current_tubes_data_copy[i]['color'] 
+        # Layout only depends on the rack shape, rotation and the dialog's fixed sizes, so reopening a dialog reuses it
+        geom_key = (rack_type, original_configured_cols, original_configured_rows, self.visual_rotation_angle,
+                    self._tube_size, self._spacing, self._segment_visual_spacing, self._padding)
+        tube_positions = self.planner._tube_geom_cache.get(geom_key)
+        if tube_positions is None:
+            tube_positions = _compute_tube_positions(*geom_key)
+            self.planner._tube_geom_cache[geom_key] = tube_positions
+        xs, ys = tube_positions
+        tube_font = self.planner._get_tube_font(self._font_size) # Shared Font object instead of a tuple per create_text
+        for i, x1, y1 in zip(range(self.num_tubes), xs, ys): # A loaded rack may hold fewer tubes than grid cells
+            x2 = x1 + tube_size
+            y2 = y1 + tube_size
+            color_val = self.current_tubes_data_copy[i]['color']
 
             if self.use_global_numbering_in_dialog:
                 # Display the global number based on the original tube index 'i'
@@ -268,20 +369,42 @@ class TubeRecolorDialog(tk.Toplevel):
             else:
                 display_tube_number = str(i + 1)
 
-            rect_id = self.tubes_canvas.create_rectangle(x1, y1, x2, y2, fill=color_val, outline="grey", width=1, tags=(f"rect_for_tube_{i}", clickable_group_tag))
-            text_id = self.tubes_canvas.create_text(x1 + self._text_offset, y1 + self._text_offset, text=display_tube_number, fill="black", tags=(f"text_for_tube_{i}", clickable_group_tag), font=("Arial", self._font_size))
+            # Only per-tube options go on the create calls; shared outline and font are set by tag below.
+            # Text is created after its rectangle, so it already sits on top without a tag_raise.
+            rect_id = self.tubes_canvas.create_rectangle(x1, y1, x2, y2, fill=color_val, tags=(f"rect_for_tube_{i}", "all_rects"))
+            text_id = self.tubes_canvas.create_text(x1 + text_offset, y1 + text_offset, text=display_tube_number, tags=(f"text_for_tube_{i}", "all_texts"))
 
             self.tube_canvas_mapping[i] = (rect_id, text_id)
-            self.tubes_canvas.tag_raise(text_id, rect_id) 
-            self.tubes_canvas.tag_bind(clickable_group_tag, "<Button-1>", lambda e, idx=i: self._handle_specific_tube_click(idx))
-            self._update_tube_visual(i) 
+        # Nothing is selected yet, so every tube starts with the grey outline
+        unsel_outline, unsel_width = self._OUTLINE_UNSEL
+        self.tubes_canvas.itemconfig("all_rects", outline=unsel_outline, width=unsel_width)
+        self.tubes_canvas.itemconfig("all_texts", fill="black", font=tube_font)
+
+    def _on_tubes_canvas_click(self, event):
+        tube_idx = self._click_to_idx(event.x, event.y)
+        if tube_idx is not None:
+            self._handle_specific_tube_click(tube_idx)
+
+    def _click_to_idx(self, x, y):
+        """Resolves a click to a tube index by inverting the grid layout; None for gaps and empty space."""
+        visual_col, x_in_cell = divmod(x - self._padding, self._step_x)
+        visual_row, y_in_cell = divmod(y - self._padding, self._step_y)
+        if x_in_cell > self._tube_size or y_in_cell > self._tube_size: return None # In the gap between tubes
+        tube_idx = _grid_cell_to_tube_index(*self._grid_shape, visual_col, visual_row)
+        return tube_idx if tube_idx is not None and tube_idx < self.num_tubes else None # Cells past a short tube list are empty
 
     def _handle_specific_tube_click(self, tube_idx):
+        rect_id = self.tube_canvas_mapping[tube_idx][0]
         if tube_idx in self.selected_indices_in_dialog:
             self.selected_indices_in_dialog.remove(tube_idx)
+            self.tubes_canvas.dtag(rect_id, "selected")
+            outline_color, outline_width = self._OUTLINE_UNSEL
         else:
             self.selected_indices_in_dialog.add(tube_idx)
-        self._update_tube_visual(tube_idx)
+            self.tubes_canvas.addtag_withtag("selected", rect_id)
+            outline_color, outline_width = self._OUTLINE_SEL
+        # Selection only changes the outline; fills are updated through the "selected" tag when a color is applied
+        self.tubes_canvas.itemconfig(rect_id, outline=outline_color, width=outline_width)
 
     def _apply_color_to_selected_dialog_tubes(self):
         selected_color_name = self.color_var.get()
@@ -293,35 +416,40 @@ class TubeRecolorDialog(tk.Toplevel):
             messagebox.showinfo("No Tubes Selected", "Please select one or more tubes in the diagram to apply color.", parent=self)
             return
 
-        for idx in list(self.selected_indices_in_dialog): 
-            self.current_tubes_data_copy[idx]['color'] = actual_color 
-            self._update_tube_visual(idx) 
+        for idx in self.selected_indices_in_dialog:
+            self.current_tubes_data_copy[idx]['color'] = actual_color
+        self.tubes_canvas.itemconfig("selected", fill=actual_color) # Selected rects carry the "selected" tag
 
     def _select_all_tubes(self):
-        for i in range(self.num_tubes):
-            is_newly_selected = i not in self.selected_indices_in_dialog
-            self.selected_indices_in_dialog.add(i)
-            if is_newly_selected: 
-                 self._update_tube_visual(i)    
+        self.selected_indices_in_dialog = set(range(self.num_tubes))
+        self.tubes_canvas.addtag_withtag("selected", "all_rects")
+        outline_color, outline_width = self._OUTLINE_SEL
+        self.tubes_canvas.itemconfig("all_rects", outline=outline_color, width=outline_width) # One call for every tube outline
 
     def _deselect_all_tubes(self):
-        currently_selected = list(self.selected_indices_in_dialog) 
         self.selected_indices_in_dialog.clear()
-        for i in currently_selected: 
-            self._update_tube_visual(i)
+        self.tubes_canvas.dtag("all_rects", "selected")
+        outline_color, outline_width = self._OUTLINE_UNSEL
+        self.tubes_canvas.itemconfig("all_rects", outline=outline_color, width=outline_width)
 
     def _confirm_changes(self):
-        self.rack_config_original['tubes'] = copy.deepcopy(self.current_tubes_data_copy)
-        self.planner._update_canvas_summary_info() 
-        self.planner.redraw_canvas() 
+        # The dialog is closing, so hand its working list over to the rack instead of copying it
+        self.rack_config_original['tubes'] = self.current_tubes_data_copy
+        self.current_tubes_data_copy = None
         self.planner.status_var.set(f"Tube colors updated for rack ...{self.rack_config_original['id'][-6:]}.")
-        self.planner._update_ui_for_selection_state() 
+        self.planner.schedule_redraw(refresh_selection_ui=True) # Redraw, summary and side panel in one idle pass
         self.destroy() 
 
 class TubeTypeDialog(tk.Toplevel):
     """
     Dialog window for individually editing firework types of tubes in a rack.
     """
+    _OUTLINE_SEL = ("blue", 2) # (outline color, width) for selected tubes
+    _OUTLINE_UNSEL = ("grey", 1) # Standard and unknown types
+    # Define available firework types
+    # Ensure "Standard" or a similar default is present
+    FIREWORK_TYPE_CHOICES = ("Whistling Tail", "Tiger Tail", "Ring", "Nishiki", "Standard")  # Add your types here
+
     def __init__(self, parent, rack_config_original, planner_instance, visual_rotation_angle):
         super().__init__(parent)
         self.transient(parent)
@@ -331,7 +459,7 @@ class TubeTypeDialog(tk.Toplevel):
         self.planner = planner_instance
         self.visual_rotation_angle = visual_rotation_angle
 
-        self.current_tubes_data_copy = copy.deepcopy(rack_config_original['tubes'])
+        self.current_tubes_data_copy = _clone_tubes(rack_config_original['tubes'])
         self.num_tubes = len(self.current_tubes_data_copy)
         self.selected_indices_in_dialog = set()
         self.tube_canvas_mapping = {}
@@ -348,40 +476,17 @@ class TubeTypeDialog(tk.Toplevel):
         # Define visual spacing for Fan racks, similar to TubeRecolorDialog
         self._segment_visual_spacing = 8 
 
-        # Define available firework types
-        # Ensure "Standard" or a similar default is present
-        self.FIREWORK_TYPE_CHOICES = ["Whistling Tail", "Tiger Tail", "Ring", "Nishiki", "Standard"]  # Add your types here
+        # Outline per type, taken from the planner's FIREWORK_TYPE_VISUALS so both views share one table.
+        # Emphasized types (width_factor > 1) get a 2px outline in their color; the rest use the default grey.
+        self._type_outlines = {tube_type: (visuals['outline'], 2) for tube_type, visuals in self.planner.FIREWORK_TYPE_VISUALS.items()
+                               if visuals['width_factor'] > 1.0}
+        # Canvas tag per emphasized type so their outlines can be re-issued with one itemconfig each
+        self._type_tags = {tube_type: "type_" + tube_type.replace(" ", "_") for tube_type in self._type_outlines}
 
         self._setup_widgets()
         self._draw_tubes_on_dialog_canvas_initial()
 
-        # ... (Rest of the __init__ method for dialog positioning - same as TubeRecolorDialog) ...
-        self.update_idletasks() 
-        parent_x = parent.winfo_rootx()
-        parent_y = parent.winfo_rooty()
-        parent_width = parent.winfo_width()
-        parent_height = parent.winfo_height()
-
-        dialog_width = self.winfo_width()
-        dialog_height = self.winfo_height()
-
-        max_dialog_width = parent_width * 0.9
-        max_dialog_height = parent_height * 0.9
-
-        if dialog_width > max_dialog_width:
-            dialog_width = int(max_dialog_width)
-        if dialog_height > max_dialog_height:
-            dialog_height = int(max_dialog_height)
-        
-        self.geometry(f"{dialog_width}x{dialog_height}")
-        self.update_idletasks() 
-
-        current_dialog_width = self.winfo_width()
-        current_dialog_height = self.winfo_height()
-
-        x_pos = parent_x + (parent_width - current_dialog_width) // 2
-        y_pos = parent_y + (parent_height - current_dialog_height) // 2
-        self.geometry(f"+{x_pos}+{y_pos}")
+        _center_dialog_on_parent(self, parent)
 
     def _setup_widgets(self):
         main_frame = ttk.Frame(self, padding="10")
@@ -402,6 +507,7 @@ class TubeTypeDialog(tk.Toplevel):
         canvas_outer_frame.pack(expand=True, fill=tk.BOTH, pady=5)
         self.tubes_canvas = tk.Canvas(canvas_outer_frame, bg="white", highlightthickness=0)
         self.tubes_canvas.pack(side=tk.LEFT, expand=True, fill=tk.BOTH, padx=2, pady=2) 
+        self.tubes_canvas.bind("<Button-1>", self._on_tubes_canvas_click) # One binding for every tube; see _click_to_idx
 
         action_buttons_frame = ttk.Frame(main_frame, padding="5")
         action_buttons_frame.pack(fill=tk.X, pady=(10, 0))
@@ -437,156 +543,125 @@ class TubeTypeDialog(tk.Toplevel):
         original_configured_rows = self.rack_config_original['y_tubes']
         rack_type = self.rack_config_original['type']
 
-        # Calculate canvas dimensions based on rack type and rotation (same logic as TubeRecolorDialog)
-        if rack_type == "Crate":
-            if self.visual_rotation_angle == 90 or self.visual_rotation_angle == 270:
-                dialog_display_cols = original_configured_rows
-                dialog_display_rows = original_configured_cols
-            else: # 0 or 180
-                dialog_display_cols = original_configured_cols
-                dialog_display_rows = original_configured_rows
-            canvas_width = (2 * self._padding + dialog_display_cols * (self._tube_size + self._spacing) - self._spacing)
-            canvas_height = (2 * self._padding + dialog_display_rows * (self._tube_size + self._spacing) - self._spacing)
-        elif rack_type == "Fan":
-            num_fans_original = original_configured_cols
-            tubes_per_fan_original = original_configured_rows
-            if self.visual_rotation_angle == 90 or self.visual_rotation_angle == 270:
-                dialog_display_cols = tubes_per_fan_original
-                dialog_display_rows = num_fans_original
-                canvas_width = (2 * self._padding + dialog_display_cols * self._tube_size +
-                                    max(0, dialog_display_cols - 1) * self._spacing)
-                canvas_height = (2 * self._padding + dialog_display_rows * self._tube_size +
-                                     max(0, dialog_display_rows - 1) * self._segment_visual_spacing)
-            else: # 0 or 180 degrees
-                dialog_display_cols = num_fans_original
-                dialog_display_rows = tubes_per_fan_original
-                canvas_width = (2 * self._padding + dialog_display_cols * self._tube_size +
-                                    max(0, dialog_display_cols - 1) * self._segment_visual_spacing)
-                canvas_height = (2 * self._padding + dialog_display_rows * self._tube_size +
-                                max(0, dialog_display_rows - 1) * self._spacing)
-        
+        is_rotated_90 = self.visual_rotation_angle in (90, 270) # Dialog columns and rows swap at 90/270
+        padding, tube_size, text_offset = self._padding, self._tube_size, self._text_offset
+        step_x, step_y = _dialog_tube_steps(rack_type, self.visual_rotation_angle, tube_size, self._spacing, self._segment_visual_spacing)
+        self._step_x, self._step_y = step_x, step_y
+        self._grid_shape = (rack_type, original_configured_cols, original_configured_rows, self.visual_rotation_angle) # For _click_to_idx
+
+        # For Fans the original columns are segments and the rows are tubes per segment
+        if is_rotated_90: dialog_display_cols, dialog_display_rows = original_configured_rows, original_configured_cols
+        else: dialog_display_cols, dialog_display_rows = original_configured_cols, original_configured_rows
+        # n tubes plus (n - 1) gaps per axis; a gap is the tube spacing or, across Fan segments, the segment spacing
+        canvas_width = 2 * padding + dialog_display_cols * tube_size + max(0, dialog_display_cols - 1) * (step_x - tube_size)
+        canvas_height = 2 * padding + dialog_display_rows * tube_size + max(0, dialog_display_rows - 1) * (step_y - tube_size)
+
         self.tubes_canvas.config(width=max(150, canvas_width), height=max(80, canvas_height))
 
-        for i in range(self.num_tubes):
-            original_col_idx = i % original_configured_cols
-            original_row_idx = i // original_configured_cols
-            clickable_group_tag = f"clickable_tube_area_{i}"
-
-            if rack_type == "Crate":
-                if self.visual_rotation_angle == 0:
-                    dialog_visual_col, dialog_visual_row = original_col_idx, original_row_idx
-                elif self.visual_rotation_angle == 90:
-                    dialog_visual_col, dialog_visual_row = original_row_idx, original_configured_cols - 1 - original_col_idx
-                elif self.visual_rotation_angle == 180:
-                    dialog_visual_col, dialog_visual_row = original_configured_cols - 1 - original_col_idx, original_configured_rows - 1 - original_row_idx
-                elif self.visual_rotation_angle == 270:
-                    dialog_visual_col, dialog_visual_row = original_configured_rows - 1 - original_row_idx, original_col_idx
-                x1 = self._padding + dialog_visual_col * (self._tube_size + self._spacing)
-                y1 = self._padding + dialog_visual_row * (self._tube_size + self._spacing)
-            elif rack_type == "Fan":
-                num_fans = original_configured_cols
-                tubes_per_fan = original_configured_rows
-                segment_idx = i // tubes_per_fan
-                tube_in_segment_idx = i % tubes_per_fan
-                if self.visual_rotation_angle == 0:
-                    dialog_visual_col, dialog_visual_row = segment_idx, tube_in_segment_idx
-                elif self.visual_rotation_angle == 90:
-                    dialog_visual_col, dialog_visual_row = tube_in_segment_idx, num_fans - 1 - segment_idx
-                elif self.visual_rotation_angle == 180:
-                    dialog_visual_col, dialog_visual_row = num_fans - 1 - segment_idx, tubes_per_fan - 1 - tube_in_segment_idx
-                elif self.visual_rotation_angle == 270:
-                    dialog_visual_col, dialog_visual_row = tubes_per_fan - 1 - tube_in_segment_idx, segment_idx
-                else: # Default to 0
-                    dialog_visual_col, dialog_visual_row = segment_idx, tube_in_segment_idx
-                
-                if self.visual_rotation_angle == 90 or self.visual_rotation_angle == 270:
-                    x1 = self._padding + dialog_visual_col * (self._tube_size + self._spacing)
-                    y1 = self._padding + dialog_visual_row * (self._tube_size + self._segment_visual_spacing)
-                else: # 0 or 180
-                    x1 = self._padding + dialog_visual_col * (self._tube_size + self._segment_visual_spacing)
-                    y1 = self._padding + dialog_visual_row * (self._tube_size + self._spacing)
-
-            x2 = x1 + self._tube_size
-            y2 = y1 + self._tube_size
-            
+        # Layout only depends on the rack shape, rotation and the dialog's fixed sizes, so reopening a dialog reuses it
+        geom_key = (rack_type, original_configured_cols, original_configured_rows, self.visual_rotation_angle,
+                    self._tube_size, self._spacing, self._segment_visual_spacing, self._padding)
+        tube_positions = self.planner._tube_geom_cache.get(geom_key)
+        if tube_positions is None:
+            tube_positions = _compute_tube_positions(*geom_key)
+            self.planner._tube_geom_cache[geom_key] = tube_positions
+        xs, ys = tube_positions
+        tube_font = self.planner._get_tube_font(self._font_size) # Shared Font object instead of a tuple per create_text
+        for i, x1, y1 in zip(range(self.num_tubes), xs, ys): # A loaded rack may hold fewer tubes than grid cells
+            x2 = x1 + tube_size
+            y2 = y1 + tube_size
+
             # Tube number display (local 1-based for this dialog)
-            display_tube_number = str(i + 1) 
+            display_tube_number = str(i + 1)
 
-            # Create rectangle (fill color will be set by _update_tube_visual)
-            rect_id = self.tubes_canvas.create_rectangle(x1, y1, x2, y2, outline="grey", width=1, tags=(f"rect_for_tube_{i}", clickable_group_tag))
-            text_id = self.tubes_canvas.create_text(x1 + self._text_offset, y1 + self._text_offset, text=display_tube_number, fill="black", tags=(f"text_for_tube_{i}", clickable_group_tag), font=("Arial", self._font_size))
+            # Only per-tube options go on the create calls; outlines and font are set by tag below
+            rect_tags = (f"rect_for_tube_{i}", "all_rects")
+            type_tag = self._type_tags.get(self.current_tubes_data_copy[i].get('type', "Standard"))
+            if type_tag: rect_tags += (type_tag,)
+            rect_id = self.tubes_canvas.create_rectangle(x1, y1, x2, y2, fill=self.current_tubes_data_copy[i]['color'], tags=rect_tags)
+            text_id = self.tubes_canvas.create_text(x1 + text_offset, y1 + text_offset, text=display_tube_number, tags=(f"text_for_tube_{i}", "all_texts"))
 
             self.tube_canvas_mapping[i] = (rect_id, text_id)
-            self.tubes_canvas.tag_raise(text_id, rect_id)
-            self.tubes_canvas.tag_bind(clickable_group_tag, "<Button-1>", lambda e, idx=i: self._handle_specific_tube_click(idx))
-            self._update_tube_visual(i) # Apply initial type-specific visuals
+        # Nothing is selected yet: grey outlines for all tubes, then one call per emphasized type
+        unsel_outline, unsel_width = self._OUTLINE_UNSEL
+        self.tubes_canvas.itemconfig("all_rects", outline=unsel_outline, width=unsel_width)
+        for tube_type, (type_color, type_width) in self._type_outlines.items():
+            self.tubes_canvas.itemconfig(self._type_tags[tube_type], outline=type_color, width=type_width)
+        self.tubes_canvas.itemconfig("all_texts", fill="black", font=tube_font)
+
+    def _on_tubes_canvas_click(self, event):
+        tube_idx = self._click_to_idx(event.x, event.y)
+        if tube_idx is not None:
+            self._handle_specific_tube_click(tube_idx)
+
+    def _click_to_idx(self, x, y):
+        """Resolves a click to a tube index by inverting the grid layout; None for gaps and empty space."""
+        visual_col, x_in_cell = divmod(x - self._padding, self._step_x)
+        visual_row, y_in_cell = divmod(y - self._padding, self._step_y)
+        if x_in_cell > self._tube_size or y_in_cell > self._tube_size: return None # In the gap between tubes
+        tube_idx = _grid_cell_to_tube_index(*self._grid_shape, visual_col, visual_row)
+        return tube_idx if tube_idx is not None and tube_idx < self.num_tubes else None # Cells past a short tube list are empty
 
     def _handle_specific_tube_click(self, tube_idx):
+        rect_id = self.tube_canvas_mapping[tube_idx][0]
         if tube_idx in self.selected_indices_in_dialog:
             self.selected_indices_in_dialog.remove(tube_idx)
+            self.tubes_canvas.dtag(rect_id, "selected")
         else:
             self.selected_indices_in_dialog.add(tube_idx)
+            self.tubes_canvas.addtag_withtag("selected", rect_id)
         self._update_tube_visual(tube_idx)
 
     def _apply_type_to_selected_dialog_tubes(self):
-        selected_type = self.type_var.get()
+        selected_type = sys.intern(self.type_var.get()) # Same object as the draw table keys, see _TUBE_DRAW_PROPS
         if not selected_type:
             messagebox.showwarning("No Type Selected", "Please select a type.", parent=self)
             return
         if not self.selected_indices_in_dialog:
             messagebox.showinfo("No Tubes Selected", "Please select tubes.", parent=self)
             return
-        for idx in list(self.selected_indices_in_dialog):
+        for idx in self.selected_indices_in_dialog:
             self.current_tubes_data_copy[idx]['type'] = selected_type
-            self._update_tube_visual(idx)
+        # Selected tubes keep the blue selection outline, so only their type tags change; the type outline shows on deselect
+        for type_tag in self._type_tags.values():
+            self.tubes_canvas.dtag("selected", type_tag)
+        if selected_type in self._type_tags:
+            self.tubes_canvas.addtag_withtag(self._type_tags[selected_type], "selected")
 
     def _update_tube_visual(self, tube_idx):
         if tube_idx in self.tube_canvas_mapping:
             rect_id, text_id = self.tube_canvas_mapping[tube_idx]
-            tube_data = self.current_tubes_data_copy[tube_idx]
-            
-            fill_color = tube_data['color'] # Keep the original color of the tube
-            current_outline_color = "grey" 
-            current_outline_width = 1
-
-            tube_type = tube_data.get('type', "Standard") 
-            if tube_type == "Whistling Tail":
-                current_outline_color = "darkorange"
-                current_outline_width = 2
-            elif tube_type == "Tiger Tail":
-                current_outline_color = "saddlebrown"
-                current_outline_width = 2
-            elif tube_type == "Ring":
-                current_outline_color = "darkviolet"
-                current_outline_width = 2
-            elif tube_type == "Nishiki":
-                current_outline_color = "goldenrod"
-                current_outline_width = 2
-
-            if tube_idx in self.selected_indices_in_dialog:
-                current_outline_color = "blue" 
-                current_outline_width = 2
-            
-            self.tubes_canvas.itemconfig(rect_id, fill=fill_color, outline=current_outline_color, width=current_outline_width)
+            # Only the outline is touched: tube colors can't change in this dialog, so the fill set at creation stays valid
+            current_outline_color, current_outline_width = self._get_tube_outline(tube_idx)
+            self.tubes_canvas.itemconfig(rect_id, outline=current_outline_color, width=current_outline_width)
+
+    def _get_tube_outline(self, tube_idx):
+        """Returns (outline_color, outline_width) for a tube based on its type and selection state."""
+        if tube_idx in self.selected_indices_in_dialog:
+            return self._OUTLINE_SEL
+        return self._type_outlines.get(self.current_tubes_data_copy[tube_idx].get('type', "Standard"), self._OUTLINE_UNSEL)
 
     def _select_all_tubes(self):
-        for i in range(self.num_tubes):
-            is_newly_selected = i not in self.selected_indices_in_dialog
-            self.selected_indices_in_dialog.add(i)
-            if is_newly_selected:
-                 self._update_tube_visual(i)
+        self.selected_indices_in_dialog = set(range(self.num_tubes))
+        self.tubes_canvas.addtag_withtag("selected", "all_rects")
+        outline_color, outline_width = self._OUTLINE_SEL
+        self.tubes_canvas.itemconfig("all_rects", outline=outline_color, width=outline_width) # One call for every tube outline
 
     def _deselect_all_tubes(self):
-        currently_selected = list(self.selected_indices_in_dialog)
         self.selected_indices_in_dialog.clear()
-        for i in currently_selected:
-            self._update_tube_visual(i)
+        outline_color, outline_width = self._OUTLINE_UNSEL
+        self.tubes_canvas.itemconfig("selected", outline=outline_color, width=outline_width) # One call resets every selected tube
+        self.tubes_canvas.dtag("selected", "selected")
+        # Re-issue the emphasized type outlines by tag, one call per type
+        for tube_type, (type_color, type_width) in self._type_outlines.items():
+            self.tubes_canvas.itemconfig(self._type_tags[tube_type], outline=type_color, width=type_width)
 
     def _confirm_changes(self):
-        self.rack_config_original['tubes'] = copy.deepcopy(self.current_tubes_data_copy)
-        self.planner.redraw_canvas()  # Redraw to reflect type changes
+        # The dialog is closing, so hand its working list over to the rack instead of copying it
+        self.rack_config_original['tubes'] = self.current_tubes_data_copy
+        self.current_tubes_data_copy = None
         self.planner.status_var.set(f"Firework types updated for rack ...{self.rack_config_original['id'][-6:]}.")
-        self.planner._update_ui_for_selection_state()
+        self.planner.schedule_redraw(refresh_selection_ui=True) # Redraw to reflect type changes
         self.destroy()
 
 
@@ -596,113 +671,207 @@ class FireworkRackPlanner:
     Handles UI setup, canvas drawing, rack and line management,
     user interactions, and file operations.
     """
+    # Every instance attribute is declared here: no per-instance __dict__, and attribute reads go through slot descriptors
+    __slots__ = (
+        "root", "default_new_tube_color_value", "racks_on_canvas", "selected_rack_ids", "dragging_rack_id",
+        "_rack_by_id", "_line_by_id", "_rack_geom_cache", "_rack_shape_geom_cache", "_rack_color_counts",
+        "_rack_spatial_index", "_tube_spatial_index", "_line_spatial_index", "_flow_line_items", "_tube_conn_items",
+        "_grid_line_items", "selected_flow_line_id", "drag_offset_x", "drag_offset_y", "drag_start_positions",
+        "_press_xy", "_drag_active", "_drag_targets", "_snap_edges", "_last_drag_snap_key", "_drawn_selected_ids",
+        "_drawn_rack_keys", "_drawn_rack_view", "_rack_item_tags", "_last_hover_test_ms", "_canvas_view_size",
+        "_draw_viewport_cache", "snap_to_grid_enabled", "grid_size_var", "show_rack_names_var", "show_tube_numbers_var",
+        "snap_to_racks_enabled", "_snap_to_grid", "_show_rack_names", "_show_tube_numbers", "_snap_to_racks",
+        "flow_lines_on_canvas", "drawing_flow_line_mode", "flow_line_start_point", "tube_connections",
+        "connecting_tubes_mode", "first_tube_for_connection", "undo_stack", "redo_stack",
+        "drag_operation_pending_undo_state", "_redraw_pending", "_redraw_refresh_selection_ui",
+        "_redraw_refresh_rack_list", "_tree_selection_sync_pending", "_debounce_jobs", "zoom_level", "pan_offset_x",
+        "pan_offset_y", "_is_panning", "_pan_start_x", "_pan_start_y", "rack_global_start_indices", "_numbering_inputs",
+        "_tube_geom_cache", "_tube_fonts", "_inspector_rows", "_detached_inspector_iids", "_selection_ui_kind",
+        "_input_field_states", "_physical_dims_cache", "_fuse_per_tube_cache", "main_paned_window", "control_notebook",
+        "undo_btn", "redo_btn", "grid_size_entry", "tab_item_props", "rack_props_frame", "rack_name_var",
+        "rack_name_entry", "rack_type_var", "rack_type_dropdown", "x_tubes_var", "x_tubes_entry", "y_tubes_var",
+        "y_tubes_entry", "pos_x_var", "pos_x_entry", "pos_y_var", "pos_y_entry", "tube_diameter_var",
+        "tube_diameter_entry", "rotation_var", "rotation_dropdown", "physical_dims_var", "physical_dims_label",
+        "tube_color_breakdown_var", "tube_color_breakdown_label", "line_props_frame", "flow_line_label_var",
+        "flow_line_label_entry", "flow_line_length_var", "flow_line_burn_time_var", "input_widgets_for_state_change",
+        "recolor_tubes_btn", "edit_types_btn", "draw_line_btn", "connect_tubes_btn", "canvas", "rack_inspector_tree",
+        "rack_context_menu", "context_menu_rack_id", "line_context_menu", "context_menu_line_id", "tube_count_var",
+        "fuse_estimation_var", "show_duration_var", "status_var",
+    )
+
+    # Configuration constants live on the class; dict tables are read-only views.
+    CANVAS_WIDTH=900;CANVAS_HEIGHT=700;CANVAS_BG_COLOR="ivory"
+    UI_PADDING=10;DEFAULT_TUBE_DIAMETER=20 # World units
+    DEFAULT_TUBE_SPACING_RATIO=0.2;DEFAULT_FAN_PADDING_RATIO=0.2;DEFAULT_INTER_FAN_SPACING_RATIO=0.5
+    RACK_OUTER_PADDING=5;RACK_OUTLINE_COLOR="black";RACK_OUTLINE_WIDTH=1.5
+    SELECTED_RACK_OUTLINE_COLOR="blue";SELECTED_RACK_OUTLINE_WIDTH=3;SNAP_THRESHOLD=10
+    DRAG_START_THRESHOLD=2 # Canvas pixels the mouse must move after a press before a rack drag starts
+    RACK_TYPE_CHOICES=("Crate","Fan");ROTATION_DEGREES=(0,90,180,270);DUPLICATE_OFFSET_X=20;DUPLICATE_OFFSET_Y=20
+    _NEXT_ROTATION_DEGREES = types.MappingProxyType(dict(zip(ROTATION_DEGREES, ROTATION_DEGREES[1:] + ROTATION_DEGREES[:1]))) # Rotate button steps
+    DUPLICATE_OFFSET_INCREMENT=5; NUDGE_AMOUNT = 2
+
+    FUSE_COLORS_MAP=types.MappingProxyType({
+        # Name: "color_value_for_drawing_and_burn_rate_key"
+        # Ensure color_value_for_drawing_and_burn_rate_key exists as a key in FUSE_BURN_RATES_SPF
+        # if you want burn time calculations for it.
+        # Tkinter color names or hex codes can be used for drawing.
+        "White":"white", "Yellow":"yellow", "Pink":"pink", 
+        "Blue":"lightblue", "Orange":"orange", "Green":"lightgreen" 
+    })
+    FUSE_COLOR_CHOICES=tuple(FUSE_COLORS_MAP.keys())
+    # Inverse of FUSE_COLORS_MAP (color value -> name); built reversed so the first name wins if values repeat
+    FUSE_COLOR_NAMES_BY_VALUE=types.MappingProxyType({val: name for name, val in reversed(FUSE_COLORS_MAP.items())})
+    _FUSE_COLORS_BY_NAME = tuple(sorted(FUSE_COLORS_MAP.items())) # (name, value) pairs in the order the fuse summary lists them
+    # Color name -> the name after it in FUSE_COLOR_CHOICES (wrapping around), for Shift+Click color cycling
+    _NEXT_FUSE_COLOR_NAME = types.MappingProxyType(dict(zip(FUSE_COLOR_CHOICES, FUSE_COLOR_CHOICES[1:] + FUSE_COLOR_CHOICES[:1])))
+
+    FUSE_BURN_RATES_SPF = types.MappingProxyType({ 
+        # color_value: seconds_per_foot
+        "white": 0.75, "yellow": 1.5, "pink": 10.0,
+        "lightblue": 15.0, "orange": 18.0, "lightgreen": 30.0 
+    })
+
+    # UI related constants
+    WIDGET_PADY = 3
+    LABEL_STICKY = tk.W
+    ENTRY_STICKY = (tk.W, tk.E)
+    INPUT_WIDTH_SHORT = 8
+    INPUT_WIDTH_LONG = 18
+
+    DEFAULT_CRATE_FUSE_INCHES = 70.0 
+    FAN_CHAIN_INTER_TUBE_ALLOWANCE_INCHES = 3.0 
+    FAN_CHAIN_INTER_SEGMENT_ALLOWANCE_INCHES = 0.0 
+    FAN_CHAIN_LEAD_INCHES = 3.0 
+    FAN_CHAIN_TAIL_INCHES = 3.0 
+    FUSE_ESTIMATE_UNIT = "ft." 
+    FUSE_LENGTH_SCALE_FACTOR = 0.9 # Reduce fuse length estimates by 10%
+    INCHES_PER_FOOT = 12.0
+
+    # Physical dimension constants (world units, assumed inches)
+    PHYSICAL_TUBE_DIAMETER_INCHES = 2.0
+    PHYSICAL_CRATE_SPACING_INCHES = 0.5
+    PHYSICAL_FAN_TUBE_SPACING_INCHES = 0.75 
+    PHYSICAL_FAN_SEGMENT_WIDTH_INCHES = 3.0 
+    PHYSICAL_FAN_INTER_SEGMENT_SPACING_INCHES = 3.75 
+    # Rack type -> (x item size, x gap, y item size, y gap) in inches; a side spans n * size + (n - 1) * gap
+    PHYSICAL_DIMENSION_PARAMS = types.MappingProxyType({
+        "Crate": (PHYSICAL_TUBE_DIAMETER_INCHES, PHYSICAL_CRATE_SPACING_INCHES, PHYSICAL_TUBE_DIAMETER_INCHES, PHYSICAL_CRATE_SPACING_INCHES),
+        "Fan": (PHYSICAL_FAN_SEGMENT_WIDTH_INCHES, PHYSICAL_FAN_INTER_SEGMENT_SPACING_INCHES, PHYSICAL_TUBE_DIAMETER_INCHES, PHYSICAL_FAN_TUBE_SPACING_INCHES),
+    })
+
+    LINE_CAP_LENGTH = 6 
+    LINE_TOOL_COLOR_DEFAULT = "darkred"
+    LINE_TOOL_WIDTH = 2.0
+    SELECTED_LINE_COLOR = "cyan"
+    LINE_CLICK_HALO = 5 
+    GRID_MIN_DRAW_SPACING_PX = 3 # Snap grid lines are not drawn when closer together than this on screen
+    LINE_INDEX_CELL_PX = 64 # Canvas size of a flow line hit-test bucket, see _build_line_spatial_index
+    HOVER_HIT_TEST_INTERVAL_MS = 16 # At most ~60 hover hit-tests per second, see on_canvas_mouse_motion
+    LINE_CONTEXT_COLORS = types.MappingProxyType({"Dark Red": "darkred", "Blue": "blue", "Green": "darkgreen", "Black": "black"})
+
+    MAX_UNDO_STEPS = 50
+
+    # Zoom limits
+    MIN_ZOOM = 0.1
+    MAX_ZOOM = 5.0
+    ZOOM_STEP = 1.2 
+    ZOOM_REDRAW_DELAY_MS = 150 # Full rebuild after the wheel settles, see _do_zoom
+    TUBE_LABEL_MIN_DIAMETER_PX = 6 # Zoomed out below this tube size, number/cue labels are unreadable and not drawn
+
+    # Default positions for new racks (world coordinates)
+    DEFAULT_RACK_POS_X_WORLD = 50
+    DEFAULT_RACK_POS_Y_WORLD = 50
+    DEFAULT_RACK_SEPARATION_WORLD = 20 # Spacing for suggesting next rack position
+
+    DEFAULT_TUBE_OUTLINE_WIDTH_WORLD = 1.0
+    FIREWORK_TYPE_VISUALS = types.MappingProxyType({
+        "Whistling Tail": types.MappingProxyType({"outline": "darkorange", "width_factor": 1.5, "shape": "rectangle"}),
+        "Tiger Tail": types.MappingProxyType({"outline": "saddlebrown", "width_factor": 1.5, "shape": "oval"}),
+        "Ring": types.MappingProxyType({"outline": "darkviolet", "width_factor": 1.5, "shape": "rectangle"}),
+        "Nishiki": types.MappingProxyType({"outline": "goldenrod", "width_factor": 1.5, "shape": "oval"}),
+        "Standard": types.MappingProxyType({"outline": "black", "width_factor": 1.0, "shape": "oval"}), # Default
+    })
+    # FIREWORK_TYPE_VISUALS flattened to (outline, width_factor, shape) tuples for the tube draw loop.
+    # Keys are interned, as are tube types set by the type dialog or loaded from a file, so lookups hit on identity.
+    _TUBE_DRAW_PROPS = types.MappingProxyType({sys.intern(tube_type): (visuals["outline"], visuals["width_factor"], visuals.get("shape", "oval"))
+                                               for tube_type, visuals in FIREWORK_TYPE_VISUALS.items()})
+
     def __init__(self, root):
         self.root = root
         self.root.title("Firework Rack Planner - Pro+ v1.8") # Version bump
-        self.CANVAS_WIDTH=900;self.CANVAS_HEIGHT=700;self.CANVAS_BG_COLOR="ivory"
-        self.UI_PADDING=10;self.DEFAULT_TUBE_DIAMETER=20 # World units
-        self.DEFAULT_TUBE_SPACING_RATIO=0.2;self.DEFAULT_FAN_PADDING_RATIO=0.2;self.DEFAULT_INTER_FAN_SPACING_RATIO=0.5
-        self.RACK_OUTER_PADDING=5;self.RACK_OUTLINE_COLOR="black";self.RACK_OUTLINE_WIDTH=1.5
-        self.SELECTED_RACK_OUTLINE_COLOR="blue";self.SELECTED_RACK_OUTLINE_WIDTH=3;self.SNAP_THRESHOLD=10
-        self.ROTATION_DEGREES=[0,90,180,270];self.DUPLICATE_OFFSET_X=20;self.DUPLICATE_OFFSET_Y=20
-        self.DUPLICATE_OFFSET_INCREMENT=5; self.NUDGE_AMOUNT = 2
-
-        self.FUSE_COLORS_MAP={
-            # Name: "color_value_for_drawing_and_burn_rate_key"
-            # Ensure color_value_for_drawing_and_burn_rate_key exists as a key in FUSE_BURN_RATES_SPF
-            # if you want burn time calculations for it.
-            # Tkinter color names or hex codes can be used for drawing.
-            "White":"white", "Yellow":"yellow", "Pink":"pink", 
-            "Blue":"lightblue", "Orange":"orange", "Green":"lightgreen" 
-        }
-        self.FUSE_COLOR_CHOICES=list(self.FUSE_COLORS_MAP.keys())
         self.default_new_tube_color_value = self.FUSE_COLORS_MAP.get("Pink", "pink") 
 
-        self.FUSE_BURN_RATES_SPF = { 
-            # color_value: seconds_per_foot
-            "white": 0.75, "yellow": 1.5, "pink": 10.0,
-            "lightblue": 15.0, "orange": 18.0, "lightgreen": 30.0 
-        }
-
         self.racks_on_canvas=[];self.selected_rack_ids=[];self.dragging_rack_id=None
+        self._rack_by_id = {} # Rack id -> rack config for every rack in racks_on_canvas, see _reindex_racks
+        self._rack_geom_cache = {} # Rack id -> (geometry inputs, _get_rack_dimensions_and_points result, outline world bbox)
+        self._rack_shape_geom_cache = {} # (type, x_tubes, y_tubes, tube_diameter, rotation) -> a _rack_geom_cache entry to translate
+        self._rack_color_counts = {} # Rack id -> (tubes list, Counter of its color values, breakdown text or None), see _get_rack_color_counts
+        self._rack_spatial_index = None # (cell size, {(cell_x, cell_y): [rack entries]}), rebuilt lazily like the tube index
+        self._tube_spatial_index = None # (cell size, {(cell_x, cell_y): [tube entries]}), rebuilt lazily after each redraw
+        self._line_spatial_index = None # (cell size, halo^2, {(cell_x, cell_y): [line entries]}), rebuilt lazily like the tube index
+        self._flow_line_items = {} # Line id -> ((polyline, label) canvas ids, last applied style), kept across redraws
+        self._tube_conn_items = {} # Connection id -> (arrow canvas id, last applied style), kept across redraws
+        self._grid_line_items = [] # Canvas ids of the snap grid lines, moved into place by _draw_grid_lines on each redraw
         self.selected_flow_line_id = None 
         self.drag_offset_x=0;self.drag_offset_y=0;
         self.drag_start_positions = {} 
-
-        # UI related constants
-        self.WIDGET_PADY = 3
-        self.LABEL_STICKY = tk.W
-        self.ENTRY_STICKY = (tk.W, tk.E)
-        self.INPUT_WIDTH_SHORT = 8
-        self.INPUT_WIDTH_LONG = 18
+        self._press_xy = (0, 0); self._drag_active = False # Press position and whether it has become a drag, see on_canvas_drag
+        self._drag_targets = None # (rack config, drag start position) of each rack the current drag moves, see on_canvas_drag
+        self._snap_edges = None # Sorted bbox edges of the racks not being dragged, built by _snap_rack for the current drag
+        self._last_drag_snap_key = None # (grid-snapped x, y, zoom) the last drag motion moved the racks for, see on_canvas_drag
+        self._last_hover_test_ms = None # Tk event time of the last hover hit-test, see on_canvas_mouse_motion
+        self._canvas_view_size = (self.CANVAS_WIDTH, self.CANVAS_HEIGHT) # Canvas size from <Configure>, never below the nominal size
+        self._draw_viewport_cache = None # ((zoom, pan x, pan y, canvas size), _get_draw_viewport_world result)
 
         self.snap_to_grid_enabled = tk.BooleanVar(value=False)
         self.grid_size_var = tk.StringVar(value="20")
         self.show_rack_names_var = tk.BooleanVar(value=False)
         self.show_tube_numbers_var = tk.BooleanVar(value=True) # Automatically show tube numbers
         self.snap_to_racks_enabled = tk.BooleanVar(value=False)
-
-        self.DEFAULT_CRATE_FUSE_INCHES = 70.0 
-        self.FAN_CHAIN_INTER_TUBE_ALLOWANCE_INCHES = 3.0 
-        self.FAN_CHAIN_INTER_SEGMENT_ALLOWANCE_INCHES = 0.0 
-        self.FAN_CHAIN_LEAD_INCHES = 3.0 
-        self.FAN_CHAIN_TAIL_INCHES = 3.0 
-        self.FUSE_ESTIMATE_UNIT = "ft." 
-        self.FUSE_LENGTH_SCALE_FACTOR = 0.9 # Reduce fuse length estimates by 10%
-        self.INCHES_PER_FOOT = 12.0
-
-        # Physical dimension constants (world units, assumed inches)
-        self.PHYSICAL_TUBE_DIAMETER_INCHES = 2.0
-        self.PHYSICAL_CRATE_SPACING_INCHES = 0.5
-        self.PHYSICAL_FAN_TUBE_SPACING_INCHES = 0.75 
-        self.PHYSICAL_FAN_SEGMENT_WIDTH_INCHES = 3.0 
-        self.PHYSICAL_FAN_INTER_SEGMENT_SPACING_INCHES = 3.75 
+        # Plain attribute mirrors of the view toggles, read by the redraw and drag paths without a Tcl round-trip
+        self._snap_to_grid = False; self._show_rack_names = False; self._show_tube_numbers = True; self._snap_to_racks = False
+        for view_option_var in (self.snap_to_grid_enabled, self.show_rack_names_var, self.show_tube_numbers_var, self.snap_to_racks_enabled):
+            view_option_var.trace_add("write", self._sync_view_options)
 
         self.flow_lines_on_canvas = [] 
+        self._line_by_id = {} # Line id -> line data for every line in flow_lines_on_canvas, see _reindex_flow_lines
         self.drawing_flow_line_mode = False
         self.flow_line_start_point = None 
-        self.LINE_CAP_LENGTH = 6 
-        self.LINE_TOOL_COLOR_DEFAULT = "darkred"
-        self.LINE_TOOL_WIDTH = 2.0
-        self.SELECTED_LINE_COLOR = "cyan"
-        self.LINE_CLICK_HALO = 5 
 
         self.tube_connections = [] 
         self.connecting_tubes_mode = False
         self.first_tube_for_connection = None 
 
-        self.undo_stack = []
-        self.redo_stack = []
-        self.MAX_UNDO_STEPS = 50
+        self.undo_stack = deque(maxlen=self.MAX_UNDO_STEPS) # Oldest entries drop off automatically
+        self.redo_stack = deque(maxlen=self.MAX_UNDO_STEPS)
         self.drag_operation_pending_undo_state = None 
+        self._redraw_pending = False # See schedule_redraw
+        self._redraw_refresh_selection_ui = False; self._redraw_refresh_rack_list = False
+        self._tree_selection_sync_pending = False # See _schedule_tree_selection_sync
+        self._debounce_jobs = {} # Debounce key -> pending after() id, see _debounce
 
         # Zoom and Pan State
         self.zoom_level = 1.0
         self.pan_offset_x = 0.0
         self.pan_offset_y = 0.0
-        self.MIN_ZOOM = 0.1
-        self.MAX_ZOOM = 5.0
-        self.ZOOM_STEP = 1.2 
         self._is_panning = False
         self._pan_start_x = 0
         self._pan_start_y = 0
-        self._pan_initial_offset_x = 0
-        self._pan_initial_offset_y = 0
         
-        # Default positions for new racks (world coordinates)
-        self.DEFAULT_RACK_POS_X_WORLD = 50
-        self.DEFAULT_RACK_POS_Y_WORLD = 50
-        self.DEFAULT_RACK_SEPARATION_WORLD = 20 # Spacing for suggesting next rack position
         self.rack_global_start_indices = {} # For global tube numbering
-
-        self.DEFAULT_TUBE_OUTLINE_WIDTH_WORLD = 1.0
-        self.FIREWORK_TYPE_VISUALS = {
-            "Whistling Tail": {"outline": "darkorange", "width_factor": 1.5, "shape": "rectangle"},
-            "Tiger Tail": {"outline": "saddlebrown", "width_factor": 1.5, "shape": "oval"},
-            "Ring": {"outline": "darkviolet", "width_factor": 1.5, "shape": "rectangle"},
-            "Nishiki": {"outline": "goldenrod", "width_factor": 1.5, "shape": "oval"},
-            "Standard": {"outline": "black", "width_factor": 1.0, "shape": "oval"}, # Default
-        }
+        self._numbering_inputs = None # Per-rack (id, pos_x, pos_y, x_tubes, y_tubes) rack_global_start_indices was built from
+        self._tube_geom_cache = {} # Tube dialog layouts: (rack_type, cols, rows, angle, sizes...) -> (xs, ys)
+        self._tube_fonts = {} # Font size -> shared tkfont.Font for tube labels
+        self._inspector_rows = {} # Rack id -> (source fields, Treeview values tuple, name), see _update_rack_list_panel
+        self._detached_inspector_iids = set() # Inspector rows of removed racks, kept for undo until the history is dropped
+        self._selection_ui_kind = None # Selection kind the properties panel is laid out for, see _apply_selection_ui_kind
+        self._input_field_states = {} # Input widget -> state last set by _set_input_fields_state
+        self._drawn_selected_ids = frozenset() # selected_rack_ids as a set, rebuilt by redraw_canvas for its outline checks
+        self._drawn_rack_keys = [] # (rack id, draw key) per rack in stacking order, for the items kept across redraws
+        self._drawn_rack_view = None # (zoom, pan_x, pan_y) the kept rack items are currently placed for
+        self._rack_item_tags = () # Tags of the rack being drawn, set by redraw_canvas for the rack draw methods
+        self._physical_dims_cache = {} # (rack_type, x_tubes, y_tubes) -> physical dimensions text
+        self._fuse_per_tube_cache = {} # (rack_type, x_tubes, y_tubes) -> estimated fuse inches per tube
 
         self._setup_styles()
         self._setup_main_layout()
@@ -712,6 +881,14 @@ class FireworkRackPlanner:
         self._bind_global_events()
         self._initialize_ui_state()
 
+    def _get_tube_font(self, size):
+        """Returns a shared Arial tkfont.Font of the given size, created on first use."""
+        font = self._tube_fonts.get(size)
+        if font is None:
+            font = tkfont.Font(root=self.root, family="Arial", size=size)
+            self._tube_fonts[size] = font
+        return font
+
     def _setup_styles(self):
         style = ttk.Style()
         style.configure("Accent.TButton", font=('Arial', 10, 'bold'))
@@ -766,15 +943,15 @@ class FireworkRackPlanner:
         view_ops_frame = ttk.LabelFrame(tab_file_view, text="Canvas View Options")
         view_ops_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N), pady=5, padx=5)
         view_ops_frame.columnconfigure(0, weight=0); view_ops_frame.columnconfigure(1, weight=0); view_ops_frame.columnconfigure(2, weight=0); view_ops_frame.columnconfigure(3, weight=1) 
-        snap_grid_cb = ttk.Checkbutton(view_ops_frame, text="Snap to Grid", variable=self.snap_to_grid_enabled, command=self.redraw_canvas)
+        snap_grid_cb = ttk.Checkbutton(view_ops_frame, text="Snap to Grid", variable=self.snap_to_grid_enabled, command=self.schedule_redraw)
         snap_grid_cb.grid(row=0, column=0, padx=5, pady=self.WIDGET_PADY, sticky=self.LABEL_STICKY)
         ToolTip(snap_grid_cb, "Snap racks to the visual grid when dragging.")
         ttk.Label(view_ops_frame, text="Grid Size:").grid(row=0, column=1, padx=(10,0), pady=self.WIDGET_PADY, sticky=self.LABEL_STICKY)
         self.grid_size_entry = ttk.Entry(view_ops_frame, textvariable=self.grid_size_var, width=4)
         self.grid_size_entry.grid(row=0, column=2, padx=(0,5), pady=self.WIDGET_PADY, sticky=self.LABEL_STICKY)
         ToolTip(self.grid_size_entry, "Size of the grid cells in world units. Press Enter to apply.")
-        self.grid_size_entry.bind("<Return>", lambda e: self.redraw_canvas_if_valid_grid(e, True)) 
-        self.grid_size_var.trace_add("write", self.redraw_canvas_if_valid_grid) 
+        self.grid_size_entry.bind("<Return>", self._on_grid_size_return) 
+        self.grid_size_var.trace_add("write", self._on_grid_size_write) # One redraw per typing burst
 
         reset_view_btn = ttk.Button(view_ops_frame, text="Reset View", command=self.reset_canvas_view)
         reset_view_btn.grid(row=0, column=3, padx=5, pady=self.WIDGET_PADY, sticky=tk.E)
@@ -809,7 +986,7 @@ class FireworkRackPlanner:
 
         ttk.Label(self.rack_props_frame,text="Rack Type:").grid(row=current_row,column=0,sticky=self.LABEL_STICKY,pady=self.WIDGET_PADY,padx=5)
         self.rack_type_var=tk.StringVar(value="Crate")
-        self.rack_type_dropdown=ttk.Combobox(self.rack_props_frame,textvariable=self.rack_type_var,values=["Crate","Fan"],state="readonly",width=self.INPUT_WIDTH_LONG)
+        self.rack_type_dropdown=ttk.Combobox(self.rack_props_frame,textvariable=self.rack_type_var,values=self.RACK_TYPE_CHOICES,state="readonly",width=self.INPUT_WIDTH_LONG)
         self.rack_type_dropdown.grid(row=current_row,column=1,columnspan=2,sticky=self.ENTRY_STICKY,pady=self.WIDGET_PADY,padx=5);ToolTip(self.rack_type_dropdown,"Choose the type of rack: Crate (grid) or Fan.")
         current_row+=1
         ttk.Label(self.rack_props_frame,text="Tubes X (Cols/Fans):").grid(row=current_row,column=0,sticky=self.LABEL_STICKY,pady=self.WIDGET_PADY,padx=5)
@@ -984,18 +1161,20 @@ class FireworkRackPlanner:
         self.canvas.bind("<Shift-ButtonPress-1>",self.on_canvas_shift_click) 
         self.canvas.bind("<Button-3>", self.show_context_menu) 
         self.canvas.bind("<Motion>", self.on_canvas_mouse_motion) 
-        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel) # Windows/macOS
-        self.canvas.bind("<Button-4>", self.on_mouse_wheel) # Linux scroll up
-        self.canvas.bind("<Button-5>", self.on_mouse_wheel) # Linux scroll down
+        # Ctrl+Scroll zooms; the Control modifier and wheel direction are resolved by the bindings, not per event
+        self.canvas.bind("<Control-MouseWheel>", self._on_zoom_wheel) # Windows/macOS
+        self.canvas.bind("<Control-Button-4>", self._on_zoom_in_button) # Linux scroll up
+        self.canvas.bind("<Control-Button-5>", self._on_zoom_out_button) # Linux scroll down
         self.canvas.bind("<ButtonPress-2>", self.on_pan_start) # Middle mouse button press
         self.canvas.bind("<B2-Motion>", self.on_pan_motion)
         self.canvas.bind("<ButtonRelease-2>", self.on_pan_end)
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
 
         # Root window binds for global shortcuts
-        self.root.bind("<Left>", lambda e: self.nudge_selected_racks(-self.NUDGE_AMOUNT,0))
-        self.root.bind("<Right>", lambda e: self.nudge_selected_racks(self.NUDGE_AMOUNT,0))
-        self.root.bind("<Up>", lambda e: self.nudge_selected_racks(0,-self.NUDGE_AMOUNT))
-        self.root.bind("<Down>", lambda e: self.nudge_selected_racks(0,self.NUDGE_AMOUNT))
+        self.root.bind("<Left>", self._on_nudge_left)
+        self.root.bind("<Right>", self._on_nudge_right)
+        self.root.bind("<Up>", self._on_nudge_up)
+        self.root.bind("<Down>", self._on_nudge_down)
         self.root.bind("<Delete>",self.delete_selected_item) 
         self.root.bind("<BackSpace>",self.delete_selected_item) 
         self.root.bind("<KeyPress-r>", self.handle_rotate_shortcut) 
@@ -1015,9 +1194,8 @@ class FireworkRackPlanner:
 
         self.line_context_menu = tk.Menu(self.root, tearoff=0)
         line_color_menu = tk.Menu(self.line_context_menu, tearoff=0)
-        self.LINE_CONTEXT_COLORS = {"Dark Red": "darkred", "Blue": "blue", "Green": "darkgreen", "Black": "black"}
         for color_name, color_val in self.LINE_CONTEXT_COLORS.items():
-            line_color_menu.add_command(label=color_name, command=lambda c=color_val: self.change_selected_line_color(c))
+            line_color_menu.add_command(label=color_name, command=partial(self.change_selected_line_color, color_val))
         self.line_context_menu.add_cascade(label="Change Color", menu=line_color_menu)
         self.line_context_menu.add_separator()
         self.line_context_menu.add_command(label="Delete Line", command=self.delete_selected_item_ctx)
@@ -1062,50 +1240,72 @@ class FireworkRackPlanner:
         canvas_y = (world_y - self.pan_offset_y) * self.zoom_level
         return canvas_x, canvas_y
 
+    def world_to_canvas_flat(self, world_points):
+        """Converts a list of world (x, y) points to a flat [x0, y0, x1, y1, ...] canvas coordinate list in one pass."""
+        zoom = self.zoom_level; pan_x = self.pan_offset_x; pan_y = self.pan_offset_y
+        flat_points_canvas = []
+        for world_x, world_y in world_points:
+            flat_points_canvas.append((world_x - pan_x) * zoom); flat_points_canvas.append((world_y - pan_y) * zoom)
+        return flat_points_canvas
+
     def canvas_to_world(self, canvas_x, canvas_y):
         world_x = (canvas_x / self.zoom_level) + self.pan_offset_x
         world_y = (canvas_y / self.zoom_level) + self.pan_offset_y
         return world_x, world_y
 
-    def on_mouse_wheel(self, event):
-        # Ctrl+Scroll for zoom
-        if not (event.state & 0x0004): # Check if Control key is pressed
-            return
+    def _on_zoom_wheel(self, event):
+        if event.delta: self._do_zoom(1 if event.delta > 0 else -1, event.x, event.y)
+
+    def _on_zoom_in_button(self, event): self._do_zoom(1, event.x, event.y)
+
+    def _on_zoom_out_button(self, event): self._do_zoom(-1, event.x, event.y)
 
-        world_x_before_zoom, world_y_before_zoom = self.canvas_to_world(event.x, event.y)
+    def _do_zoom(self, direction, canvas_x, canvas_y):
+        """Zooms in (direction > 0) or out (direction < 0) by one ZOOM_STEP, keeping the point under the cursor fixed."""
+        world_x_before_zoom, world_y_before_zoom = self.canvas_to_world(canvas_x, canvas_y)
+        old_zoom_level = self.zoom_level
 
-        if event.delta > 0 or event.num == 4:  # Scroll up
-            self.zoom_level *= self.ZOOM_STEP
-        elif event.delta < 0 or event.num == 5:  # Scroll down
-            self.zoom_level /= self.ZOOM_STEP
+        if direction > 0: self.zoom_level *= self.ZOOM_STEP # Scroll up
+        else: self.zoom_level /= self.ZOOM_STEP # Scroll down
         
         self.zoom_level = max(self.MIN_ZOOM, min(self.MAX_ZOOM, self.zoom_level))
+        if self.zoom_level == old_zoom_level: return # Already at a zoom limit
+        self._line_spatial_index = None # Its halo and cell size are zoom dependent
 
         # Adjust pan offset to keep point under cursor fixed
-        world_x_after_zoom, world_y_after_zoom = self.canvas_to_world(event.x, event.y)
+        world_x_after_zoom, world_y_after_zoom = self.canvas_to_world(canvas_x, canvas_y)
         
         self.pan_offset_x += (world_x_before_zoom - world_x_after_zoom)
         self.pan_offset_y += (world_y_before_zoom - world_y_after_zoom)
         
-        self.redraw_canvas()
+        if self._is_panning: self.schedule_redraw(); return # View is scrolled mid-pan, canvas coords differ from event coords
+        # The cursor point is the fixed point of the new transform, so scaling the drawn items about it puts them exactly
+        # where a redraw would. Line widths, fonts and the grid catch up in one rebuild once the wheel stops.
+        ratio = self.zoom_level / old_zoom_level
+        self.canvas.scale("all", canvas_x, canvas_y, ratio, ratio)
+        self._debounce(self.ZOOM_REDRAW_DELAY_MS, "zoom", self.redraw_canvas)
 
     def on_pan_start(self, event):
         self._is_panning = True
         self._pan_start_x = event.x
         self._pan_start_y = event.y
-        self._pan_initial_offset_x = self.pan_offset_x
-        self._pan_initial_offset_y = self.pan_offset_y
+        self.canvas.scan_mark(event.x, event.y)
         self.canvas.config(cursor="fleur")
 
     def on_pan_motion(self, event):
         if self._is_panning:
-            dx = event.x - self._pan_start_x
-            dy = event.y - self._pan_start_y
-            self.pan_offset_x = self._pan_initial_offset_x - (dx / self.zoom_level)
-            self.pan_offset_y = self._pan_initial_offset_y - (dy / self.zoom_level)
-            self.redraw_canvas()
+            # Scroll the already rendered items; pan_offset_x/y are only committed on release
+            self.canvas.scan_dragto(event.x, event.y, gain=1)
 
     def on_pan_end(self, event):
+        if self._is_panning:
+            dx = event.x - self._pan_start_x
+            dy = event.y - self._pan_start_y
+            self.canvas.scan_dragto(self._pan_start_x, self._pan_start_y, gain=1) # Back to the unscrolled view
+            if dx or dy:
+                self.pan_offset_x -= dx / self.zoom_level
+                self.pan_offset_y -= dy / self.zoom_level
+                self.redraw_canvas() # Same callback as the view reset, so Tk never paints the unshifted items
         self._is_panning = False
         self.canvas.config(cursor="")
 
@@ -1136,25 +1336,38 @@ class FireworkRackPlanner:
     def _calculate_physical_dimensions(self, rack_config):
         if not rack_config: return "N/A"
         x_tubes = rack_config.get('x_tubes', 0); y_tubes = rack_config.get('y_tubes', 0)
-        rack_type = rack_config.get('type'); width_in = 0.0; height_in = 0.0
-        if rack_type == "Crate":
-            width_in = (x_tubes * self.PHYSICAL_TUBE_DIAMETER_INCHES + max(0, x_tubes - 1) * self.PHYSICAL_CRATE_SPACING_INCHES)
-            height_in = (y_tubes * self.PHYSICAL_TUBE_DIAMETER_INCHES + max(0, y_tubes - 1) * self.PHYSICAL_CRATE_SPACING_INCHES)
-        elif rack_type == "Fan":
-            width_in = (x_tubes * self.PHYSICAL_FAN_SEGMENT_WIDTH_INCHES + max(0, x_tubes - 1) * self.PHYSICAL_FAN_INTER_SEGMENT_SPACING_INCHES)
-            height_in = (y_tubes * self.PHYSICAL_TUBE_DIAMETER_INCHES + max(0, y_tubes - 1) * self.PHYSICAL_FAN_TUBE_SPACING_INCHES)
+        rack_type = rack_config.get('type')
+        # Only depends on the rack shape and class constants, so each shape is formatted once
+        shape_key = (rack_type, x_tubes, y_tubes)
+        dims_text = self._physical_dims_cache.get(shape_key)
+        if dims_text is None:
+            dims_text = self._physical_dims_cache[shape_key] = self._format_physical_dimensions(*shape_key)
+        return dims_text
+
+    def _format_physical_dimensions(self, rack_type, x_tubes, y_tubes):
+        width_in = 0.0; height_in = 0.0
+        dimension_params = self.PHYSICAL_DIMENSION_PARAMS.get(rack_type)
+        if dimension_params:
+            x_size_in, x_gap_in, y_size_in, y_gap_in = dimension_params
+            width_in = x_tubes * x_size_in + max(0, x_tubes - 1) * x_gap_in
+            height_in = y_tubes * y_size_in + max(0, y_tubes - 1) * y_gap_in
         return f"{width_in:.1f}\" x {height_in:.1f}\""
 
     def _calculate_tube_color_breakdown(self, rack_config):
         if not rack_config or 'tubes' not in rack_config: return "N/A" 
-        color_counts = defaultdict(int)
-        for tube_data in rack_config['tubes']: 
-            color_value = tube_data['color']
-            color_name = next((name for name, val in self.FUSE_COLORS_MAP.items() if val == color_value), "Unknown")
-            color_counts[color_name] += 1
-        if not color_counts: return "No colors"
-        sorted_colors = sorted(color_counts.items(), key=lambda item: (-item[1], item[0]))
-        return ", ".join([f"{name}: {count}" for name, count in sorted_colors])
+        # The text is kept with the rack's color counts, so reselecting an unchanged rack formats nothing
+        color_counts_by_value = self._get_rack_color_counts(rack_config); tubes, _, breakdown = self._rack_color_counts[rack_config['id']]
+        if breakdown is not None: return breakdown
+        # Count the (interned) color values at C level, then name the few distinct values; unknown values share one bucket
+        color_names_by_value = self.FUSE_COLOR_NAMES_BY_VALUE; color_counts = Counter()
+        for color_value, tube_count in color_counts_by_value.items():
+            color_counts[color_names_by_value.get(color_value, "Unknown")] += tube_count
+        if not color_counts: breakdown = "No colors"
+        else: # By count descending, then name: sort by name first, then a stable sort on the count (no per-item lambda frame)
+            sorted_colors = sorted(sorted(color_counts.items()), key=itemgetter(1), reverse=True)
+            breakdown = ", ".join([f"{name}: {count}" for name, count in sorted_colors])
+        self._rack_color_counts[rack_config['id']] = (tubes, color_counts_by_value, breakdown)
+        return breakdown
 
     def on_canvas_mouse_motion(self, event):
         if self._is_panning: # If panning, motion is handled by on_pan_motion
@@ -1164,8 +1377,21 @@ class FireworkRackPlanner:
                  self.canvas.config(cursor="crosshair")
             return
         
+        # Only the hover cursor depends on this, so events arriving faster than the interval are not tested right away
+        # (event.time wraps at 2**32 ms). The latest skipped one is tested once the interval has passed, so the cursor
+        # is right where the mouse stops; a test that runs now cancels it.
+        hover_test = partial(self._update_hover_cursor, event.x, event.y)
+        last_test_ms = self._last_hover_test_ms
+        if last_test_ms is not None and 0 <= event.time - last_test_ms < self.HOVER_HIT_TEST_INTERVAL_MS:
+            self._debounce(self.HOVER_HIT_TEST_INTERVAL_MS, "hover", hover_test); return
+        self._last_hover_test_ms = event.time
+        self._debounce(0, "hover", hover_test)
+
+    def _update_hover_cursor(self, canvas_x, canvas_y):
+        """Hand cursor over a flow line, plain elsewhere. Deferred tests find the modes as they are when they run."""
+        if self._is_panning or self.drawing_flow_line_mode or self.connecting_tubes_mode: return # Those own the cursor
         # Convert event coords to world for hit detection logic
-        world_x, world_y = self.canvas_to_world(event.x, event.y)
+        world_x, world_y = self.canvas_to_world(canvas_x, canvas_y)
         line_id_under_mouse = self._get_line_under_mouse(world_x, world_y) # Use world coords
         self.canvas.config(cursor="hand2" if line_id_under_mouse else "")
             
@@ -1222,8 +1448,7 @@ class FireworkRackPlanner:
 
     def on_connect_tubes_drag_preview(self, event):
         if self.connecting_tubes_mode and self.first_tube_for_connection:
-            world_x, world_y = self.canvas_to_world(event.x, event.y) # Convert for drawing logic if it expects world
-            self._draw_temporary_connection_line(world_x, world_y) # Pass world coords
+            self._draw_temporary_connection_line(event.x, event.y) # Mouse end stays in canvas coords
         # Call general mouse motion, which now also uses world coords for its internal checks
         self.on_canvas_mouse_motion(event) 
 
@@ -1231,27 +1456,74 @@ class FireworkRackPlanner:
     def on_flow_line_drag_preview(self, event):
         if self.drawing_flow_line_mode and self.flow_line_start_point:
             self.canvas.delete("temp_flow_line") 
-            # Start point is already in world coords if set in on_canvas_press_line_mode
-            wx1_start, wy1_start = self.flow_line_start_point 
-            # Current mouse position is canvas, convert to world for preview end
-            wx2, wy2 = self.canvas_to_world(event.x, event.y)
-            
-            # Convert back to canvas for drawing the temp line
-            cx1, cy1 = self.world_to_canvas(wx1_start, wy1_start)
-            cx2, cy2 = self.world_to_canvas(wx2, wy2) # This is just event.x, event.y
+            # Start point is stored in world coords (the view may have changed since), the end is the mouse position as is
+            cx1, cy1 = self.world_to_canvas(*self.flow_line_start_point)
             
-            self.canvas.create_line(cx1, cy1, cx2, cy2, fill="gray", width=max(1, self.LINE_TOOL_WIDTH * self.zoom_level), dash=(3,3), tags="temp_flow_line")
+            self.canvas.create_line(cx1, cy1, event.x, event.y, fill="gray", width=max(1, self.LINE_TOOL_WIDTH * self.zoom_level), dash=(3,3), tags="temp_flow_line")
+
 
+    def _build_tube_spatial_index(self):
+        """
+        Buckets every tube into the world-space grid cells its bounding box overlaps. Cells are as large as the
+        biggest tube, so a tube lands in at most four cells and a point only needs its own cell probed.
+        Entries are (order, rack_id, tube_idx, cx, cy, radius^2) with order following the topmost-first scan.
+        """
+        racks_geometry = [(rack_config['id'], self._get_rack_dimensions_and_points(rack_config)[0]) for rack_config in reversed(self.racks_on_canvas)]
+        cell_size = max((dia for _, tubes_info in racks_geometry for _, _, _, dia in tubes_info), default=1) or 1
+        cells = defaultdict(list); order = 0
+        for rack_id, tubes_info in racks_geometry:
+            for tube_idx, cx, cy, dia in tubes_info:
+                r = dia / 2; entry = (order, rack_id, tube_idx, cx, cy, r * r); order += 1
+                for cell_x in range(math.floor((cx - r) / cell_size), math.floor((cx + r) / cell_size) + 1):
+                    for cell_y in range(math.floor((cy - r) / cell_size), math.floor((cy + r) / cell_size) + 1):
+                        cells[(cell_x, cell_y)].append(entry)
+        self._tube_spatial_index = (cell_size, dict(cells))
+        return self._tube_spatial_index
+
+    def _build_rack_spatial_index(self):
+        """
+        Buckets every rack into the world-space grid cells its outline's bounding box overlaps, with cells as large
+        as the biggest rack. Entries are (order, rack_config, outline_points_world, world bbox); each cell lists them
+        topmost-first, since racks are bucketed in that order. The outline is None where it is an axis-aligned rectangle,
+        which is then exactly its bbox.
+        """
+        racks_outline = [(rack_config, self._get_rack_dimensions_and_points(rack_config)[1]) for rack_config in reversed(self.racks_on_canvas)]
+        bboxes = [self._get_rack_world_bbox(rack_config) for rack_config, _ in racks_outline]
+        cell_size = max((max(bbox[2] - bbox[0], bbox[3] - bbox[1]) for bbox in bboxes if bbox), default=1) or 1
+        cells = defaultdict(list)
+        for order, ((rack_config, outline), bbox) in enumerate(zip(racks_outline, bboxes)):
+            if not bbox: continue
+            entry = (order, rack_config, None if _is_axis_aligned_quad(outline) else outline, bbox)
+            for cell_x in range(math.floor(bbox[0] / cell_size), math.floor(bbox[2] / cell_size) + 1):
+                for cell_y in range(math.floor(bbox[1] / cell_size), math.floor(bbox[3] / cell_size) + 1):
+                    cells[(cell_x, cell_y)].append(entry)
+        self._rack_spatial_index = (cell_size, dict(cells))
+        return self._rack_spatial_index
+
+    def _get_rack_at_world_coords(self, world_x, world_y):
+        """
+        Topmost rack whose outline contains the world point, or None. Only racks sharing the point's grid cell are
+        polygon-tested. The cost is interpreter overhead per candidate, not memory traffic, and the grid keeps candidates
+        to the few racks around the point, so a click costs the same with ten racks or a thousand.
+        """
+        cell_size, cells = self._rack_spatial_index or self._build_rack_spatial_index()
+        for _, rack_config, outline_points_world, bbox in cells.get((math.floor(world_x / cell_size), math.floor(world_y / cell_size)), ()):
+            if not (bbox[0] <= world_x <= bbox[2] and bbox[1] <= world_y <= bbox[3]): continue # Cheap reject before the polygon test
+            if outline_points_world is None: # Axis-aligned: the ray-cast result, including its half-open edges, without the ray cast
+                if bbox[0] < world_x and bbox[1] < world_y: return rack_config
+            elif _point_in_polygon(world_x, world_y, outline_points_world): return rack_config
+        return None
 
     def _get_tube_at_canvas_coords(self, canvas_x, canvas_y): # Input is canvas coords
         world_x, world_y = self.canvas_to_world(canvas_x, canvas_y)
-        for rack_config in reversed(self.racks_on_canvas): 
-            tube_center_points_info, _, _, _, _ = self._get_rack_dimensions_and_points(rack_config) # This returns world coords
-            for tube_idx, tube_cx_world, tube_cy_world, tube_dia_world in tube_center_points_info:
-                # Compare in world coordinates
-                if (world_x - tube_cx_world)**2 + (world_y - tube_cy_world)**2 <= (tube_dia_world / 2)**2:
-                    return rack_config['id'], tube_idx 
-        return None, None 
+        cell_size, cells = self._tube_spatial_index or self._build_tube_spatial_index()
+        best = None
+        for entry in cells.get((math.floor(world_x / cell_size), math.floor(world_y / cell_size)), ()):
+            # Compare in world coordinates; lowest order wins, matching a topmost-rack-first linear scan
+            if best is not None and entry[0] >= best[0]: continue
+            dx = world_x - entry[3]; dy = world_y - entry[4]
+            if dx * dx + dy * dy <= entry[5]: best = entry
+        return (best[1], best[2]) if best else (None, None)
 
     def on_canvas_press_connect_tubes_mode(self, event):
         if not self.connecting_tubes_mode: return
@@ -1277,18 +1549,19 @@ class FireworkRackPlanner:
             self.canvas.delete("temp_source_tube_highlight", "temp_connection_preview_line"); self.redraw_canvas() 
             self.status_var.set("Tube connected. Click another source tube or turn off mode.") 
 
+    def _get_tube_info(self, rack_config, tube_idx):
+        """(idx, cx, cy, dia) in world coords for one tube of a rack, or None. Tube info lists are ordered by tube index."""
+        tubes_info = self._get_rack_dimensions_and_points(rack_config)[0]
+        if isinstance(tube_idx, int) and 0 <= tube_idx < len(tubes_info): return tubes_info[tube_idx]
+        return None
+
     def _highlight_source_tube(self):
         self.canvas.delete("temp_source_tube_highlight") 
         if self.first_tube_for_connection:
             rack_id, tube_idx = self.first_tube_for_connection
-            source_rack = next((r for r in self.racks_on_canvas if r['id'] == rack_id), None)
+            source_rack = self._rack_by_id.get(rack_id)
             if source_rack:
-                all_tubes_info, _, _, _, _ = self._get_rack_dimensions_and_points(source_rack) # Returns world coords
-                tube_info_match = None
-                for ti_idx, ti_cx_world, ti_cy_world, ti_dia_world in all_tubes_info:
-                    if ti_idx == tube_idx:
-                        tube_info_match = (ti_idx, ti_cx_world, ti_cy_world, ti_dia_world)
-                        break
+                tube_info_match = self._get_tube_info(source_rack, tube_idx) # World coords
                 if tube_info_match:
                     _, cx_w, cy_w, dia_w = tube_info_match 
                     # Convert world center and diameter to canvas for drawing highlight
@@ -1299,25 +1572,19 @@ class FireworkRackPlanner:
                                             outline="orange", width=3 * self.zoom_level, tags="temp_source_tube_highlight")
 
 
-    def _draw_temporary_connection_line(self, world_mouse_x, world_mouse_y): # Expects world mouse coords
+    def _draw_temporary_connection_line(self, canvas_mouse_x, canvas_mouse_y): # Expects canvas mouse coords
         self.canvas.delete("temp_connection_preview_line") 
         if self.first_tube_for_connection:
             rack_id, tube_idx = self.first_tube_for_connection
-            source_rack = next((r for r in self.racks_on_canvas if r['id'] == rack_id), None)
+            source_rack = self._rack_by_id.get(rack_id)
             if source_rack:
-                all_tubes_info, _, _, _, _ = self._get_rack_dimensions_and_points(source_rack) # World coords
-                tube_info_match = None
-                for ti_idx, ti_cx_w, ti_cy_w, ti_dia_w in all_tubes_info:
-                    if ti_idx == tube_idx:
-                        tube_info_match = (ti_idx, ti_cx_w, ti_cy_w, ti_dia_w)
-                        break
+                tube_info_match = self._get_tube_info(source_rack, tube_idx) # World coords
                 if tube_info_match:
                     _, x1_w, y1_w, _ = tube_info_match # World coords of source tube center
                     # Convert to canvas for drawing
                     x1_c, y1_c = self.world_to_canvas(x1_w, y1_w)
-                    x2_c, y2_c = self.world_to_canvas(world_mouse_x, world_mouse_y)
                     
-                    self.canvas.create_line(x1_c, y1_c, x2_c, y2_c, fill="gray", width=1.5 * self.zoom_level, dash=(3,3), tags="temp_connection_preview_line")
+                    self.canvas.create_line(x1_c, y1_c, canvas_mouse_x, canvas_mouse_y, fill="gray", width=1.5 * self.zoom_level, dash=(3,3), tags="temp_connection_preview_line")
 
 
     def on_canvas_press_line_mode(self, event):
@@ -1345,7 +1612,7 @@ class FireworkRackPlanner:
             line_id = str(uuid.uuid4())
             line_data = {'id': line_id, 'x1': wx1, 'y1': wy1, 'x2': wx2, 'y2': wy2, # Store world coords
                          'color': self.LINE_TOOL_COLOR_DEFAULT, 'width': self.LINE_TOOL_WIDTH, 'label': ''} 
-            self.flow_lines_on_canvas.append(line_data); self._record_state_for_undo() 
+            self.flow_lines_on_canvas.append(line_data); self._line_by_id.setdefault(line_id, line_data); self._record_state_for_undo() 
             self.flow_line_start_point = None 
             self.canvas.delete("temp_flow_line", "temp_flow_line_start_marker"); self.redraw_canvas() 
             self.status_var.set(f"Flow line added. To draw another, click 'Draw Flow Line (Off)' to re-enable.")
@@ -1354,7 +1621,7 @@ class FireworkRackPlanner:
     def clear_all_flow_lines(self):
         if not self.flow_lines_on_canvas: self.status_var.set("No flow lines to clear."); return
         if messagebox.askyesno("Confirm Clear", "Are you sure you want to clear ALL flow lines?\nThis action cannot be undone via the Undo button.", icon='warning'):
-            self._record_state_for_undo(); self.flow_lines_on_canvas.clear(); self.selected_flow_line_id = None 
+            self._record_state_for_undo(); self.flow_lines_on_canvas.clear(); self._line_by_id.clear(); self.selected_flow_line_id = None 
             self.redraw_canvas(); self.status_var.set("All flow lines cleared."); self._update_ui_for_selection_state() 
 
     def clear_all_tube_connections(self):
@@ -1364,31 +1631,74 @@ class FireworkRackPlanner:
             self.canvas.delete("temp_source_tube_highlight", "temp_connection_preview_line")
             self.redraw_canvas(); self.status_var.set("All tube connections cleared."); self._update_ui_for_selection_state()     
 
-    def _get_line_under_mouse(self, world_x, world_y): # Expects world coords
-        for line_data in reversed(self.flow_lines_on_canvas): 
+    def _build_line_spatial_index(self):
+        """
+        Buckets flow lines by the world-space grid cells their halo-expanded bounding box overlaps. Cells are
+        LINE_INDEX_CELL_PX canvas pixels wide and the halo is scaled by the current zoom, so the index is dropped on
+        zoom as well as on redraw. Entries are appended in z (list position) order and carry everything the distance
+        test needs: (line_id, x1, y1, dx, dy, 1/length^2 or 0, halo-expanded bbox x0, x1, y0, y1).
+        """
+        world_halo = self.LINE_CLICK_HALO / self.zoom_level; cell_size = self.LINE_INDEX_CELL_PX / self.zoom_level
+        cells = defaultdict(list)
+        for line_data in self.flow_lines_on_canvas:
             wx1, wy1, wx2, wy2 = line_data['x1'], line_data['y1'], line_data['x2'], line_data['y2'] # World coords
-            
-            # Bounding box check in world coords, halo needs to be scaled from canvas to world
-            world_halo = self.LINE_CLICK_HALO / self.zoom_level
-            min_wx, max_wx = min(wx1, wx2), max(wx1, wx2)
-            min_wy, max_wy = min(wy1, wy2), max(wy1, wy2)
-            if not (min_wx - world_halo <= world_x <= max_wx + world_halo and \
-                    min_wy - world_halo <= world_y <= max_wy + world_halo):
-                continue
+            dx_w, dy_w = wx2 - wx1, wy2 - wy1; len_sq = dx_w * dx_w + dy_w * dy_w
+            box_x0, box_x1 = min(wx1, wx2) - world_halo, max(wx1, wx2) + world_halo
+            box_y0, box_y1 = min(wy1, wy2) - world_halo, max(wy1, wy2) + world_halo
+            entry = (line_data['id'], wx1, wy1, dx_w, dy_w, 1.0 / len_sq if len_sq else 0.0, box_x0, box_x1, box_y0, box_y1)
+            for cell_x in range(math.floor(box_x0 / cell_size), math.floor(box_x1 / cell_size) + 1):
+                for cell_y in range(math.floor(box_y0 / cell_size), math.floor(box_y1 / cell_size) + 1):
+                    cells[(cell_x, cell_y)].append(entry)
+        self._line_spatial_index = (cell_size, world_halo * world_halo, dict(cells))
+        return self._line_spatial_index
 
-            dx_w, dy_w = wx2 - wx1, wy2 - wy1
-            if dx_w == 0 and dy_w == 0: dist_w = math.hypot(world_x - wx1, world_y - wy1)
-            else:
-                t = ((world_x - wx1) * dx_w + (world_y - wy1) * dy_w) / (dx_w*dx_w + dy_w*dy_w)
-                t = max(0, min(1, t)); closest_wx, closest_wy = wx1 + t * dx_w, wy1 + t * dy_w
-                dist_w = math.hypot(world_x - closest_wx, world_y - closest_wy)
-            
-            if dist_w <= world_halo: return line_data['id']
+    def _get_line_under_mouse(self, world_x, world_y): # Expects world coords
+        cell_size, world_halo_sq, cells = self._line_spatial_index or self._build_line_spatial_index()
+        bucket = cells.get((math.floor(world_x / cell_size), math.floor(world_y / cell_size)), ())
+        for line_id, wx1, wy1, dx_w, dy_w, inv_len_sq, box_x0, box_x1, box_y0, box_y1 in reversed(bucket): # Topmost first
+            # Bounding box check in world coords, halo is already scaled from canvas to world
+            if not (box_x0 <= world_x <= box_x1 and box_y0 <= world_y <= box_y1): continue
+            # Squared distance to the segment; inv_len_sq is 0 for a zero-length line, which measures to its start point
+            rel_x, rel_y = world_x - wx1, world_y - wy1
+            t = (rel_x * dx_w + rel_y * dy_w) * inv_len_sq
+            t = 0.0 if t < 0 else 1.0 if t > 1 else t
+            off_x, off_y = rel_x - t * dx_w, rel_y - t * dy_w
+            if off_x * off_x + off_y * off_y <= world_halo_sq: return line_id
         return None
 
-    def _draw_flow_lines(self):
+    def _on_canvas_configure(self, event):
+        self._canvas_view_size = (max(self.CANVAS_WIDTH, event.width), max(self.CANVAS_HEIGHT, event.height))
+
+    def _get_draw_viewport_world(self):
+        """
+        World-space (x0, y0, x1, y1) of the region redraw_canvas draws: the visible canvas plus one canvas size on
+        every side, so items stay in place while a pan (scan_dragto) or a zoom-out (canvas.scale) runs ahead of the redraw.
+        Reused until the zoom, pan or canvas size changes; the size comes from <Configure>, not a winfo round-trip.
+        """
+        view_key = (self.zoom_level, self.pan_offset_x, self.pan_offset_y, self._canvas_view_size)
+        cached = self._draw_viewport_cache
+        if cached is not None and cached[0] == view_key: return cached[1]
+        view_w, view_h = self._canvas_view_size
+        world_x0, world_y0 = self.canvas_to_world(-view_w, -view_h)
+        world_x1, world_y1 = self.canvas_to_world(2 * view_w, 2 * view_h)
+        self._draw_viewport_cache = (view_key, (world_x0, world_y0, world_x1, world_y1))
+        return self._draw_viewport_cache[1]
+
+    @staticmethod
+    def _world_bbox_outside(viewport, xs, ys):
+        """True when the bounding box of the given world x/y values does not intersect viewport."""
+        return max(xs) < viewport[0] or min(xs) > viewport[2] or max(ys) < viewport[1] or min(ys) > viewport[3]
+
+    def _draw_flow_lines(self, viewport=None):
+        """
+        Flow line items survive redraw_canvas (tag "retained"): existing items are moved with coords() and only
+        restyled when color, width or label change; items of lines that no longer exist or fall outside viewport are deleted.
+        A line and its end caps are one polyline item: cap, back to the start point, the line, then the far cap.
+        """
+        canvas = self.canvas; previous_items = self._flow_line_items; self._flow_line_items = {}
         for line_data in self.flow_lines_on_canvas:
             wx1, wy1, wx2, wy2 = line_data['x1'], line_data['y1'], line_data['x2'], line_data['y2']
+            if viewport and self._world_bbox_outside(viewport, (wx1, wx2), (wy1, wy2)): continue
             cx1, cy1 = self.world_to_canvas(wx1, wy1)
             cx2, cy2 = self.world_to_canvas(wx2, wy2)
             
@@ -1399,134 +1709,220 @@ class FireworkRackPlanner:
             if self.selected_flow_line_id == line_data['id']:
                 current_color = self.SELECTED_LINE_COLOR; current_width_canvas += 1 
             
-            line_id_tag = f"flow_line_{line_data['id']}"; tags = (line_id_tag, "flow_line") 
-            self.canvas.create_line(cx1, cy1, cx2, cy2, fill=current_color, width=current_width_canvas, tags=tags, capstyle=tk.ROUND, smooth=tk.TRUE)
-            
-            if math.hypot(wx2-wx1, wy2-wy1) == 0: continue 
-            
-            angle = math.atan2(cy2 - cy1, cx2 - cx1); # Use canvas coords for angle of drawn line
-            cap_len_canvas = self.LINE_CAP_LENGTH * self.zoom_level
-            cap_angle_offset = math.pi / 2 
+            line_id_tag = f"flow_line_{line_data['id']}"; tags = (line_id_tag, "flow_line", "retained") 
+            line_dx, line_dy = cx2 - cx1, cy2 - cy1; line_len_canvas = math.hypot(line_dx, line_dy)
+            if line_len_canvas != 0:
+                # Caps are perpendicular to the drawn line: scale the unit normal (-dy, dx)/len instead of atan2/cos/sin
+                cap_scale = self.LINE_CAP_LENGTH * self.zoom_level / line_len_canvas
+                cap_dx = -line_dy * cap_scale
+                cap_dy = line_dx * cap_scale
+                line_coords = (cx1 - cap_dx, cy1 - cap_dy, cx1 + cap_dx, cy1 + cap_dy, cx1, cy1,
+                               cx2, cy2, cx2 - cap_dx, cy2 - cap_dy, cx2 + cap_dx, cy2 + cap_dy)
+            else: line_coords = (cx1, cy1, cx2, cy2) # Zero length: no direction for caps
             
-            csx_offset = cap_len_canvas * math.cos(angle + cap_angle_offset)
-            csy_offset = cap_len_canvas * math.sin(angle + cap_angle_offset)
-            self.canvas.create_line(cx1 - csx_offset, cy1 - csy_offset, cx1 + csx_offset, cy1 + csy_offset, 
-                                    fill=current_color, width=current_width_canvas, tags=tags, capstyle=tk.ROUND)
-            cex_offset = cap_len_canvas * math.cos(angle + cap_angle_offset)
-            cey_offset = cap_len_canvas * math.sin(angle + cap_angle_offset)
-            self.canvas.create_line(cx2 - cex_offset, cy2 - cey_offset, cx2 + cex_offset, cy2 + cey_offset, 
-                                    fill=current_color, width=current_width_canvas, tags=tags, capstyle=tk.ROUND)
-            
-            line_label = line_data.get('label', '')
-            if line_label:
-                mid_cx, mid_cy = (cx1 + cx2) / 2, (cy1 + cy2) / 2
-                font_size = max(6, int(8 * self.zoom_level)) # Scale font size
-                self.canvas.create_text(mid_cx, mid_cy - (10 * self.zoom_level), text=line_label, fill="purple", 
-                                        font=("Arial", font_size, "italic"), anchor=tk.S, tags=tags)
-
-    def _draw_tube_connections(self):
+            line_label = line_data.get('label', '') if line_len_canvas != 0 else ''
+            label_xy = ((cx1 + cx2) / 2, (cy1 + cy2) / 2 - (10 * self.zoom_level)) if line_label else None
+            font_size = max(6, int(8 * self.zoom_level)) # Scale font size
+            style = (current_color, current_width_canvas, line_label, font_size)
+
+            cached = previous_items.pop(line_data['id'], None)
+            if cached is None:
+                line_item_id = canvas.create_line(*line_coords, fill=current_color, width=current_width_canvas, tags=tags,
+                                                  capstyle=tk.ROUND, joinstyle=tk.ROUND)
+                label_id = None; old_style = style
+            else:
+                (line_item_id, label_id), old_style = cached
+                canvas.coords(line_item_id, *line_coords)
+            if label_xy:
+                if label_id is None:
+                    label_id = canvas.create_text(*label_xy, text=line_label, fill="purple", 
+                                                  font=("Arial", font_size, "italic"), anchor=tk.S, tags=tags)
+                else: canvas.coords(label_id, *label_xy)
+            elif label_id is not None: canvas.delete(label_id); label_id = None
+            if style != old_style:
+                canvas.itemconfigure(line_item_id, fill=current_color, width=current_width_canvas)
+                if label_id is not None: canvas.itemconfigure(label_id, text=line_label, font=("Arial", font_size, "italic"))
+            self._flow_line_items[line_data['id']] = ((line_item_id, label_id), style)
+        for item_ids, _ in previous_items.values(): canvas.delete(*(item_id for item_id in item_ids if item_id is not None))
+
+    def _draw_tube_connections(self, viewport=None):
+        """Connection arrows survive redraw_canvas like flow lines, see _draw_flow_lines."""
+        canvas = self.canvas; previous_items = self._tube_conn_items; self._tube_conn_items = {}
         for conn in self.tube_connections:
-            source_rack = next((r for r in self.racks_on_canvas if r['id'] == conn['source_rack_id']), None)
-            target_rack = next((r for r in self.racks_on_canvas if r['id'] == conn['target_rack_id']), None)
+            source_rack = self._rack_by_id.get(conn['source_rack_id'])
+            target_rack = self._rack_by_id.get(conn['target_rack_id'])
             if not source_rack or not target_rack: continue
-            source_tubes_info, _, _, _, _ = self._get_rack_dimensions_and_points(source_rack) # World coords
-            target_tubes_info, _, _, _, _ = self._get_rack_dimensions_and_points(target_rack) # World coords
-            
-            source_tube_center_w = None
-            for idx, cx_w, cy_w, _ in source_tubes_info:
-                if idx == conn['source_tube_idx']: source_tube_center_w = (cx_w,cy_w); break
-            
-            target_tube_center_w = None
-            for idx, cx_w, cy_w, _ in target_tubes_info:
-                if idx == conn['target_tube_idx']: target_tube_center_w = (cx_w,cy_w); break
+            source_tube_info = self._get_tube_info(source_rack, conn['source_tube_idx']) # World coords
+            target_tube_info = self._get_tube_info(target_rack, conn['target_tube_idx']) # World coords
+            source_tube_center_w = source_tube_info and source_tube_info[1:3]
+            target_tube_center_w = target_tube_info and target_tube_info[1:3]
 
             if source_tube_center_w and target_tube_center_w:
+                if viewport and self._world_bbox_outside(viewport, (source_tube_center_w[0], target_tube_center_w[0]),
+                                                         (source_tube_center_w[1], target_tube_center_w[1])): continue
                 x1_c, y1_c = self.world_to_canvas(*source_tube_center_w)
                 x2_c, y2_c = self.world_to_canvas(*target_tube_center_w)
                 arrow_width = max(1, 1.5 * self.zoom_level)
                 arrow_shape = (max(4, int(8*self.zoom_level)), max(5, int(10*self.zoom_level)), max(1, int(3*self.zoom_level)))
-
-                self.canvas.create_line(x1_c, y1_c, x2_c, y2_c, fill=conn.get('color', '#00FF00'), 
-                                        width=arrow_width, arrow=tk.LAST, arrowshape=arrow_shape, 
-                                        tags=(f"tube_conn_{conn['id']}", "tube_connection"))
+                style = (conn.get('color', '#00FF00'), arrow_width, arrow_shape)
+
+                cached = previous_items.pop(conn['id'], None)
+                if cached is None:
+                    item_id = canvas.create_line(x1_c, y1_c, x2_c, y2_c, fill=style[0], 
+                                                 width=arrow_width, arrow=tk.LAST, arrowshape=arrow_shape, 
+                                                 tags=(f"tube_conn_{conn['id']}", "tube_connection", "retained"))
+                else:
+                    item_id, old_style = cached
+                    canvas.coords(item_id, x1_c, y1_c, x2_c, y2_c)
+                    if style != old_style: canvas.itemconfigure(item_id, fill=style[0], width=arrow_width, arrowshape=arrow_shape)
+                self._tube_conn_items[conn['id']] = (item_id, style)
+        for item_id, _ in previous_items.values(): canvas.delete(item_id)
 
     def _update_canvas_summary_info(self):
-        total_tubes = 0; fuse_lengths_by_color_value = defaultdict(float); total_show_duration_seconds = 0.0
+        total_tubes = 0; fuse_lengths_by_color_value = defaultdict(float)
         for rack_config in self.racks_on_canvas:
-            num_tubes_in_rack = rack_config.get('x_tubes', 0) * rack_config.get('y_tubes', 0)
+            x_tubes = rack_config.get('x_tubes', 0); y_tubes = rack_config.get('y_tubes', 0)
+            num_tubes_in_rack = x_tubes * y_tubes
             total_tubes += num_tubes_in_rack
             if num_tubes_in_rack == 0: continue 
-            rack_type = rack_config.get('type'); current_rack_total_fuse_length_inches = 0.0 
-            if rack_type == "Crate":
-                base_crate_tubes = 5*5 
-                scale_factor = num_tubes_in_rack / base_crate_tubes if base_crate_tubes > 0 else 1
-                current_rack_total_fuse_length_inches = self.DEFAULT_CRATE_FUSE_INCHES * scale_factor
-            elif rack_type == "Fan":
-                num_segments = rack_config.get('x_tubes', 0); tubes_per_segment = rack_config.get('y_tubes', 0)
-                if num_segments > 0 and tubes_per_segment > 0:
-                    fuse_within_all_segments = num_segments * max(0, tubes_per_segment - 1) * self.FAN_CHAIN_INTER_TUBE_ALLOWANCE_INCHES
-                    fuse_linking_segments = max(0, num_segments - 1) * self.FAN_CHAIN_INTER_SEGMENT_ALLOWANCE_INCHES
-                    current_rack_total_fuse_length_inches = (self.FAN_CHAIN_LEAD_INCHES + fuse_within_all_segments + 
-                                              fuse_linking_segments + self.FAN_CHAIN_TAIL_INCHES)
-            if current_rack_total_fuse_length_inches > 0 and num_tubes_in_rack > 0:
-                fuse_per_tube_in_rack_inches = (current_rack_total_fuse_length_inches * self.FUSE_LENGTH_SCALE_FACTOR) / num_tubes_in_rack
-                for tube_data in rack_config.get('tubes', []): 
-                    fuse_lengths_by_color_value[tube_data['color']] += fuse_per_tube_in_rack_inches
+            fuse_per_tube_in_rack_inches = self._fuse_per_tube_inches(rack_config.get('type'), x_tubes, y_tubes)
+            if fuse_per_tube_in_rack_inches <= 0: continue
+            # Cached per-rack color counts: one multiply per color instead of a pass over the tubes
+            for color_val, tube_count in self._get_rack_color_counts(rack_config).items():
+                fuse_lengths_by_color_value[color_val] += tube_count * fuse_per_tube_in_rack_inches
         self.tube_count_var.set(f"Total Tubes: {total_tubes}")
+        burn_rates_spf = self.FUSE_BURN_RATES_SPF; inches_times_burn_rate_spf = 0.0
         for color_val, total_length_inches in fuse_lengths_by_color_value.items():
-            if color_val in self.FUSE_BURN_RATES_SPF:
-                burn_rate_spf = self.FUSE_BURN_RATES_SPF[color_val]
-                length_feet = total_length_inches / self.INCHES_PER_FOOT
-                total_show_duration_seconds += length_feet * burn_rate_spf
+            burn_rate_spf = burn_rates_spf.get(color_val) # One lookup instead of a membership test plus index
+            if burn_rate_spf is not None: inches_times_burn_rate_spf += total_length_inches * burn_rate_spf
+        total_show_duration_seconds = inches_times_burn_rate_spf / self.INCHES_PER_FOOT # Inches to feet once, not per color
         self.show_duration_var.set(f"Est. Duration: {total_show_duration_seconds:.1f}s")
         if not self.racks_on_canvas and not self.flow_lines_on_canvas : 
             self.fuse_estimation_var.set(f"Est. Fuse ({self.FUSE_ESTIMATE_UNIT}): N/A")
         else:
-            fuse_strings = []
-            for color_name, color_value_map in sorted(self.FUSE_COLORS_MAP.items()):
-                length_for_this_color_inches = fuse_lengths_by_color_value[color_value_map]
-                if length_for_this_color_inches > 0.001:
-                    length_for_this_color_feet = length_for_this_color_inches / self.INCHES_PER_FOOT
-                    fuse_strings.append(f"{color_name}: {length_for_this_color_feet:.2f}") # Show more precision for feet
+            # Format only colors that have fuse, in one comprehension; .get() so absent colors are not inserted into the defaultdict
+            inches_per_foot = self.INCHES_PER_FOOT; fuse_lengths_get = fuse_lengths_by_color_value.get
+            fuse_strings = [f"{color_name}: {length_inches / inches_per_foot:.2f}" # Show more precision for feet
+                            for color_name, length_inches in ((name, fuse_lengths_get(value, 0.0)) for name, value in self._FUSE_COLORS_BY_NAME)
+                            if length_inches > 0.001]
             base_str = f"Est. Fuse ({self.FUSE_ESTIMATE_UNIT}): "
             if not fuse_strings and total_tubes == 0 : self.fuse_estimation_var.set(base_str + "N/A")
             elif not fuse_strings and total_tubes > 0 : self.fuse_estimation_var.set(base_str + "(No calc. fuse)")
             else: self.fuse_estimation_var.set(base_str + ", ".join(fuse_strings))
 
-    def redraw_canvas(self):
-        self.canvas.delete("all") 
+    def _fuse_per_tube_inches(self, rack_type, x_tubes, y_tubes):
+        """Estimated fuse length per tube in inches for a rack shape (0.0 if none), memoized per shape."""
+        shape_key = (rack_type, x_tubes, y_tubes)
+        fuse_per_tube_in_rack_inches = self._fuse_per_tube_cache.get(shape_key)
+        if fuse_per_tube_in_rack_inches is not None: return fuse_per_tube_in_rack_inches
+        num_tubes_in_rack = x_tubes * y_tubes; current_rack_total_fuse_length_inches = 0.0
+        if rack_type == "Crate":
+            base_crate_tubes = 5*5 
+            scale_factor = num_tubes_in_rack / base_crate_tubes if base_crate_tubes > 0 else 1
+            current_rack_total_fuse_length_inches = self.DEFAULT_CRATE_FUSE_INCHES * scale_factor
+        elif rack_type == "Fan":
+            num_segments = x_tubes; tubes_per_segment = y_tubes
+            if num_segments > 0 and tubes_per_segment > 0:
+                fuse_within_all_segments = num_segments * max(0, tubes_per_segment - 1) * self.FAN_CHAIN_INTER_TUBE_ALLOWANCE_INCHES
+                fuse_linking_segments = max(0, num_segments - 1) * self.FAN_CHAIN_INTER_SEGMENT_ALLOWANCE_INCHES
+                current_rack_total_fuse_length_inches = (self.FAN_CHAIN_LEAD_INCHES + fuse_within_all_segments + 
+                                          fuse_linking_segments + self.FAN_CHAIN_TAIL_INCHES)
+        fuse_per_tube_in_rack_inches = 0.0
+        if current_rack_total_fuse_length_inches > 0 and num_tubes_in_rack > 0:
+            fuse_per_tube_in_rack_inches = (current_rack_total_fuse_length_inches * self.FUSE_LENGTH_SCALE_FACTOR) / num_tubes_in_rack
+        self._fuse_per_tube_cache[shape_key] = fuse_per_tube_in_rack_inches
+        return fuse_per_tube_in_rack_inches
+
+    def schedule_redraw(self, refresh_selection_ui=False, refresh_rack_list=False):
+        """
+        Coalesces redraw requests into a single redraw_canvas (which also refreshes the summary) on the next
+        idle cycle. refresh_rack_list and refresh_selection_ui additionally run _update_rack_list_panel and
+        _update_ui_for_selection_state after the redraw, so the list shows the tube numbering it just computed.
+        """
+        if refresh_selection_ui: self._redraw_refresh_selection_ui = True
+        if refresh_rack_list: self._redraw_refresh_rack_list = True
+        self._rack_spatial_index = None; self._tube_spatial_index = None; self._line_spatial_index = None
+        if self._redraw_pending: return
+        self._redraw_pending = True
+        self.root.after_idle(self._run_scheduled_redraw)
+
+    def _debounce(self, ms, key, fn):
+        """
+        Runs fn once ms milliseconds after the last call with the same key, cancelling any call still pending.
+        ms=0 cancels the pending call and runs fn right away.
+        """
+        pending_job = self._debounce_jobs.pop(key, None)
+        if pending_job is not None: self.root.after_cancel(pending_job)
+        if ms <= 0: fn(); return
+        def run():
+            self._debounce_jobs.pop(key, None); fn()
+        self._debounce_jobs[key] = self.root.after(ms, run)
+
+    def _run_scheduled_redraw(self):
+        if self._redraw_pending: self._redraw_now() # Otherwise _redraw_now already ran it
+
+    def _redraw_now(self, refresh_selection_ui=False, refresh_rack_list=False):
+        """Redraws immediately, taking over any redraw still scheduled (and its refresh flags) so it does not paint again."""
+        self._redraw_pending = False
+        refresh_selection_ui = refresh_selection_ui or self._redraw_refresh_selection_ui; self._redraw_refresh_selection_ui = False
+        refresh_rack_list = refresh_rack_list or self._redraw_refresh_rack_list; self._redraw_refresh_rack_list = False
+        self.redraw_canvas()
+        if refresh_rack_list: self._update_rack_list_panel()
+        if refresh_selection_ui: self._update_ui_for_selection_state()
+
+    def _draw_grid_lines(self):
+        """
+        Lays the snap grid over the visible canvas plus one canvas size on every side, the same halo racks are drawn
+        over (see _get_draw_viewport_world), so a pan scrolling the drawn items shows a full grid. Grid line items are
+        tagged "retained" and reused across redraws: existing ones are moved with coords(), missing ones created below
+        everything else, and surplus ones deleted.
+        """
+        line_coords = []
         # Grid needs to be drawn relative to current pan and zoom
-        if self.snap_to_grid_enabled.get():
+        if self._snap_to_grid:
             try:
                 grid_s_world = int(self.grid_size_var.get()) # Grid size is in world units
-                if grid_s_world > 0:
-                    grid_s_canvas = grid_s_world * self.zoom_level
-                    # Calculate start/end based on visible canvas area in world coords
-                    world_x_start, world_y_start = self.canvas_to_world(0,0)
-                    world_x_end, world_y_end = self.canvas_to_world(self.CANVAS_WIDTH, self.CANVAS_HEIGHT)
-
-                    start_grid_x = math.floor(world_x_start / grid_s_world) * grid_s_world
-                    start_grid_y = math.floor(world_y_start / grid_s_world) * grid_s_world
-
-                    # Only draw lines that would be visible or nearly visible
-                    for i in range(int((world_x_end - start_grid_x) / grid_s_world) + 2):
-                        wx = start_grid_x + i * grid_s_world
-                        cx, _ = self.world_to_canvas(wx, 0) # Y doesn't matter for vertical line x-pos
-                        self.canvas.create_line(cx, 0, cx, self.CANVAS_HEIGHT, fill="lightgrey", dash=(2,2), tags="gridline")
-                    
-                    for i in range(int((world_y_end - start_grid_y) / grid_s_world) + 2):
-                        wy = start_grid_y + i * grid_s_world
-                        _, cy = self.world_to_canvas(0, wy) # X doesn't matter for horiz line y-pos
-                        self.canvas.create_line(0, cy, self.CANVAS_WIDTH, cy, fill="lightgrey", dash=(2,2), tags="gridline")
-            except ValueError: pass 
+                grid_s_canvas = grid_s_world * self.zoom_level
+                if grid_s_world > 0 and grid_s_canvas >= self.GRID_MIN_DRAW_SPACING_PX: # A denser grid would only paint the canvas grey
+                    view_w, view_h = self._canvas_view_size
+                    x0, y0, x1, y1 = -view_w, -view_h, 2 * view_w, 2 * view_h # Canvas-space extent, halo included
+                    # First grid line at or left of/above the extent's corner, then step in canvas space
+                    world_x_start, world_y_start = self.canvas_to_world(x0, y0)
+                    start_cx, start_cy = self.world_to_canvas(math.floor(world_x_start / grid_s_world) * grid_s_world,
+                                                              math.floor(world_y_start / grid_s_world) * grid_s_world)
+                    line_coords = [(cx, y0, cx, y1) for cx in (start_cx + i * grid_s_canvas for i in range(int((x1 - start_cx) / grid_s_canvas) + 2))]
+                    line_coords += [(x0, cy, x1, cy) for cy in (start_cy + i * grid_s_canvas for i in range(int((y1 - start_cy) / grid_s_canvas) + 2))]
+            except ValueError: pass
+
+        canvas = self.canvas; items = self._grid_line_items
+        for item_id, coords in zip(items, line_coords): canvas.coords(item_id, *coords)
+        if len(items) > len(line_coords):
+            canvas.delete(*items[len(line_coords):]); del items[len(line_coords):]
+        elif len(items) < len(line_coords):
+            for coords in line_coords[len(items):]:
+                items.append(canvas.create_line(*coords, fill="lightgrey", dash=(2,2), tags=("gridline", "retained")))
+            canvas.tag_lower("gridline")
+
+    def redraw_canvas(self):
+        # Grid lines, flow lines and connections are tagged "retained" and updated in place by their draw methods; so are
+        # rack items, which are kept for the leading racks whose draw key is unchanged (see the rack loop below)
+        self.canvas.delete("!retained") # Hit-test indexes below rebuild on demand
+        self._rack_spatial_index = None; self._tube_spatial_index = None; self._line_spatial_index = None
+        viewport = self._get_draw_viewport_world()
+        self._draw_grid_lines()
 
         if not self.racks_on_canvas and not self.flow_lines_on_canvas and not self.tube_connections:
             # Center text on canvas, independent of zoom/pan for this message
             self.canvas.create_text(self.CANVAS_WIDTH/2,self.CANVAS_HEIGHT/2,text="Canvas empty. Add racks or load a layout.",fill="darkgray",font=("Arial",12))
+            if self._drawn_rack_keys: self.canvas.delete("rack_item"); self._drawn_rack_keys = []; self._drawn_rack_view = None
         else: # Racks, lines or connections exist
-            # Pre-calculate global tube numbering offsets if enabled
-            self.rack_global_start_indices.clear() # Clear previous calculations
-            if self.show_tube_numbers_var.get():
+            # Pre-calculate global tube numbering offsets if enabled; reused while no rack was added, removed, moved or resized
+            numbering_inputs = tuple((r_cfg['id'], r_cfg['pos_x'], r_cfg['pos_y'], r_cfg.get('x_tubes', 0), r_cfg.get('y_tubes', 0))
+                                     for r_cfg in self.racks_on_canvas) if self._show_tube_numbers else None
+            if numbering_inputs != self._numbering_inputs:
+                self._numbering_inputs = numbering_inputs
+                self.rack_global_start_indices.clear() # Clear previous calculations
+            if numbering_inputs and not self.rack_global_start_indices:
                 current_global_idx = 0
                 try:
                     # Sort racks by visual position (top-to-bottom, then left-to-right)
@@ -1545,30 +1941,74 @@ class FireworkRackPlanner:
                     self.rack_global_start_indices.clear() # Fallback to local numbering
 
             # Draw racks (iterate in current order, numbering will use the map)
-            for rack_config in self.racks_on_canvas:
-                # Check if rack is roughly in view before detailed drawing (basic culling)
-                # This is a very simple culling, more precise would use full rotated bounding box
-                rack_cx_w, rack_cy_w = float(rack_config['pos_x']), float(rack_config['pos_y'])
-                # A more accurate culling would consider rack dimensions + zoom
-                # For now, draw all. Could be optimized later if performance is an issue.
+            self._drawn_selected_ids = set(self.selected_rack_ids) # O(1) selected test per outline
+            # Rack items are pooled: the draw key holds everything a rack's items depend on, and the leading racks whose
+            # key matches the previous redraw keep their items. From the first mismatch on, the old items are deleted and
+            # the rest are drawn on top, so the stacking order is the rack order either way. A drag (selected racks are
+            # brought to the front) or a recolor of the top rack only recreates those racks' items.
+            # Pan is not part of the key: a pan at the same zoom shifts the kept items with one canvas.move instead.
+            drawn_view = self._drawn_rack_view; self._drawn_rack_view = (self.zoom_level, self.pan_offset_x, self.pan_offset_y)
+            if self._drawn_rack_keys and drawn_view and drawn_view[0] == self.zoom_level and drawn_view != self._drawn_rack_view:
+                self.canvas.move("rack_item", (drawn_view[1] - self.pan_offset_x) * self.zoom_level,
+                                 (drawn_view[2] - self.pan_offset_y) * self.zoom_level)
+            view_key = (self.zoom_level, self._show_tube_numbers, self._show_rack_names)
+            previous_keys = self._drawn_rack_keys; drawn_keys = self._drawn_rack_keys = []; reusing = True
+            for rack_index, rack_config in enumerate(self.racks_on_canvas):
+                rack_id = rack_config['id']
+                # Skip racks whose rotated outline lies entirely outside the drawn region; numbering above still covers every rack
+                bbox = self._get_rack_world_bbox(rack_config); tube_viewport = None
+                if bbox:
+                    if bbox[2] < viewport[0] or bbox[0] > viewport[2] or bbox[3] < viewport[1] or bbox[1] > viewport[3]:
+                        drawn_keys.append((rack_id, None)) # No items
+                        if reusing and (rack_index >= len(previous_keys) or previous_keys[rack_index] != drawn_keys[-1]):
+                            reusing = False; self._delete_rack_items(previous_keys[rack_index:], rack_index)
+                        continue
+                    # A rack crossing the region's edge (a big rack while zoomed in) only draws the tubes inside it
+                    if bbox[0] < viewport[0] or bbox[2] > viewport[2] or bbox[1] < viewport[1] or bbox[3] > viewport[3]: tube_viewport = viewport
 
                 start_num_for_this_rack = 0
                 use_global_numbering_for_this_rack = False
-                if self.show_tube_numbers_var.get() and rack_config['id'] in self.rack_global_start_indices:
-                    start_num_for_this_rack = self.rack_global_start_indices[rack_config['id']]
+                if self._show_tube_numbers and rack_id in self.rack_global_start_indices:
+                    start_num_for_this_rack = self.rack_global_start_indices[rack_id]
                     use_global_numbering_for_this_rack = True
                 
+                tube_visuals = _tube_visuals(rack_config['tubes']) # Part of the key, and reused by the tube loop below
+                draw_key = (view_key, tube_viewport, start_num_for_this_rack if use_global_numbering_for_this_rack else None,
+                            rack_id in self._drawn_selected_ids, rack_config['type'], rack_config['x_tubes'], rack_config['y_tubes'],
+                            rack_config['tube_diameter'], rack_config.get('rotation_angle', 0), rack_config['pos_x'], rack_config['pos_y'],
+                            rack_config.get('name'), tube_visuals)
+                drawn_keys.append((rack_id, draw_key))
+                if reusing:
+                    if rack_index < len(previous_keys) and previous_keys[rack_index] == drawn_keys[-1]: continue # Items kept
+                    reusing = False; self._delete_rack_items(previous_keys[rack_index:], rack_index)
+                self._rack_item_tags = (f"rack_items_{rack_id}", "rack_item", "retained")
+
                 if rack_config['type']=="Crate":
-                    self._draw_crate_rack(rack_config, start_num_for_this_rack, use_global_numbering_for_this_rack)
+                    self._draw_crate_rack(rack_config, start_num_for_this_rack, use_global_numbering_for_this_rack, tube_viewport, tube_visuals)
                 elif rack_config['type']=="Fan":
-                    self._draw_fan_rack(rack_config, start_num_for_this_rack, use_global_numbering_for_this_rack)
+                    self._draw_fan_rack(rack_config, start_num_for_this_rack, use_global_numbering_for_this_rack, tube_viewport, tube_visuals)
                 
                 self._draw_rack_name(rack_config) 
-            self._draw_flow_lines()
-            self._draw_tube_connections() 
+            if reusing: self._delete_rack_items(previous_keys[len(drawn_keys):], len(drawn_keys)) # Racks removed from the end
+        # Called even when empty so items of removed lines/connections are deleted; raised above the freshly drawn racks
+        self._draw_flow_lines(viewport); self._draw_tube_connections(viewport)
+        if self._flow_line_items: self.canvas.tag_raise("flow_line")
+        if self._tube_conn_items: self.canvas.tag_raise("tube_connection")
         self._update_canvas_summary_info() 
         if self.first_tube_for_connection: self._highlight_source_tube() 
 
+    def redraw_flow_lines_only(self, lines_changed=False):
+        """
+        Refreshes just the retained flow line items, for edits that touch nothing but flow lines (label, color, deleting
+        one). Racks, the grid and connections stay as drawn. lines_changed=True also refreshes the summary, which
+        depends on whether any flow lines exist. Falls back to redraw_canvas when the canvas becomes empty.
+        """
+        if not self.racks_on_canvas and not self.flow_lines_on_canvas and not self.tube_connections: self.redraw_canvas(); return
+        self._line_spatial_index = None
+        self._draw_flow_lines(self._get_draw_viewport_world())
+        if self._tube_conn_items: self.canvas.tag_raise("tube_connection") # New line items were created on top
+        if lines_changed: self._update_canvas_summary_info()
+
     def save_layout(self):
         filepath=filedialog.asksaveasfilename(defaultextension=".json",filetypes=[("JSON files","*.json"),("All files","*.*")],title="Save Firework Layout")
         if not filepath:return
@@ -1583,7 +2023,15 @@ class FireworkRackPlanner:
                                'pan_offset_x': self.pan_offset_x,
                                'pan_offset_y': self.pan_offset_y
                            }}
-            with open(filepath,'w') as f:json.dump(layout_data,f,indent=4)
+            import json, os # Only needed for save/load, so kept off the startup path
+            # Write compact JSON next to the target and swap it in, so a failed save never leaves a truncated layout behind
+            temp_filepath = filepath + ".tmp"
+            try:
+                with open(temp_filepath,'w') as f:
+                    json.dump(layout_data,f,separators=(',',':')); f.flush(); os.fsync(f.fileno())
+                os.replace(temp_filepath, filepath)
+            finally:
+                if os.path.exists(temp_filepath): os.remove(temp_filepath)
             self.status_var.set(f"Layout saved to {filepath.split('/')[-1]}")
         except Exception as e:messagebox.showerror("Save Error",f"Failed to save layout: {e}");self.status_var.set(f"Error saving layout: {e}")
 
@@ -1591,6 +2039,7 @@ class FireworkRackPlanner:
         filepath=filedialog.askopenfilename(filetypes=[("JSON files","*.json"),("All files","*.*")],title="Load Firework Layout")
         if not filepath:return
         try:
+            import json
             with open(filepath,'r') as f:loaded_data=json.load(f)
             if isinstance(loaded_data, list): 
                 loaded_racks_raw = loaded_data; self.flow_lines_on_canvas = []; self.tube_connections = [] 
@@ -1605,16 +2054,20 @@ class FireworkRackPlanner:
                 self.pan_offset_x = canvas_view_data.get('pan_offset_x', 0.0)
                 self.pan_offset_y = canvas_view_data.get('pan_offset_y', 0.0)
             else: raise ValueError("Invalid file format.")
+            self._reindex_flow_lines()
             loaded_racks_validated=[]
+            # Loop invariants bound once: files can hold hundreds of racks with dozens of tubes each
+            required_keys=('id','type','x_tubes','y_tubes','pos_x','pos_y'); intern = sys.intern
+            valid_colors = self.FUSE_COLOR_NAMES_BY_VALUE; default_color = self.default_new_tube_color_value
             for i, rack_data_loaded in enumerate(loaded_racks_raw): 
                 if not isinstance(rack_data_loaded,dict):continue 
-                required_keys=['id','type','x_tubes','y_tubes','pos_x','pos_y'] 
                 rack_data_loaded.setdefault('name', f"{rack_data_loaded.get('type', 'Rack')} {i+1}") 
                 has_old_colors = 'tube_colors' in rack_data_loaded
                 has_new_tubes = 'tubes' in rack_data_loaded
-                if not (all(k in rack_data_loaded for k in required_keys if k not in ['tubes', 'tube_colors']) and (has_old_colors or has_new_tubes)):
+                if not (all(k in rack_data_loaded for k in required_keys) and (has_old_colors or has_new_tubes)):
                     print(f"Skipping rack due to missing essential keys: {rack_data_loaded.get('id','N/A')}")
                     continue
+                if isinstance(rack_data_loaded['type'], str): rack_data_loaded['type'] = intern(rack_data_loaded['type']) # Compared on every redraw
                 rack_data_loaded.setdefault('rotation_angle',0)
                 rack_data_loaded.setdefault('tube_diameter',self.DEFAULT_TUBE_DIAMETER)
                 try:
@@ -1626,27 +2079,22 @@ class FireworkRackPlanner:
                     rack_data_loaded['rotation_angle']=int(rack_data_loaded['rotation_angle'])
                     num_total_tubes = rack_data_loaded['x_tubes'] * rack_data_loaded['y_tubes']
                     if has_new_tubes and isinstance(rack_data_loaded['tubes'], list):
-                        validated_tubes = []
-                        for tube_entry in rack_data_loaded['tubes']:
-                            if isinstance(tube_entry, dict) and 'color' in tube_entry:
-                                validated_tubes.append({
-                                    'color': tube_entry['color'] if tube_entry['color'] in self.FUSE_COLORS_MAP.values() else self.default_new_tube_color_value,
-                                    'angle': tube_entry.get('angle', 0), 
-                                    'lift_time': tube_entry.get('lift_time', 0.0), # Load lift_time
-                                    'type': tube_entry.get('type', "Standard"), # Load type
-                                    'cue': tube_entry.get('cue', '') # Load cue
-                                })
-                            else: 
-                                validated_tubes.append({'color': self.default_new_tube_color_value, 'angle': 0, 'lift_time': 0.0, 'cue': ''})
-                        rack_data_loaded['tubes'] = validated_tubes
+                        # One comprehension instead of per-tube appends; malformed entries become default tubes
+                        rack_data_loaded['tubes'] = [
+                            {'color': intern(tube_entry['color']) if isinstance(tube_entry['color'], str) and tube_entry['color'] in valid_colors
+                                      else default_color, # Unhashable values (lists, dicts) are not colors either
+                             'angle': tube_entry.get('angle', 0),
+                             'lift_time': tube_entry.get('lift_time', 0.0), # Load lift_time
+                             'type': intern(tube_entry['type']) if isinstance(tube_entry.get('type'), str) else "Standard", # Interned like the draw table keys
+                             'cue': tube_entry.get('cue', '')} # Load cue
+                            if isinstance(tube_entry, dict) and 'color' in tube_entry
+                            else {'color': default_color, 'angle': 0, 'lift_time': 0.0, 'cue': ''}
+                            for tube_entry in rack_data_loaded['tubes']]
                         if 'tube_colors' in rack_data_loaded: del rack_data_loaded['tube_colors'] 
                     elif has_old_colors and isinstance(rack_data_loaded.get('tube_colors'), list):
-                        rack_data_loaded['tubes'] = []
-                        for color_val in rack_data_loaded['tube_colors']:
-                            rack_data_loaded['tubes'].append({
-                                'color': color_val if color_val in self.FUSE_COLORS_MAP.values() else self.default_new_tube_color_value,
-                                'angle': 0, 'lift_time': 0.0, 'type': "Standard", 'cue': ''
-                            })
+                        rack_data_loaded['tubes'] = [{'color': intern(color_val) if isinstance(color_val, str) and color_val in valid_colors else default_color,
+                                                      'angle': 0, 'lift_time': 0.0, 'type': "Standard", 'cue': ''}
+                                                     for color_val in rack_data_loaded['tube_colors']]
                         del rack_data_loaded['tube_colors'] 
                     else: 
                         rack_data_loaded['tubes'] = self._generate_default_tube_data(num_total_tubes)
@@ -1655,124 +2103,227 @@ class FireworkRackPlanner:
                     print(f"Skipping rack due to data type error ({rack_data_loaded.get('id','N/A')}): {ve}")
                     continue
                 loaded_racks_validated.append(rack_data_loaded)
-            self.racks_on_canvas=loaded_racks_validated
+            self.racks_on_canvas=loaded_racks_validated; self._reindex_racks()
             self.selected_rack_ids=[] 
             self.selected_flow_line_id = None
-            self.redraw_canvas()
-            self._update_ui_for_selection_state(); self._update_rack_list_panel()
+            self._redraw_now(refresh_selection_ui=True, refresh_rack_list=True) # One paint, even if a redraw was already scheduled
             self.undo_stack.clear(); self.redo_stack.clear(); self._update_undo_redo_buttons_state()
+            self._delete_detached_inspector_rows() # No undo step can bring the previous layout's racks back
             self.status_var.set(f"Layout loaded. {len(self.racks_on_canvas)} racks, {len(self.flow_lines_on_canvas)} lines, {len(self.tube_connections)} connections.")
         except Exception as e:
             messagebox.showerror("Load Error",f"Failed to load layout: {e}")
             self.status_var.set(f"Error loading layout: {e}")
 
+    def _sync_view_options(self, *trace_args):
+        """Copies the view toggle variables into their plain attribute mirrors whenever one of them is written."""
+        self._snap_to_grid = self.snap_to_grid_enabled.get(); self._show_rack_names = self.show_rack_names_var.get()
+        self._show_tube_numbers = self.show_tube_numbers_var.get(); self._snap_to_racks = self.snap_to_racks_enabled.get()
+
+    def _on_grid_size_return(self, event): self._debounce(0, "grid", self.redraw_canvas_if_valid_grid) # Apply now
+
+    def _on_grid_size_write(self, *trace_args): self._debounce(150, "grid", self.redraw_canvas_if_valid_grid)
+
     def redraw_canvas_if_valid_grid(self, *args, force_redraw=False):
-        if force_redraw: self.redraw_canvas(); return
+        if force_redraw: self.schedule_redraw(); return
         try:
-            if int(self.grid_size_var.get()) > 0: self.redraw_canvas()
+            if int(self.grid_size_var.get()) > 0: self.schedule_redraw()
         except ValueError: pass 
 
     def export_canvas_as_image(self):
-        if not PIL_AVAILABLE: messagebox.showerror("Error", "Pillow library is not installed. Cannot export image."); return
+        if not _ensure_pil(): messagebox.showerror("Error", "Pillow library is not installed. Cannot export image."); return
         filepath = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg")], title="Export Canvas As Image")
         if not filepath: return
+        original_selected_racks = list(self.selected_rack_ids); original_selected_line = self.selected_flow_line_id
         try: 
-            original_selected_racks = list(self.selected_rack_ids); original_selected_line = self.selected_flow_line_id
             self.selected_rack_ids.clear(); self.selected_flow_line_id = None
-            self.redraw_canvas(); self.canvas.update_idletasks() 
-            x1 = self.canvas.winfo_rootx(); y1 = self.canvas.winfo_rooty()
-            x2 = x1 + self.canvas.winfo_width(); y2 = y1 + self.canvas.winfo_height()
-            self.root.after(250, lambda: self._perform_grab_and_restore_selection(filepath, (x1, y1, x2, y2), original_selected_racks, original_selected_line))
-        except Exception as e: messagebox.showerror("Export Error", f"Failed to export image: {e}"); self.status_var.set(f"Error exporting image: {e}")
-
-    def _perform_grab_and_restore_selection(self, filepath, bbox, original_racks, original_line):
-        try:
-            ImageGrab.grab(bbox=bbox).save(filepath)
+            self.redraw_canvas() # Export without selection highlights
+            self._render_canvas_image().save(filepath)
             self.status_var.set(f"Canvas exported to {filepath.split('/')[-1]}")
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to grab and save image: {e}.\nEnsure the window is fully visible.")
-            self.status_var.set(f"Error grabbing image: {e}")
+        except Exception as e: messagebox.showerror("Export Error", f"Failed to export image: {e}"); self.status_var.set(f"Error exporting image: {e}")
         finally:
-            self.selected_rack_ids = original_racks; self.selected_flow_line_id = original_line
+            self.selected_rack_ids = original_selected_racks; self.selected_flow_line_id = original_selected_line
             self.redraw_canvas(); self._update_ui_for_selection_state()
 
+    def _render_canvas_image(self):
+        """
+        Paints the canvas items, bottom to top, into a Pillow image of the visible canvas area. Working from the items
+        themselves instead of grabbing the screen means no wait for Tk to paint, no window chrome, and the window may be
+        covered. Colors and text placement come from Tk (winfo_rgb, bbox); dash patterns are drawn solid.
+        """
+        canvas = self.canvas
+        width = canvas.winfo_width(); height = canvas.winfo_height()
+        if width <= 1 or height <= 1: width, height = self.CANVAS_WIDTH, self.CANVAS_HEIGHT # Not mapped yet
+        origin_x = canvas.canvasx(0); origin_y = canvas.canvasy(0)
+        rgb_by_color = {}; pil_font_by_spec = {}
+        def rgb(color):
+            if not color: return None
+            if color not in rgb_by_color: rgb_by_color[color] = tuple(c // 257 for c in canvas.winfo_rgb(color)) # 16 to 8 bits per channel
+            return rgb_by_color[color]
+        def pil_font(font_spec):
+            if font_spec not in pil_font_by_spec:
+                size = tkfont.Font(root=self.root, font=font_spec).actual("size") # Negative sizes are pixels, positive are points
+                size_px = -size if size < 0 else size * self.root.winfo_fpixels("1p")
+                try: pil_font_by_spec[font_spec] = ImageFont.load_default(size=max(1, size_px))
+                except TypeError: pil_font_by_spec[font_spec] = ImageFont.load_default() # Pillow < 10.1 has one bitmap size
+            return pil_font_by_spec[font_spec]
+
+        image = Image.new("RGB", (width, height), rgb(canvas.cget("bg")))
+        draw = ImageDraw.Draw(image)
+        for item_id in canvas.find_all(): # Display list order, bottom first
+            if canvas.itemcget(item_id, "state") == tk.HIDDEN: continue
+            item_type = canvas.type(item_id); coords = canvas.coords(item_id)
+            points = [(x - origin_x, y - origin_y) for x, y in zip(coords[0::2], coords[1::2])]
+            if item_type == "text":
+                text = canvas.itemcget(item_id, "text"); text_bbox = canvas.bbox(item_id)
+                if text and text_bbox:
+                    draw.text((text_bbox[0] - origin_x, text_bbox[1] - origin_y), text, fill=rgb(canvas.itemcget(item_id, "fill")),
+                              font=pil_font(canvas.itemcget(item_id, "font")))
+                continue
+            line_width = max(1, round(float(canvas.itemcget(item_id, "width") or 1)))
+            if item_type == "line":
+                fill = rgb(canvas.itemcget(item_id, "fill"))
+                if fill is None or len(points) < 2: continue
+                draw.line(points, fill=fill, width=line_width, joint="curve" if canvas.itemcget(item_id, "joinstyle") == tk.ROUND else None)
+                arrow = canvas.itemcget(item_id, "arrow")
+                if arrow in (tk.LAST, tk.BOTH): self._draw_image_arrowhead(draw, points[-2], points[-1], line_width, fill, canvas.itemcget(item_id, "arrowshape"))
+                if arrow in (tk.FIRST, tk.BOTH): self._draw_image_arrowhead(draw, points[1], points[0], line_width, fill, canvas.itemcget(item_id, "arrowshape"))
+                continue
+            fill = rgb(canvas.itemcget(item_id, "fill")); outline = rgb(canvas.itemcget(item_id, "outline"))
+            if item_type in ("oval", "rectangle") and len(points) == 2:
+                (x0, y0), (x1, y1) = points; box = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+                (draw.ellipse if item_type == "oval" else draw.rectangle)(box, fill=fill, outline=outline, width=line_width)
+            elif item_type == "polygon" and len(points) >= 3:
+                draw.polygon(points, fill=fill, outline=outline, width=line_width)
+        return image
+
+    @staticmethod
+    def _draw_image_arrowhead(draw, from_point, tip_point, line_width, fill, arrowshape):
+        """Draws a Tk-style arrowhead (arrowshape "neck-to-tip trailing-to-tip flare") at tip_point into a Pillow ImageDraw."""
+        neck_dist, trailing_dist, flare = (float(v) for v in str(arrowshape).split())
+        dx = tip_point[0] - from_point[0]; dy = tip_point[1] - from_point[1]; length = math.hypot(dx, dy)
+        if not length: return
+        ux, uy = dx / length, dy / length; half_width = flare + line_width / 2
+        trailing_x, trailing_y = tip_point[0] - ux * trailing_dist, tip_point[1] - uy * trailing_dist
+        draw.polygon([tip_point, (trailing_x - uy * half_width, trailing_y + ux * half_width),
+                      (tip_point[0] - ux * neck_dist, tip_point[1] - uy * neck_dist),
+                      (trailing_x + uy * half_width, trailing_y - ux * half_width)], fill=fill)
+
     def apply_rack_name_from_ui(self,event=None): 
         if len(self.selected_rack_ids)==1 and not self.selected_flow_line_id: 
-            rack=next((r for r in self.racks_on_canvas if r['id']==self.selected_rack_ids[0]),None)
+            rack=self._rack_by_id.get(self.selected_rack_ids[0])
             if rack and rack.get('name','') != self.rack_name_var.get().strip():
                 rack['name']=self.rack_name_var.get().strip(); self._record_state_for_undo() 
                 self.status_var.set(f"Rack '{rack['name']}' name updated.")
-                self.redraw_canvas();self._update_rack_list_panel() 
+                self.schedule_redraw(refresh_rack_list=True) 
 
     def apply_flow_line_label_from_ui(self, event=None):
         if self.selected_flow_line_id:
-            line = next((ln for ln in self.flow_lines_on_canvas if ln['id'] == self.selected_flow_line_id), None)
+            line = self._line_by_id.get(self.selected_flow_line_id)
             if line:
                 new_label = self.flow_line_label_var.get().strip()
                 if line.get('label', '') != new_label:
                     line['label'] = new_label
                     self._record_state_for_undo()
                     self.status_var.set(f"Flow line ...{line['id'][-6:]} label updated.")
-                    self.redraw_canvas() 
+                    self.redraw_flow_lines_only() 
 
     def apply_position_from_ui(self,event=None): 
         if len(self.selected_rack_ids)==1 and not self.selected_flow_line_id:
-            rack=next((r for r in self.racks_on_canvas if r['id']==self.selected_rack_ids[0]),None)
+            rack=self._rack_by_id.get(self.selected_rack_ids[0])
             if rack:
                 try:
                     new_x=int(self.pos_x_var.get());new_y=int(self.pos_y_var.get())
                     if float(rack['pos_x'])!=new_x or float(rack['pos_y'])!=new_y: 
                         rack['pos_x']=new_x;rack['pos_y']=new_y; self._record_state_for_undo()
                         self.status_var.set(f"Rack '{rack.get('name', 'Unnamed')}' position updated.")
-                        self.redraw_canvas(); self._update_rack_list_panel() 
+                        self.schedule_redraw(refresh_rack_list=True) 
                 except ValueError:
                     self.status_var.set("Error: Invalid X or Y position.");
                     self.pos_x_var.set(str(int(float(rack['pos_x']))));self.pos_y_var.set(str(int(float(rack['pos_y']))))
 
     def apply_rotation_from_ui(self,event=None): 
         if len(self.selected_rack_ids)==1 and not self.selected_flow_line_id:
-            rack=next((r for r in self.racks_on_canvas if r['id']==self.selected_rack_ids[0]),None)
+            rack=self._rack_by_id.get(self.selected_rack_ids[0])
             if rack and rack.get('rotation_angle')!=int(self.rotation_var.get()):
                 rack['rotation_angle']=int(self.rotation_var.get()); self._record_state_for_undo()
                 self.status_var.set(f"Rack '{rack.get('name', 'Unnamed')}' rotation updated.")
-                self.redraw_canvas()
+                self.schedule_redraw(refresh_rack_list=True) # The list shows the rotation too
             elif not rack: self.status_var.set("Error: Invalid rotation.");self.rotation_var.set(rack.get('rotation_angle',0))
 
 
+    def _on_nudge_left(self, event): self.nudge_selected_racks(-self.NUDGE_AMOUNT, 0)
+
+    def _on_nudge_right(self, event): self.nudge_selected_racks(self.NUDGE_AMOUNT, 0)
+
+    def _on_nudge_up(self, event): self.nudge_selected_racks(0, -self.NUDGE_AMOUNT)
+
+    def _on_nudge_down(self, event): self.nudge_selected_racks(0, self.NUDGE_AMOUNT)
+
     def nudge_selected_racks(self,dx,dy): 
         if self.selected_flow_line_id: self.status_var.set("Nudge not applicable to flow lines."); return
         if not self.selected_rack_ids:self.status_var.set("No racks selected to nudge.");return
         moved_count=0; self._record_state_for_undo() 
         for rack_id in self.selected_rack_ids:
-            rack=next((r for r in self.racks_on_canvas if r['id']==rack_id),None)
+            rack=self._rack_by_id.get(rack_id)
             if rack:rack['pos_x']=float(rack['pos_x'])+dx;rack['pos_y']=float(rack['pos_y'])+dy;moved_count+=1
         if moved_count>0:
-            self.redraw_canvas();
-            if len(self.selected_rack_ids)==1:self._update_ui_for_selection_state() 
-            self.status_var.set(f"Nudged {moved_count} rack(s)."); self._update_rack_list_panel() 
+            # Arrow keys auto-repeat, coalesce the redraw and the list refresh into one per idle tick
+            self.schedule_redraw(refresh_selection_ui=len(self.selected_rack_ids)==1, refresh_rack_list=True)
+            self.status_var.set(f"Nudged {moved_count} rack(s).")
 
     def _update_rack_list_panel(self):
-        for item in self.rack_inspector_tree.get_children():
-            self.rack_inspector_tree.delete(item)
-        
+        """
+        Syncs the inspector Treeview with racks_on_canvas incrementally: rows of removed racks are detached
+        (and reattached if the rack comes back, e.g. on undo), new racks are inserted and existing rows are
+        only reconfigured when their name or values changed.
+        """
+        tree = self.rack_inspector_tree
+        current_rack_ids = [r['id'] for r in self.racks_on_canvas]
+        removed_iids = set(tree.get_children()).difference(current_rack_ids)
+        if removed_iids: tree.detach(*removed_iids); self._detached_inspector_iids.update(removed_iids)
+        if self._detached_inspector_iids: self._detached_inspector_iids.difference_update(current_rack_ids) # Reattached below
+
+        show_global_start = self._show_tube_numbers
+        previous_rows = self._inspector_rows; self._inspector_rows = {} # Rebuilt each refresh so removed racks drop out
         for rack_config in self.racks_on_canvas:
             rack_id = rack_config['id']
+            x_tubes = rack_config.get('x_tubes',0); y_tubes = rack_config.get('y_tubes',0)
+            global_start_idx = self.rack_global_start_indices.get(rack_id) if show_global_start else None
+            row_fields = (rack_config.get('type', 'N/A'), x_tubes, y_tubes, rack_config.get('rotation_angle', 0), global_start_idx)
             name = rack_config.get('name', f"Unnamed Rack ...{rack_id[-6:]}")
-            type_val = rack_config.get('type', 'N/A')
-            dims_val = f"{rack_config.get('x_tubes',0)}x{rack_config.get('y_tubes',0)}"
-            num_tubes_val = rack_config.get('x_tubes',0) * rack_config.get('y_tubes',0)
-            rot_val = rack_config.get('rotation_angle', 0)
-            
-            global_start_val = "N/A"
-            if self.show_tube_numbers_var.get() and rack_id in self.rack_global_start_indices:
-                global_start_val = self.rack_global_start_indices[rack_id] + 1
+            # Row values are only formatted again when one of the fields they come from changed
+            cached_row = previous_rows.get(rack_id)
+            if cached_row is not None and cached_row[0] == row_fields:
+                if cached_row[2] != name: cached_row = (row_fields, cached_row[1], name)
+            else:
+                type_val, _, _, rot_val, _ = row_fields
+                global_start_val = "N/A" if global_start_idx is None else global_start_idx + 1
+                cached_row = (row_fields, (rack_id[-6:], type_val, f"{x_tubes}x{y_tubes}", x_tubes * y_tubes, rot_val, global_start_val), name)
+            self._inspector_rows[rack_id] = cached_row
 
             # Use rack_id as iid for direct mapping
-            self.rack_inspector_tree.insert("", tk.END, iid=rack_id, text=name, values=(
-                rack_id[-6:], type_val, dims_val, num_tubes_val, rot_val, global_start_val
-            ))
+            if not tree.exists(rack_id):
+                tree.insert("", tk.END, iid=rack_id, text=name, values=cached_row[1])
+            elif cached_row is not previous_rows.get(rack_id):
+                tree.item(rack_id, text=name, values=cached_row[1])
+        # Reattach detached rows and follow reordering (e.g. a dragged rack moves to the end of racks_on_canvas),
+        # moving only the rows that are out of order instead of every row
+        shown_ids = list(tree.get_children())
+        if shown_ids != current_rack_ids:
+            rows_to_move = _rows_out_of_order(current_rack_ids, shown_ids); previous_id = None
+            for rack_id in current_rack_ids:
+                if rack_id in rows_to_move: # Goes right after the row before it; shown_ids mirrors the tree to find that index
+                    if rack_id in shown_ids: shown_ids.remove(rack_id)
+                    index = shown_ids.index(previous_id) + 1 if previous_id is not None else 0
+                    shown_ids.insert(index, rack_id); tree.move(rack_id, "", index)
+                previous_id = rack_id
         self._update_rack_list_panel_selection() 
 
+    def _delete_detached_inspector_rows(self):
+        """Deletes the inspector rows kept detached for removed racks, once the undo history that could restore them is gone."""
+        if self._detached_inspector_iids:
+            self.rack_inspector_tree.delete(*self._detached_inspector_iids); self._detached_inspector_iids.clear()
+
     def on_rack_inspector_select(self,event=None): 
         if not event: return 
         selected_iids = self.rack_inspector_tree.selection() # Returns a tuple of iids (which are our rack_ids)
@@ -1792,12 +2343,7 @@ class FireworkRackPlanner:
             self.context_menu_line_id = clicked_line_id; self.redraw_canvas() 
             self._update_ui_for_selection_state(); self.line_context_menu.tk_popup(event.x_root,event.y_root)
         else: 
-            clicked_rack_config=None 
-            for rack_config_iter in reversed(self.racks_on_canvas):
-                # _get_rack_dimensions_and_points returns world outline, _is_point_in_polygon expects world points
-                _,outline_points_world,_,_,_=self._get_rack_dimensions_and_points(rack_config_iter)
-                if self._is_point_in_polygon(world_x, world_y, outline_points_world): 
-                    clicked_rack_config=rack_config_iter; break
+            clicked_rack_config=self._get_rack_at_world_coords(world_x, world_y)
             if clicked_rack_config: 
                 self.context_menu_rack_id=clicked_rack_config['id']
                 if clicked_rack_config['id'] not in self.selected_rack_ids:
@@ -1809,13 +2355,11 @@ class FireworkRackPlanner:
 
     def change_selected_line_color(self, new_color):
         line_id_to_change = self.context_menu_line_id if self.context_menu_line_id else self.selected_flow_line_id
-        if line_id_to_change:
-            for line_data in self.flow_lines_on_canvas:
-                if line_data['id'] == line_id_to_change and line_data.get('color') != new_color:
-                    line_data['color'] = new_color; self._record_state_for_undo() 
-                    self.redraw_canvas(); self.status_var.set(f"Flow line ...{line_id_to_change[-6:]} color changed.")
-                    self._update_ui_for_selection_state() 
-                    break
+        line_data = self._line_by_id.get(line_id_to_change) if line_id_to_change else None
+        if line_data and line_data.get('color') != new_color:
+            line_data['color'] = new_color; self._record_state_for_undo() 
+            self.redraw_flow_lines_only(); self.status_var.set(f"Flow line ...{line_id_to_change[-6:]} color changed.")
+            self._update_ui_for_selection_state() 
         self.context_menu_line_id = None 
 
     def open_tube_recolor_dialog_ctx(self):
@@ -1833,7 +2377,7 @@ class FireworkRackPlanner:
     def open_tube_recolor_dialog(self):
         if len(self.selected_rack_ids)!=1:messagebox.showinfo("Select Rack","Please select exactly one rack to recolor its tubes.",parent=self.root);return
         selected_rack_id=self.selected_rack_ids[0]
-        rack_to_recolor=next((r for r in self.racks_on_canvas if r['id']==selected_rack_id),None)
+        rack_to_recolor=self._rack_by_id.get(selected_rack_id)
         if rack_to_recolor:
             self._record_state_for_undo() 
             current_rotation = rack_to_recolor.get('rotation_angle', 0)
@@ -1853,7 +2397,7 @@ class FireworkRackPlanner:
             messagebox.showinfo("Select Rack", "Please select exactly one rack to edit its tube types.", parent=self.root)
             return
         selected_rack_id = self.selected_rack_ids[0]
-        rack_to_edit = next((r for r in self.racks_on_canvas if r['id'] == selected_rack_id), None)
+        rack_to_edit = self._rack_by_id.get(selected_rack_id)
         if rack_to_edit:
             self._record_state_for_undo() 
             current_rotation = rack_to_edit.get('rotation_angle', 0)
@@ -1887,7 +2431,7 @@ class FireworkRackPlanner:
                          'pos_x':pos_x_world,'pos_y':pos_y_world,'tube_diameter':tube_diameter_world,'rotation_angle':rotation,
                          'tubes':initial_tubes_data} 
             
-            self._record_state_for_undo(); self.racks_on_canvas.append(rack_config)
+            self._record_state_for_undo(); self.racks_on_canvas.append(rack_config); self._rack_by_id[rack_config['id']] = rack_config
             self.selected_rack_ids=[rack_config['id']]; self.selected_flow_line_id = None 
             if self.connecting_tubes_mode or self.drawing_flow_line_mode: 
                 self.toggle_connect_tubes_mode(force_off=True); self.toggle_draw_flow_line_mode() 
@@ -1902,77 +2446,68 @@ class FireworkRackPlanner:
         except Exception as e:self.status_var.set(f"An unexpected error occurred: {e}")
 
     def load_rack_config_to_ui(self,rack_config):
-        self.rack_name_var.set(rack_config.get('name', ''))
-        self.rack_type_var.set(rack_config['type']);self.x_tubes_var.set(str(rack_config['x_tubes']))
-        self.y_tubes_var.set(str(rack_config['y_tubes']));
+        set_var = _set_var_if_changed # Reselecting a rack, or one like it, leaves most fields as they are
+        set_var(self.rack_name_var, rack_config.get('name', ''))
+        set_var(self.rack_type_var, rack_config['type']);set_var(self.x_tubes_var, str(rack_config['x_tubes']))
+        set_var(self.y_tubes_var, str(rack_config['y_tubes']));
         # Rack positions are stored in world coords, display them as such
-        self.pos_x_var.set(str(int(rack_config['pos_x']))) 
-        self.pos_y_var.set(str(int(rack_config['pos_y'])))
-        self.tube_diameter_var.set(str(rack_config['tube_diameter'])) # Diameter is world unit
-        self.rotation_var.set(rack_config.get('rotation_angle',0))
-        self.physical_dims_var.set(self._calculate_physical_dimensions(rack_config)) 
-        self.tube_color_breakdown_var.set(self._calculate_tube_color_breakdown(rack_config)) 
+        set_var(self.pos_x_var, str(int(rack_config['pos_x']))) 
+        set_var(self.pos_y_var, str(int(rack_config['pos_y'])))
+        set_var(self.tube_diameter_var, str(rack_config['tube_diameter'])) # Diameter is world unit
+        set_var(self.rotation_var, rack_config.get('rotation_angle',0))
+        set_var(self.physical_dims_var, self._calculate_physical_dimensions(rack_config)) 
+        set_var(self.tube_color_breakdown_var, self._calculate_tube_color_breakdown(rack_config)) 
 
     def load_line_config_to_ui(self, line_data):
-        self.flow_line_label_var.set(line_data.get('label', ''))
+        _set_var_if_changed(self.flow_line_label_var, line_data.get('label', ''))
         len_world = math.hypot(line_data['x2'] - line_data['x1'], line_data['y2'] - line_data['y1'])
         # Assume line length is in same 'world units' as racks. If these are inches:
         len_feet = len_world / self.INCHES_PER_FOOT
-        self.flow_line_length_var.set(f"{len_feet:.2f} {self.FUSE_ESTIMATE_UNIT}") # Show more precision for feet
+        _set_var_if_changed(self.flow_line_length_var, f"{len_feet:.2f} {self.FUSE_ESTIMATE_UNIT}") # Show more precision for feet
         burn_time_sec = 0.0
-        line_color_value = line_data.get('color')
-        matching_fuse_color_value = None
-        # Find if the line's current color (e.g., 'darkred') matches a FUSE_COLOR_MAP value (e.g., 'red')
-        # to then find its burn rate key (e.g., 'red')
-        for fuse_name, fuse_val in self.FUSE_COLORS_MAP.items():
-            if line_color_value == fuse_val: # If line's color is 'red', it matches FUSE_COLORS_MAP['Red']
-                 if fuse_val in self.FUSE_BURN_RATES_SPF: # Check if 'red' (value) is a key in burn rates
-                    matching_fuse_color_value = fuse_val
-                    break
-            elif line_color_value in self.FUSE_BURN_RATES_SPF: # Check if line_color_value is already a direct key
-                 matching_fuse_color_value = line_color_value
-                 break
-        
-        if matching_fuse_color_value:
-            burn_rate_spf = self.FUSE_BURN_RATES_SPF[matching_fuse_color_value]
-            # length_feet is already calculated above
+        # Burn rates are keyed by the fuse color values used for drawing (e.g. 'lightblue'), so the line's color is the key;
+        # colors without a burn rate (e.g. 'darkred') have no burn time
+        burn_rate_spf = self.FUSE_BURN_RATES_SPF.get(line_data.get('color'))
+        if burn_rate_spf is not None:
             burn_time_sec = len_feet * burn_rate_spf
-        self.flow_line_burn_time_var.set(f"{burn_time_sec:.1f}s" if burn_time_sec > 0 else "N/A")
+        _set_var_if_changed(self.flow_line_burn_time_var, f"{burn_time_sec:.1f}s" if burn_time_sec > 0 else "N/A")
 
 
     def _clear_input_fields_for_multi_or_no_selection(self,for_multi=False, item_type="rack"):
+        set_var = _set_var_if_changed # Called on every selection change; most fields already hold these values
         if item_type == "line":
-            self.rack_name_var.set("Flow Line Selected") 
-            self.pos_x_var.set("---"); self.pos_y_var.set("---") 
-            self.physical_dims_var.set("N/A"); self.tube_color_breakdown_var.set("N/A") 
-            self.rack_type_var.set("---"); self.x_tubes_var.set("---"); self.y_tubes_var.set("---")
-            self.tube_diameter_var.set("---"); self.rotation_dropdown.set("---")
+            set_var(self.rack_name_var, "Flow Line Selected") 
+            set_var(self.pos_x_var, "---"); set_var(self.pos_y_var, "---") 
+            set_var(self.physical_dims_var, "N/A"); set_var(self.tube_color_breakdown_var, "N/A") 
+            set_var(self.rack_type_var, "---"); set_var(self.x_tubes_var, "---"); set_var(self.y_tubes_var, "---")
+            set_var(self.tube_diameter_var, "---"); self.rotation_dropdown.set("---")
         elif for_multi: 
-            self.rack_name_var.set("Multiple Selected")
-            self.pos_x_var.set("---"); self.pos_y_var.set("---")
-            self.physical_dims_var.set("Multiple"); self.tube_color_breakdown_var.set("Multiple") 
-            self.rack_type_var.set("---"); self.x_tubes_var.set("---"); self.y_tubes_var.set("---")
-            self.tube_diameter_var.set("---"); self.rotation_dropdown.set("---")
+            set_var(self.rack_name_var, "Multiple Selected")
+            set_var(self.pos_x_var, "---"); set_var(self.pos_y_var, "---")
+            set_var(self.physical_dims_var, "Multiple"); set_var(self.tube_color_breakdown_var, "Multiple") 
+            set_var(self.rack_type_var, "---"); set_var(self.x_tubes_var, "---"); set_var(self.y_tubes_var, "---")
+            set_var(self.tube_diameter_var, "---"); self.rotation_dropdown.set("---")
         else: 
-            self.rack_name_var.set("")
-            self.physical_dims_var.set("N/A"); self.tube_color_breakdown_var.set("N/A") 
-            self.rack_type_var.set("Crate"); self.x_tubes_var.set("3"); self.y_tubes_var.set("2")
+            set_var(self.rack_name_var, "")
+            set_var(self.physical_dims_var, "N/A"); set_var(self.tube_color_breakdown_var, "N/A") 
+            set_var(self.rack_type_var, "Crate"); set_var(self.x_tubes_var, "3"); set_var(self.y_tubes_var, "2")
             # Pos X/Y for new racks are suggested based on last added rack, or default if canvas empty
-            self.pos_x_var.set(str(self.DEFAULT_RACK_POS_X_WORLD)) # Reset to default world pos
-            self.pos_y_var.set(str(self.DEFAULT_RACK_POS_Y_WORLD))
-            self.tube_diameter_var.set(str(self.DEFAULT_TUBE_DIAMETER)); self.rotation_var.set(0)
+            set_var(self.pos_x_var, str(self.DEFAULT_RACK_POS_X_WORLD)) # Reset to default world pos
+            set_var(self.pos_y_var, str(self.DEFAULT_RACK_POS_Y_WORLD))
+            set_var(self.tube_diameter_var, str(self.DEFAULT_TUBE_DIAMETER)); set_var(self.rotation_var, 0)
         
         if item_type != "line":
-            self.flow_line_label_var.set(""); self.flow_line_length_var.set("N/A"); self.flow_line_burn_time_var.set("N/A")
+            set_var(self.flow_line_label_var, ""); set_var(self.flow_line_length_var, "N/A"); set_var(self.flow_line_burn_time_var, "N/A")
 
 
     def _reset_input_fields_to_defaults(self): 
-        self.rack_name_var.set(""); self.rack_type_var.set("Crate");self.x_tubes_var.set("3");self.y_tubes_var.set("2")
+        set_var = _set_var_if_changed # Fields already at their defaults are left untouched
+        set_var(self.rack_name_var, ""); set_var(self.rack_type_var, "Crate");set_var(self.x_tubes_var, "3");set_var(self.y_tubes_var, "2")
         # Keep self.pos_x_var and self.pos_y_var as they are for next placement suggestion
-        self.pos_x_var.set(str(self.DEFAULT_RACK_POS_X_WORLD)); self.pos_y_var.set(str(self.DEFAULT_RACK_POS_Y_WORLD))
-        self.tube_diameter_var.set(str(self.DEFAULT_TUBE_DIAMETER)); self.rotation_var.set(0)
-        self.physical_dims_var.set("N/A"); self.tube_color_breakdown_var.set("N/A") 
-        self.flow_line_label_var.set(""); self.flow_line_length_var.set("N/A"); self.flow_line_burn_time_var.set("N/A")
+        set_var(self.pos_x_var, str(self.DEFAULT_RACK_POS_X_WORLD)); set_var(self.pos_y_var, str(self.DEFAULT_RACK_POS_Y_WORLD))
+        set_var(self.tube_diameter_var, str(self.DEFAULT_TUBE_DIAMETER)); set_var(self.rotation_var, 0)
+        set_var(self.physical_dims_var, "N/A"); set_var(self.tube_color_breakdown_var, "N/A") 
+        set_var(self.flow_line_label_var, ""); set_var(self.flow_line_length_var, "N/A"); set_var(self.flow_line_burn_time_var, "N/A")
 
 
     def _set_input_fields_state(self,item_type="none"): 
@@ -1980,59 +2515,62 @@ class FireworkRackPlanner:
             self.rack_name_entry, self.rack_type_dropdown, self.x_tubes_entry, self.y_tubes_entry,
             self.tube_diameter_entry, self.rotation_dropdown, self.pos_x_entry, self.pos_y_entry
         ]
-        all_line_input_widgets = [self.flow_line_label_entry]
-        # Disable all input fields first
-        for widget in all_rack_input_widgets + all_line_input_widgets:
-            if isinstance(widget, ttk.Combobox): widget.config(state=tk.DISABLED)
-            else: widget.config(state=tk.DISABLED)
-        
-        if item_type == "rack": 
-            for widget in all_rack_input_widgets:
-                if isinstance(widget, ttk.Combobox): widget.config(state="readonly")
-                else: widget.config(state=tk.NORMAL)
-        elif item_type == "line": 
-            self.flow_line_label_entry.config(state=tk.NORMAL)
-        elif item_type == "none": # Preparing to add new rack
-            for widget in all_rack_input_widgets:
-                 if isinstance(widget, ttk.Combobox): widget.config(state="readonly")
-                 else: widget.config(state=tk.NORMAL)
-        # For "multi_rack", all relevant (rack) fields remain disabled.
+        # Rack fields are editable for a single rack and when preparing to add a new rack ("none"); for "multi_rack"
+        # everything stays disabled. Each widget is configured only if its state differs from the last one applied
+        rack_fields_enabled = item_type in ("rack", "none")
+        target_states = [(widget, ("readonly" if isinstance(widget, ttk.Combobox) else tk.NORMAL) if rack_fields_enabled else tk.DISABLED)
+                         for widget in all_rack_input_widgets]
+        target_states.append((self.flow_line_label_entry, tk.NORMAL if item_type == "line" else tk.DISABLED))
+        applied_states = self._input_field_states
+        for widget, state in target_states:
+            if applied_states.get(widget) != state: widget.config(state=state); applied_states[widget] = state
 
 
     def _update_ui_for_selection_state(self):
         num_selected_racks =len(self.selected_rack_ids)
+        selection_kind = ("line" if self.selected_flow_line_id else "rack" if num_selected_racks == 1
+                          else "multi_rack" if num_selected_racks > 1 else "none")
+        # Panel layout and widget states only depend on the kind of selection; field contents and status are always refreshed
+        if selection_kind != self._selection_ui_kind: self._apply_selection_ui_kind(selection_kind)
         if self.selected_flow_line_id: 
-            self.rack_props_frame.grid_remove(); self.line_props_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N), pady=5, padx=5) 
-            line_to_load = next((ln for ln in self.flow_lines_on_canvas if ln['id'] == self.selected_flow_line_id), None)
+            line_to_load = self._line_by_id.get(self.selected_flow_line_id)
             if line_to_load: self.load_line_config_to_ui(line_to_load)
             else: self._clear_input_fields_for_multi_or_no_selection(item_type="line") # Clear if line not found
-            self._set_input_fields_state(item_type="line")
             self.status_var.set(f"Flow line ...{self.selected_flow_line_id[-6:]} selected.")
-            if hasattr(self,'recolor_tubes_btn'):self.recolor_tubes_btn.config(state=tk.DISABLED)
-            if hasattr(self, 'edit_types_btn'): self.edit_types_btn.config(state=tk.DISABLED)
         elif num_selected_racks==1: 
-            self.line_props_frame.grid_remove(); self.rack_props_frame.grid() 
-            rack_to_load=next((r for r in self.racks_on_canvas if r['id']==self.selected_rack_ids[0]),None)
+            rack_to_load=self._rack_by_id.get(self.selected_rack_ids[0])
             if rack_to_load:self.load_rack_config_to_ui(rack_to_load) 
-            self._set_input_fields_state(item_type="rack") 
             self.status_var.set(f"Selected: '{rack_to_load.get('name', 'Unnamed')}' (ID: ...{self.selected_rack_ids[0][-6:]}).")
-            if hasattr(self,'recolor_tubes_btn'):self.recolor_tubes_btn.config(state=tk.NORMAL)
-            if hasattr(self, 'edit_types_btn'): self.edit_types_btn.config(state=tk.NORMAL)
         elif num_selected_racks > 1: 
-            self.line_props_frame.grid_remove(); self.rack_props_frame.grid()
             self._clear_input_fields_for_multi_or_no_selection(for_multi=True, item_type="rack")
-            self._set_input_fields_state(item_type="multi_rack") 
             self.status_var.set(f"{num_selected_racks} racks selected. Batch actions apply.")
-            if hasattr(self,'recolor_tubes_btn'):self.recolor_tubes_btn.config(state=tk.DISABLED)
-            if hasattr(self, 'edit_types_btn'): self.edit_types_btn.config(state=tk.DISABLED)
         else: 
-            self.line_props_frame.grid_remove(); self.rack_props_frame.grid()
             self._reset_input_fields_to_defaults() 
-            self._set_input_fields_state(item_type="none") 
             self.status_var.set("Canvas active. No item selected.")
-            if hasattr(self,'recolor_tubes_btn'):self.recolor_tubes_btn.config(state=tk.DISABLED)
-            if hasattr(self, 'edit_types_btn'): self.edit_types_btn.config(state=tk.DISABLED)
-        self._update_rack_list_panel_selection() 
+        self._schedule_tree_selection_sync() 
+
+    def _apply_selection_ui_kind(self, selection_kind):
+        """Shows the properties frame and sets the input field and tube button states for a selection kind (see _set_input_fields_state)."""
+        self._selection_ui_kind = selection_kind
+        if selection_kind == "line":
+            self.rack_props_frame.grid_remove(); self.line_props_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N), pady=5, padx=5) 
+        else:
+            self.line_props_frame.grid_remove(); self.rack_props_frame.grid()
+        self._set_input_fields_state(item_type=selection_kind)
+        tube_buttons_state = tk.NORMAL if selection_kind == "rack" else tk.DISABLED # Tube dialogs edit a single rack
+        if hasattr(self,'recolor_tubes_btn'):self.recolor_tubes_btn.config(state=tube_buttons_state)
+        if hasattr(self, 'edit_types_btn'): self.edit_types_btn.config(state=tube_buttons_state)
+
+    def _schedule_tree_selection_sync(self):
+        """Syncs the inspector selection on the next idle cycle, once however many times the selection changes before then."""
+        if self._tree_selection_sync_pending: return
+        self._tree_selection_sync_pending = True
+        self.root.after_idle(self._flush_tree_selection_sync)
+
+    def _flush_tree_selection_sync(self):
+        self._tree_selection_sync_pending = False
+        if self._redraw_pending and self._redraw_refresh_rack_list: return # That list refresh ends with the sync, after adding new rows
+        self._update_rack_list_panel_selection()
 
     def _update_rack_list_panel_selection(self):
         current_selection = self.rack_inspector_tree.selection()
@@ -2047,7 +2585,9 @@ class FireworkRackPlanner:
     def clear_all_racks(self):
         if messagebox.askyesno("Confirm Clear","Are you sure you want to clear all racks from the canvas?\nThis action cannot be undone via the Undo button for individual racks.",icon='warning'):
             self._record_state_for_undo(); deleted_rack_ids = {r['id'] for r in self.racks_on_canvas} 
-            self.racks_on_canvas=[];self.selected_rack_ids=[];self.dragging_rack_id=None
+            self.racks_on_canvas=[];self.selected_rack_ids=[];self.dragging_rack_id=None; self._rack_by_id.clear(); self._rack_geom_cache.clear()
+            self._rack_shape_geom_cache.clear()
+            self._rack_color_counts.clear()
             self.tube_connections = [c for c in self.tube_connections if c['source_rack_id'] not in deleted_rack_ids and c['target_rack_id'] not in deleted_rack_ids]
             self.redraw_canvas()
             self.pos_x_var.set(str(self.DEFAULT_RACK_POS_X_WORLD)) # Reset to default world pos
@@ -2057,6 +2597,7 @@ class FireworkRackPlanner:
 
     def on_canvas_press(self,event):
         if self.drawing_flow_line_mode or self.connecting_tubes_mode: return 
+        self._press_xy = (event.x, event.y); self._drag_active = False; self._drag_targets = None; self._snap_edges = None; self._last_drag_snap_key = None
         
         world_event_x, world_event_y = self.canvas_to_world(event.x, event.y)
         clicked_line_id = self._get_line_under_mouse(world_event_x, world_event_y)
@@ -2067,10 +2608,7 @@ class FireworkRackPlanner:
             if not is_ctrl_click: self.selected_flow_line_id = clicked_line_id
             self.selected_rack_ids.clear(); self.dragging_rack_id = None; self.drag_operation_pending_undo_state = None 
         else: 
-            for rack_config_iter in reversed(self.racks_on_canvas): 
-                _,outline_points_world,_,_,_=self._get_rack_dimensions_and_points(rack_config_iter) # Outline is in world
-                if self._is_point_in_polygon(world_event_x, world_event_y, outline_points_world): 
-                    clicked_on_rack_config=rack_config_iter; break
+            clicked_on_rack_config = self._get_rack_at_world_coords(world_event_x, world_event_y)
             if clicked_on_rack_config: 
                 self.selected_flow_line_id = None; self.drag_operation_pending_undo_state = self._capture_current_state() 
                 self.dragging_rack_id=clicked_on_rack_config['id'] 
@@ -2082,7 +2620,7 @@ class FireworkRackPlanner:
                 if is_multi_drag_candidate: 
                     self.drag_start_positions.clear()
                     for r_id in self.selected_rack_ids:
-                        r_sel = next((r for r in self.racks_on_canvas if r['id'] == r_id), None)
+                        r_sel = self._rack_by_id.get(r_id)
                         if r_sel: self.drag_start_positions[r_id] = (float(r_sel['pos_x']), float(r_sel['pos_y']))
                 else: 
                      self.drag_start_positions.clear()
@@ -2093,20 +2631,30 @@ class FireworkRackPlanner:
                 elif not is_shift_click and (clicked_on_rack_config['id'] not in self.selected_rack_ids or len(self.selected_rack_ids) > 1):
                     self.selected_rack_ids=[clicked_on_rack_config['id']]
                 if self.selected_rack_ids and clicked_on_rack_config and clicked_on_rack_config['id'] in self.selected_rack_ids: 
-                    selected_racks_to_move = [r for r in self.racks_on_canvas if r['id'] in self.selected_rack_ids]
-                    self.racks_on_canvas = [r for r in self.racks_on_canvas if r['id'] not in self.selected_rack_ids]
-                    selected_racks_to_move.remove(clicked_on_rack_config); selected_racks_to_move.append(clicked_on_rack_config)
-                    self.racks_on_canvas.extend(selected_racks_to_move)
+                    # Bring the selection to the front, clicked rack topmost. Pressing the same selection again (as each drag
+                    # does) finds it already on top in that order, which only needs the last len(selection) racks checked
+                    selected_ids_set = set(self.selected_rack_ids); top_racks = self.racks_on_canvas[-len(selected_ids_set):]
+                    if not (top_racks[-1] is clicked_on_rack_config and all(r['id'] in selected_ids_set for r in top_racks)):
+                        racks_behind = []; selected_racks_to_move = []
+                        for r in self.racks_on_canvas: # One partitioning pass
+                            if r is clicked_on_rack_config: continue
+                            (selected_racks_to_move if r['id'] in selected_ids_set else racks_behind).append(r)
+                        selected_racks_to_move.append(clicked_on_rack_config)
+                        racks_behind.extend(selected_racks_to_move); self.racks_on_canvas = racks_behind
             elif not is_shift_click: 
                 if not is_ctrl_click: self.selected_rack_ids.clear(); self.selected_flow_line_id = None 
                 self.dragging_rack_id=None; self.drag_operation_pending_undo_state = None; self.drag_start_positions.clear()
         if not is_shift_click or clicked_line_id : self._update_ui_for_selection_state()
-        self.redraw_canvas()
+        self.schedule_redraw() # Shares the idle-time redraw with the drag motion events that usually follow
 
     def on_canvas_drag(self,event):
         if self.selected_flow_line_id or self.drawing_flow_line_mode or self.connecting_tubes_mode or self._is_panning: return
         if not self.dragging_rack_id: return 
-        primary_rack_dragged = next((r for r in self.racks_on_canvas if r['id'] == self.dragging_rack_id), None)
+        if not self._drag_active: # Ignore jitter during a click until the mouse leaves the threshold radius
+            dx = event.x - self._press_xy[0]; dy = event.y - self._press_xy[1]
+            if dx * dx + dy * dy < self.DRAG_START_THRESHOLD * self.DRAG_START_THRESHOLD: return
+            self._drag_active = True
+        primary_rack_dragged = self._rack_by_id.get(self.dragging_rack_id)
         if not primary_rack_dragged: return 
         
         world_event_x, world_event_y = self.canvas_to_world(event.x, event.y)
@@ -2116,128 +2664,157 @@ class FireworkRackPlanner:
         orig_primary_start_x_w, orig_primary_start_y_w = self.drag_start_positions.get(self.dragging_rack_id, (proposed_primary_x_world, proposed_primary_y_world))
         
         snapped_x_world = proposed_primary_x_world; snapped_y_world = proposed_primary_y_world
-        if self.snap_to_grid_enabled.get():
+        if self._snap_to_grid:
             try:
                 grid_s_world = int(self.grid_size_var.get()) # Grid size is world units
                 if grid_s_world > 0:
                     snapped_x_world = round(proposed_primary_x_world / grid_s_world) * grid_s_world
                     snapped_y_world = round(proposed_primary_y_world / grid_s_world) * grid_s_world
             except ValueError: pass 
-        if self.snap_to_racks_enabled.get(): 
+        # Rack snapping depends only on this position and the zoom, so motion that stays within a grid cell has nothing to move
+        drag_snap_key = (snapped_x_world, snapped_y_world, self.zoom_level)
+        if drag_snap_key == self._last_drag_snap_key: return
+        self._last_drag_snap_key = drag_snap_key
+        if self._snap_to_racks: 
              snapped_x_world, snapped_y_world = self._snap_rack(primary_rack_dragged, snapped_x_world, snapped_y_world, self.dragging_rack_id if len(self.selected_rack_ids) > 1 else None)
         
         delta_x_world = snapped_x_world - orig_primary_start_x_w; 
         delta_y_world = snapped_y_world - orig_primary_start_y_w
         
-        if self.drag_start_positions and len(self.selected_rack_ids) > 0 : 
-            for r_id in self.selected_rack_ids: 
-                rack_to_move = next((r for r in self.racks_on_canvas if r['id'] == r_id), None)
-                if rack_to_move and r_id in self.drag_start_positions: 
-                    original_pos_w = self.drag_start_positions[r_id]
-                    rack_to_move['pos_x'] = original_pos_w[0] + delta_x_world; 
-                    rack_to_move['pos_y'] = original_pos_w[1] + delta_y_world
+        # The selection and start positions are fixed while the button is held, so the racks to move are resolved once per drag
+        drag_targets = self._drag_targets
+        if drag_targets is None:
+            drag_targets = self._drag_targets = [(self._rack_by_id[r_id], self.drag_start_positions[r_id]) for r_id in self.selected_rack_ids
+                                                 if r_id in self._rack_by_id and r_id in self.drag_start_positions]
+        for rack_to_move, (original_x_w, original_y_w) in drag_targets:
+            rack_to_move['pos_x'] = original_x_w + delta_x_world; rack_to_move['pos_y'] = original_y_w + delta_y_world
         
         if len(self.selected_rack_ids)==1 and self.selected_rack_ids[0]==self.dragging_rack_id:
-            moved_rack_config = next((r for r in self.racks_on_canvas if r['id'] == self.dragging_rack_id), None)
+            moved_rack_config = self._rack_by_id.get(self.dragging_rack_id)
             if moved_rack_config: # Positions are world, display as world
                 self.pos_x_var.set(str(int(moved_rack_config['pos_x']))); 
                 self.pos_y_var.set(str(int(moved_rack_config['pos_y'])))
-        self.redraw_canvas()
+        self.schedule_redraw() # Coalesce motion events arriving faster than the canvas can redraw
 
     def _snap_rack(self,dragged_rack_config,current_x_world,current_y_world, primary_drag_id_for_group=None):
-        snapped_x_w,snapped_y_w = current_x_world,current_y_world
-        temp_dragged_config = dragged_rack_config.copy()
-        temp_dragged_config['pos_x']=current_x_world;temp_dragged_config['pos_y']=current_y_world
-        _,dragged_outline_world,_,_,_=self._get_rack_dimensions_and_points(temp_dragged_config)
-        if not dragged_outline_world:return current_x_world,current_y_world 
+        dragged_bbox = self._get_rack_world_bbox(dragged_rack_config)
+        if not dragged_bbox:return current_x_world,current_y_world 
+        # Geometry only translates with pos_x/pos_y, so shift the cached bbox to the hypothetical position instead of recomputing it
+        shift_xw = current_x_world - float(dragged_rack_config['pos_x']); shift_yw = current_y_world - float(dragged_rack_config['pos_y'])
+        drag_min_xw=dragged_bbox[0]+shift_xw;drag_max_xw=dragged_bbox[2]+shift_xw
+        drag_min_yw=dragged_bbox[1]+shift_yw;drag_max_yw=dragged_bbox[3]+shift_yw
         
-        drag_min_xw=min(p[0] for p in dragged_outline_world);drag_max_xw=max(p[0] for p in dragged_outline_world)
-        drag_min_yw=min(p[1] for p in dragged_outline_world);drag_max_yw=max(p[1] for p in dragged_outline_world)
-        
-        ids_in_drag_group = set(self.selected_rack_ids) if primary_drag_id_for_group and len(self.selected_rack_ids) > 1 else {dragged_rack_config['id']}
+        ids_in_drag_group = (frozenset(self.selected_rack_ids) if primary_drag_id_for_group and len(self.selected_rack_ids) > 1
+                             else frozenset((dragged_rack_config['id'],)))
         world_snap_threshold = self.SNAP_THRESHOLD / self.zoom_level # Convert canvas snap threshold to world
 
-        for other_rack in self.racks_on_canvas:
-            if other_rack['id'] in ids_in_drag_group:continue 
-            _,other_outline_world,_,_,_=self._get_rack_dimensions_and_points(other_rack)
-            if not other_outline_world:continue
-            other_min_xw=min(p[0] for p in other_outline_world);other_max_xw=max(p[0] for p in other_outline_world)
-            other_min_yw=min(p[1] for p in other_outline_world);other_max_yw=max(p[1] for p in other_outline_world)
-            
-            potential_snapped_xw = snapped_x_w 
-            if abs(drag_min_xw - other_max_xw) < world_snap_threshold: potential_snapped_xw = current_x_world + (other_max_xw - drag_min_xw)
-            elif abs(drag_max_xw - other_min_xw) < world_snap_threshold: potential_snapped_xw = current_x_world + (other_min_xw - drag_max_xw)
-            elif abs(drag_min_xw - other_min_xw) < world_snap_threshold: potential_snapped_xw = current_x_world + (other_min_xw - drag_min_xw)
-            elif abs(drag_max_xw - other_max_xw) < world_snap_threshold: potential_snapped_xw = current_x_world + (other_max_xw - drag_max_xw)
-            
-            potential_snapped_yw = snapped_y_w 
-            if abs(drag_min_yw - other_max_yw) < world_snap_threshold: potential_snapped_yw = current_y_world + (other_max_yw - drag_min_yw)
-            elif abs(drag_max_yw - other_min_yw) < world_snap_threshold: potential_snapped_yw = current_y_world + (other_min_yw - drag_max_yw)
-            elif abs(drag_min_yw - other_min_yw) < world_snap_threshold: potential_snapped_yw = current_y_world + (other_min_yw - drag_min_yw)
-            elif abs(drag_max_yw - other_max_yw) < world_snap_threshold: potential_snapped_yw = current_y_world + (other_max_yw - drag_max_yw)
-
-            if potential_snapped_xw != snapped_x_w : snapped_x_w = potential_snapped_xw
-            if potential_snapped_yw != snapped_y_w : snapped_y_w = potential_snapped_yw
+        # The other racks stay put during a drag, so their edges are sorted once per drag and range-queried on each motion event
+        snap_edges = self._snap_edges
+        if snap_edges is None or snap_edges[0] != ids_in_drag_group:
+            snap_edges = self._snap_edges = (ids_in_drag_group,) + self._build_snap_edges(ids_in_drag_group)
+        _, x_edges, y_edges = snap_edges
+        snapped_x_w = self._snap_axis(current_x_world, drag_min_xw, drag_max_xw, world_snap_threshold, *x_edges)
+        snapped_y_w = self._snap_axis(current_y_world, drag_min_yw, drag_max_yw, world_snap_threshold, *y_edges)
         return snapped_x_w,snapped_y_w
 
+    def _build_snap_edges(self, ids_in_drag_group):
+        """
+        Per axis, ((edge, rack order) pairs of the min edges sorted, the same for the max edges, {order: (min, max)})
+        over the world bboxes of the racks outside ids_in_drag_group; order is the position in racks_on_canvas.
+        """
+        bounds_x = {}; bounds_y = {}
+        for order, other_rack in enumerate(self.racks_on_canvas):
+            if other_rack['id'] in ids_in_drag_group: continue
+            other_bbox = self._get_rack_world_bbox(other_rack)
+            if not other_bbox: continue
+            bounds_x[order] = (other_bbox[0], other_bbox[2]); bounds_y[order] = (other_bbox[1], other_bbox[3])
+        return tuple((sorted((lo, order) for order, (lo, _) in bounds.items()), sorted((hi, order) for order, (_, hi) in bounds.items()), bounds)
+                     for bounds in (bounds_x, bounds_y))
+
+    @staticmethod
+    def _snap_axis(current, drag_min, drag_max, threshold, min_edges, max_edges, bounds):
+        """
+        Snapped position along one axis: the last rack (in racks_on_canvas order) with an edge within threshold decides,
+        trying its max against drag_min, its min against drag_max, then min against min and max against max. current if none is.
+        """
+        candidate_orders = set()
+        for edges, drag_edge in ((max_edges, drag_min), (min_edges, drag_max), (min_edges, drag_min), (max_edges, drag_max)):
+            first = bisect_left(edges, (drag_edge - threshold,)); last = bisect_right(edges, (drag_edge + threshold, math.inf))
+            candidate_orders.update(order for _, order in edges[first:last])
+        for order in sorted(candidate_orders, reverse=True):
+            other_min, other_max = bounds[order]
+            if abs(drag_min - other_max) < threshold: return current + (other_max - drag_min)
+            elif abs(drag_max - other_min) < threshold: return current + (other_min - drag_max)
+            elif abs(drag_min - other_min) < threshold: return current + (other_min - drag_min)
+            elif abs(drag_max - other_max) < threshold: return current + (other_max - drag_max)
+        return current
+
     def on_canvas_release(self,event):
         if self.selected_flow_line_id or self.drawing_flow_line_mode or self.connecting_tubes_mode or self._is_panning: return
         if self.dragging_rack_id: 
             drag_ended_state_different = False
             if self.drag_operation_pending_undo_state and self.drag_start_positions:
                 for rack_id in self.selected_rack_ids: 
-                    current_rack_config = next((r for r in self.racks_on_canvas if r['id'] == rack_id), None)
+                    current_rack_config = self._rack_by_id.get(rack_id)
                     if current_rack_config and rack_id in self.drag_start_positions:
                         start_x_w, start_y_w = self.drag_start_positions[rack_id]
                         if float(current_rack_config['pos_x']) != start_x_w or float(current_rack_config['pos_y']) != start_y_w:
                             drag_ended_state_different = True; break 
             if drag_ended_state_different and self.drag_operation_pending_undo_state:
                 self._push_to_undo_stack(self.drag_operation_pending_undo_state) 
-            self._update_ui_for_selection_state(); self._update_rack_list_panel() 
+            self._update_ui_for_selection_state()
+            self.schedule_redraw(refresh_rack_list=True) # List rows follow the redraw, which renumbers tubes after a move
             self.status_var.set(f"Drag ended for selected rack(s).")
-        self.dragging_rack_id=None; self.drag_start_positions.clear(); self.drag_operation_pending_undo_state = None
+        self.dragging_rack_id=None; self.drag_start_positions.clear(); self.drag_operation_pending_undo_state = None; self._drag_active = False
+        self._drag_targets = None; self._snap_edges = None; self._last_drag_snap_key = None
 
     def on_canvas_shift_click(self,event): 
         if self.drawing_flow_line_mode or self.connecting_tubes_mode: return 
         if len(self.selected_rack_ids)!=1:self.status_var.set("Shift+Click recolor: Select a single rack first.");return
         selected_rack_id=self.selected_rack_ids[0]
-        selected_rack_config=next((r for r in self.racks_on_canvas if r['id']==selected_rack_id),None)
+        selected_rack_config=self._rack_by_id.get(selected_rack_id)
         if not selected_rack_config:return 
         
-        # Need to check against world coordinates of tubes
+        # Need to check against world coordinates of tubes; only the selected rack's tubes in the point's index cell are tested
         world_event_x, world_event_y = self.canvas_to_world(event.x, event.y)
-        tube_points_world,_,_,_,_=self._get_rack_dimensions_and_points(selected_rack_config) # tube_points are (idx, world_cx, world_cy, world_dia)
-
-        for i,tube_center_x_w,tube_center_y_w,tube_dia_w in tube_points_world: 
-            if (world_event_x-tube_center_x_w)**2+(world_event_y-tube_center_y_w)**2<=(tube_dia_w/2)**2:
-                if i<len(selected_rack_config['tubes']): 
-                    current_color_value = selected_rack_config['tubes'][i]['color']
-                    current_color_name=next((name for name,val in self.FUSE_COLORS_MAP.items() if val==current_color_value), self.FUSE_COLOR_CHOICES[0])
-                    current_choice_idx = self.FUSE_COLOR_CHOICES.index(current_color_name)
-                    new_color_name=self.FUSE_COLOR_CHOICES[(current_choice_idx+1)%len(self.FUSE_COLOR_CHOICES)] 
-                    selected_rack_config['tubes'][i]['color']=self.FUSE_COLORS_MAP[new_color_name]
-                    self._record_state_for_undo(); self.redraw_canvas(); 
-                    self.status_var.set(f"Tube {i+1} on '{selected_rack_config.get('name', 'Unnamed')}' changed to {new_color_name}.")
-                    self._update_ui_for_selection_state(); return 
+        cell_size, cells = self._tube_spatial_index or self._build_tube_spatial_index()
+        tubes = selected_rack_config['tubes']; num_tubes = len(tubes); i = None
+        for _, rack_id, tube_idx, tube_cx_w, tube_cy_w, radius_sq_w in cells.get((math.floor(world_event_x / cell_size), math.floor(world_event_y / cell_size)), ()):
+            # Lowest index wins where tubes overlap, as in a scan in tube order
+            if rack_id != selected_rack_id or tube_idx >= num_tubes or (i is not None and tube_idx >= i): continue
+            dx = world_event_x - tube_cx_w; dy = world_event_y - tube_cy_w
+            if dx * dx + dy * dy <= radius_sq_w: i = tube_idx
+        if i is not None:
+            current_color_value = tubes[i]['color']
+            current_color_name=self.FUSE_COLOR_NAMES_BY_VALUE.get(current_color_value, self.FUSE_COLOR_CHOICES[0])
+            new_color_name=self._NEXT_FUSE_COLOR_NAME[current_color_name]
+            new_color_value=self.FUSE_COLORS_MAP[new_color_name]
+            tubes[i]['color']=new_color_value
+            self._shift_rack_color_count(selected_rack_config, current_color_value, new_color_value)
+            self._record_state_for_undo(); self.redraw_canvas(); 
+            self.status_var.set(f"Tube {i+1} on '{selected_rack_config.get('name', 'Unnamed')}' changed to {new_color_name}.")
+            self._update_ui_for_selection_state(); return 
         self.status_var.set("Shift+Click on a tube of the selected rack to cycle its color.")
 
     def delete_selected_item(self,event=None): 
         if self.selected_flow_line_id: 
-            line_to_delete = next((line for line in self.flow_lines_on_canvas if line['id'] == self.selected_flow_line_id), None)
+            line_to_delete = self._line_by_id.get(self.selected_flow_line_id)
             if line_to_delete and messagebox.askyesno("Confirm Delete", "Are you sure you want to delete the selected flow line?", icon='warning', parent=self.root):
-                self._record_state_for_undo(); self.flow_lines_on_canvas.remove(line_to_delete)
-                self.selected_flow_line_id = None; self.redraw_canvas()
+                self._record_state_for_undo(); self.flow_lines_on_canvas.remove(line_to_delete); self._reindex_flow_lines()
+                self.selected_flow_line_id = None; self.redraw_flow_lines_only(lines_changed=True)
                 self.status_var.set("Flow line deleted."); self._update_ui_for_selection_state() 
             elif not line_to_delete:
                 self.selected_flow_line_id = None; self.status_var.set("Selected flow line not found."); 
                 self._update_ui_for_selection_state(); self.redraw_canvas()
         elif self.selected_rack_ids: 
             num_to_delete = len(self.selected_rack_ids)
-            name_preview = f" '{next((r for r in self.racks_on_canvas if r['id'] == self.selected_rack_ids[0]), {}).get('name', 'Unnamed Rack')}'" if num_to_delete == 1 else " selected racks"
+            name_preview = f" '{self._rack_by_id.get(self.selected_rack_ids[0], {}).get('name', 'Unnamed Rack')}'" if num_to_delete == 1 else " selected racks"
             confirm_msg=f"Are you sure you want to delete {num_to_delete} rack(s){name_preview}?\nThis will also remove associated tube connections."
             if messagebox.askyesno("Confirm Delete",confirm_msg,icon='warning', parent=self.root):
                 self._record_state_for_undo(); deleted_rack_ids_set = set(self.selected_rack_ids) 
-                self.racks_on_canvas=[r for r in self.racks_on_canvas if r['id'] not in self.selected_rack_ids]
+                self.racks_on_canvas=[r for r in self.racks_on_canvas if r['id'] not in deleted_rack_ids_set]
+                for rack_id in deleted_rack_ids_set:
+                    self._rack_by_id.pop(rack_id, None); self._rack_geom_cache.pop(rack_id, None); self._rack_color_counts.pop(rack_id, None)
                 if self.dragging_rack_id in self.selected_rack_ids:self.dragging_rack_id=None
                 self.selected_rack_ids.clear() 
                 self.tube_connections = [c for c in self.tube_connections if c['source_rack_id'] not in deleted_rack_ids_set and c['target_rack_id'] not in deleted_rack_ids_set]
@@ -2251,15 +2828,14 @@ class FireworkRackPlanner:
         if not self.selected_rack_ids:self.status_var.set("No rack selected to rotate.");return
         rotated_count=0; self._record_state_for_undo() 
         for rack_id in self.selected_rack_ids:
-            rack_config=next((r for r in self.racks_on_canvas if r['id']==rack_id),None)
+            rack_config=self._rack_by_id.get(rack_id)
             if rack_config:
                 current_angle=rack_config.get('rotation_angle',0)
-                try: current_angle_idx = self.ROTATION_DEGREES.index(current_angle); rack_config['rotation_angle']=self.ROTATION_DEGREES[(current_angle_idx+1)%len(self.ROTATION_DEGREES)]
-                except ValueError: rack_config['rotation_angle']=self.ROTATION_DEGREES[0]
+                rack_config['rotation_angle']=self._NEXT_ROTATION_DEGREES.get(current_angle, self.ROTATION_DEGREES[0]) # Off-step angles restart at 0
                 rotated_count+=1
-        if rotated_count>0: self.redraw_canvas(); self.status_var.set(f"{rotated_count} selected rack(s) rotated.")
+        if rotated_count>0: self.schedule_redraw(refresh_rack_list=True); self.status_var.set(f"{rotated_count} selected rack(s) rotated.")
         if len(self.selected_rack_ids)==1:
-            rack_config=next((r for r in self.racks_on_canvas if r['id']==self.selected_rack_ids[0]),None)
+            rack_config=self._rack_by_id.get(self.selected_rack_ids[0])
             if rack_config:self.rotation_var.set(rack_config['rotation_angle'])
         elif len(self.selected_rack_ids)>1: self.rotation_dropdown.set("---")
 
@@ -2268,9 +2844,9 @@ class FireworkRackPlanner:
         if not self.selected_rack_ids:self.status_var.set("No racks selected to duplicate.");return
         newly_created_racks_configs=[];newly_selected_ids=[]; self._record_state_for_undo() 
         for i,rack_id_to_duplicate in enumerate(self.selected_rack_ids):
-            original_rack=next((r for r in self.racks_on_canvas if r['id']==rack_id_to_duplicate),None)
+            original_rack=self._rack_by_id.get(rack_id_to_duplicate)
             if original_rack:
-                new_rack_config=copy.deepcopy(original_rack) 
+                new_rack_config=dict(original_rack); new_rack_config['tubes']=_clone_tubes(original_rack.get('tubes', [])) # Tubes are the only nested data
                 new_rack_config['id']=str(uuid.uuid4()) 
                 new_rack_config['name'] = original_rack.get('name', 'Unnamed') + " (Copy)" 
                 new_rack_config['pos_x']=float(original_rack['pos_x'])+ (self.DUPLICATE_OFFSET_X / self.zoom_level) + (i * self.DUPLICATE_OFFSET_INCREMENT / self.zoom_level)
@@ -2278,20 +2854,44 @@ class FireworkRackPlanner:
                 newly_created_racks_configs.append(new_rack_config);newly_selected_ids.append(new_rack_config['id'])
         if newly_created_racks_configs:
             self.racks_on_canvas.extend(newly_created_racks_configs); self.selected_rack_ids=newly_selected_ids 
+            for new_rack_config in newly_created_racks_configs: self._rack_by_id[new_rack_config['id']] = new_rack_config
             self.selected_flow_line_id = None; self.redraw_canvas()
             self._update_ui_for_selection_state();self._update_rack_list_panel()
             self.status_var.set(f"{len(newly_created_racks_configs)} rack(s) duplicated and selected.")
         else:self.status_var.set("Error: Could not duplicate selected racks (original not found?).")
 
     def _capture_current_state(self):
-        return {'racks': copy.deepcopy(self.racks_on_canvas), 'flow_lines': copy.deepcopy(self.flow_lines_on_canvas),
-                'tube_connections': copy.deepcopy(self.tube_connections), 'selected_rack_ids': copy.deepcopy(self.selected_rack_ids),
+        """
+        Snapshot for the undo/redo stacks. Snapshots are never modified once taken, so a rack, flow line or connection
+        that is unchanged since the newest undo entry shares that entry's copy instead of being copied again.
+        """
+        previous = self.undo_stack[-1] if self.undo_stack else {'racks': (), 'flow_lines': (), 'tube_connections': ()}
+        # Structural copies instead of deepcopy: lines and connections are flat dicts, and racks only nest their tubes
+        return {'racks': _share_unchanged(self.racks_on_canvas, previous['racks'], _clone_rack),
+                'flow_lines': _share_unchanged(self.flow_lines_on_canvas, previous['flow_lines'], dict),
+                'tube_connections': _share_unchanged(self.tube_connections, previous['tube_connections'], dict),
+                'selected_rack_ids': list(self.selected_rack_ids),
                 'selected_flow_line_id': self.selected_flow_line_id,
                 'canvas_view': {'zoom': self.zoom_level, 'pan_x': self.pan_offset_x, 'pan_y': self.pan_offset_y}} # Save view state
 
+    def _reindex_racks(self):
+        """Rebuilds the id -> rack index after racks_on_canvas is replaced wholesale. The first rack wins on duplicate ids."""
+        self._rack_by_id = {r['id']: r for r in reversed(self.racks_on_canvas)}
+        self._rack_geom_cache = {rack_id: cached for rack_id, cached in self._rack_geom_cache.items() if rack_id in self._rack_by_id}
+        live_shapes = {cached[0][:4] + cached[0][6:] for cached in self._rack_geom_cache.values()}
+        self._rack_shape_geom_cache = {shape: cached for shape, cached in self._rack_shape_geom_cache.items() if shape in live_shapes}
+        self._rack_color_counts = {rack_id: cached for rack_id, cached in self._rack_color_counts.items() if rack_id in self._rack_by_id}
+
+    def _reindex_flow_lines(self):
+        """Rebuilds the id -> line index after flow_lines_on_canvas is replaced or shrunk. The first line wins on duplicate ids."""
+        self._line_by_id = {ln['id']: ln for ln in reversed(self.flow_lines_on_canvas)}
+
     def _restore_state_from_history(self, history_entry):
-        self.racks_on_canvas = history_entry['racks']; self.flow_lines_on_canvas = history_entry['flow_lines']
-        self.tube_connections = history_entry['tube_connections']; self.selected_rack_ids = history_entry['selected_rack_ids']
+        # Snapshots can be shared with other history entries, so the live racks, lines and connections are copies of them
+        self.racks_on_canvas = [_clone_rack(r) for r in history_entry['racks']]
+        self.flow_lines_on_canvas = [dict(ln) for ln in history_entry['flow_lines']]
+        self._reindex_racks(); self._reindex_flow_lines()
+        self.tube_connections = [dict(c) for c in history_entry['tube_connections']]; self.selected_rack_ids = history_entry['selected_rack_ids']
         self.selected_flow_line_id = history_entry['selected_flow_line_id']
         
         canvas_view_state = history_entry.get('canvas_view', {'zoom': 1.0, 'pan_x': 0.0, 'pan_y': 0.0})
@@ -2299,14 +2899,13 @@ class FireworkRackPlanner:
         self.pan_offset_x = canvas_view_state.get('pan_x', 0.0)
         self.pan_offset_y = canvas_view_state.get('pan_y', 0.0)
 
-        self.dragging_rack_id = None; self.drag_start_positions.clear(); self.drag_operation_pending_undo_state = None
+        self.dragging_rack_id = None; self.drag_start_positions.clear(); self.drag_operation_pending_undo_state = None; self._drag_targets = None; self._last_drag_snap_key = None
         self.flow_line_start_point = None; self.first_tube_for_connection = None 
         self.redraw_canvas(); self._update_rack_list_panel(); self._update_ui_for_selection_state() 
         self._update_canvas_summary_info(); self._update_undo_redo_buttons_state() 
 
     def _push_to_undo_stack(self, state_to_push):
         self.undo_stack.append(state_to_push)
-        if len(self.undo_stack) > self.MAX_UNDO_STEPS: self.undo_stack.pop(0) 
         self.redo_stack.clear(); self._update_undo_redo_buttons_state()
 
     def _record_state_for_undo(self): self._push_to_undo_stack(self._capture_current_state())
@@ -2325,33 +2924,93 @@ class FireworkRackPlanner:
         self.undo_btn.config(state=tk.NORMAL if self.undo_stack else tk.DISABLED)
         self.redo_btn.config(state=tk.NORMAL if self.redo_stack else tk.DISABLED)
 
+    def _delete_rack_items(self, stale_keys, kept_count):
+        """Deletes the canvas items of the racks in stale_keys, a tail of _drawn_rack_keys after kept_count kept racks."""
+        if not kept_count: self.canvas.delete("rack_item"); return # Nothing kept, one call for all
+        for rack_id, draw_key in stale_keys:
+            if draw_key is not None: self.canvas.delete(f"rack_items_{rack_id}")
+
     def _draw_rack_name(self, rack_config):
         name = rack_config.get('name')
-        if not name or not self.show_rack_names_var.get(): return
+        if not name or not self._show_rack_names: return
         _, _, (un_w, un_h), _, _ = self._get_rack_dimensions_and_points(rack_config) # Dims are world units
         bx_w, by_w = float(rack_config['pos_x']), float(rack_config['pos_y']); angle = rack_config.get('rotation_angle',0)
         nlx_w, nly_w = un_w / 2, un_h + (8 / self.zoom_level) # Offset in world units, scale by zoom
         clx_w, cly_w = un_w / 2, un_h / 2 
-        rnlx_w, rnly_w = self._rotate_point(nlx_w, nly_w, angle, clx_w, cly_w)
-        wnx_w, wny_w = bx_w - clx_w + rnlx_w, by_w - cly_w + rnly_w
+        # Rotate the label anchor about the local center (the one point rotated here), then place it at the rack position
+        sin_a, cos_a = _rotation_sin_cos(angle); dx_w, dy_w = nlx_w - clx_w, nly_w - cly_w
+        wnx_w, wny_w = bx_w - clx_w + (dx_w*cos_a - dy_w*sin_a + clx_w), by_w - cly_w + (dx_w*sin_a + dy_w*cos_a + cly_w)
         
         cx, cy = self.world_to_canvas(wnx_w, wny_w)
         font_size = max(6, int(8 * self.zoom_level)) # Scale font size
-        self.canvas.create_text(cx, cy, text=name, fill="black", font=("Arial", font_size, "italic"), anchor=tk.N, tags=f"name_{rack_config['id']}")
-
-    def _rotate_point(self,x,y,angle_deg,cx,cy):
-        """Rotates a point (x,y) around a center (cx,cy) by angle_deg degrees."""
-        angle_rad=math.radians(angle_deg);s,c=math.sin(angle_rad),math.cos(angle_rad)
-        x-=cx;y-=cy; return x*c-y*s+cx,x*s+y*c+cy
+        self.canvas.create_text(cx, cy, text=name, fill="black", font=("Arial", font_size, "italic"), anchor=tk.N,
+                                tags=(f"name_{rack_config['id']}",) + self._rack_item_tags)
 
-    def _get_rack_dimensions_and_points(self,rack_config): # All calculations in World Coordinates
+    def _get_rack_dimensions_and_points(self, rack_config):
+        """
+        Cached _compute_rack_dimensions_and_points. The entry for a rack id is reused while the fields the
+        geometry depends on are unchanged, so in-place edits (drag, nudge, rotate, resize) invalidate it by themselves.
+        A rack that only moved has its cached points translated instead of recomputed, which is the whole of a drag, and
+        a rack with no usable entry is translated from another rack of the same shape and rotation (duplicates, loads).
+        The returned lists are shared with the cache and must not be modified.
+        """
+        geom_inputs = (rack_config['type'], rack_config['x_tubes'], rack_config['y_tubes'], rack_config['tube_diameter'],
+                       rack_config['pos_x'], rack_config['pos_y'], rack_config.get('rotation_angle', 0))
+        cached = self._rack_geom_cache.get(rack_config['id'])
+        if cached is not None and cached[0] == geom_inputs: return cached[1]
+        shape_key = geom_inputs[:4] + geom_inputs[6:]
+        if cached is None or cached[0][:4] + cached[0][6:] != shape_key: cached = self._rack_shape_geom_cache.get(shape_key)
+        if cached is not None: # Same shape and rotation, new position
+            cached_inputs = cached[0]
+            dx = float(geom_inputs[4]) - float(cached_inputs[4]); dy = float(geom_inputs[5]) - float(cached_inputs[5])
+            tube_points, outline, unrotated_dims, rotated_w, rotated_h = cached[1]
+            geometry = ([(idx, cx + dx, cy + dy, dia) for idx, cx, cy, dia in tube_points], [(x + dx, y + dy) for x, y in outline],
+                        unrotated_dims, rotated_w, rotated_h)
+            bbox = cached[2]
+            if bbox is not None: bbox = (bbox[0] + dx, bbox[1] + dy, bbox[2] + dx, bbox[3] + dy)
+            self._rack_geom_cache[rack_config['id']] = (geom_inputs, geometry, bbox)
+            return geometry
+        geometry = self._compute_rack_dimensions_and_points(rack_config); outline = geometry[1]
+        bbox = (min(p[0] for p in outline), min(p[1] for p in outline), max(p[0] for p in outline), max(p[1] for p in outline)) if outline else None
+        self._rack_geom_cache[rack_config['id']] = self._rack_shape_geom_cache[shape_key] = (geom_inputs, geometry, bbox)
+        return geometry
+
+    def _get_rack_color_counts(self, rack_config):
+        """
+        Counter of tube color values for a rack, cached per rack id with its breakdown text. An entry is reused while the rack
+        still holds the same tubes list: the tube dialogs, undo/redo and loading all install new lists, and in-place
+        recolors update the counts and drop the text (_shift_rack_color_count).
+        """
+        tubes = rack_config.get('tubes', [])
+        cached = self._rack_color_counts.get(rack_config['id'])
+        if cached is not None and cached[0] is tubes: return cached[1]
+        color_counts = Counter(map(_tube_color_of, tubes)) # Counted at C level
+        self._rack_color_counts[rack_config['id']] = (tubes, color_counts, None)
+        return color_counts
+
+    def _shift_rack_color_count(self, rack_config, old_color_value, new_color_value):
+        """Moves one tube from old_color_value to new_color_value in the rack's cached counts after an in-place recolor."""
+        cached = self._rack_color_counts.get(rack_config['id'])
+        if cached is None or cached[0] is not rack_config.get('tubes'): return # Nothing cached; counted on next use
+        color_counts = cached[1]
+        color_counts[new_color_value] += 1; color_counts[old_color_value] -= 1
+        if color_counts[old_color_value] <= 0: del color_counts[old_color_value] # No zero rows in the breakdown
+        self._rack_color_counts[rack_config['id']] = (cached[0], color_counts, None) # Breakdown text is stale
+
+    def _get_rack_world_bbox(self, rack_config):
+        """World (min_x, min_y, max_x, max_y) of the rack's rotated outline, or None if it has none; cached with the geometry."""
+        self._get_rack_dimensions_and_points(rack_config)
+        return self._rack_geom_cache[rack_config['id']][2]
+
+    def _compute_rack_dimensions_and_points(self,rack_config): # All calculations in World Coordinates
         """
         Calculates dimensions and tube center points for a given rack configuration.
         All calculations and returned coordinates/dimensions are in WORLD units.
 
         Returns:
             tuple: (
-                tube_center_points_info_world (list of (idx, cx, cy, dia)),
+                tube_center_points_info_world (list of (idx, cx, cy, dia), in tube index order: entry i has idx i,
+                    which _get_tube_info and _draw_rack_tubes index by directly; cached/translated copies keep it),
                 rotated_outline_points_absolute_world (list of (x,y) tuples for outline),
                 (unrotated_rack_width_world, unrotated_rack_height_world),
                 rotated_bbox_width_world,
@@ -2385,148 +3044,78 @@ class FireworkRackPlanner:
         unrotated_rack_width_world = tube_group_width_world + 2 * self.RACK_OUTER_PADDING
         unrotated_rack_height_world = tube_group_height_world + 2 * self.RACK_OUTER_PADDING
 
-        # Local center for rotation
+        # Local center for rotation; the rack's (pos_x, pos_y) is where this center lands in the world
         center_local_x_world, center_local_y_world = unrotated_rack_width_world / 2, unrotated_rack_height_world / 2
+        # Every point below is an offset (ox, oy) from the local center, placed at base + (ox*cos - oy*sin, ox*sin + oy*cos)
+        sin_a, cos_a = _rotation_sin_cos(angle_deg) # Once per rack instead of per point
 
-        # Unrotated corner points relative to (0,0) of the unrotated rack
-        corners_unrotated_local_world = [
-            (0, 0), (unrotated_rack_width_world, 0),
-            (unrotated_rack_width_world, unrotated_rack_height_world), (0, unrotated_rack_height_world)
-        ]
-        # Rotated corner points, still local (relative to unrotated rack's top-left)
-        rotated_outline_points_local_world = [
-            self._rotate_point(crx, cry, angle_deg, center_local_x_world, center_local_y_world)
-            for crx, cry in corners_unrotated_local_world
+        # Corner offsets of the unrotated rack, then their rotated absolute world coordinates
+        corner_offsets_world = [
+            (-center_local_x_world, -center_local_y_world), (center_local_x_world, -center_local_y_world),
+            (center_local_x_world, center_local_y_world), (-center_local_x_world, center_local_y_world)
         ]
-        # Absolute world coordinates of rotated outline points
         rotated_outline_points_absolute_world = [
-            (base_x_world - center_local_x_world + prx, base_y_world - center_local_y_world + pry)
-            for prx, pry in rotated_outline_points_local_world
+            (base_x_world + ox * cos_a - oy * sin_a, base_y_world + ox * sin_a + oy * cos_a)
+            for ox, oy in corner_offsets_world
         ]
 
-        # Bounding box of the rotated rack
-        if rotated_outline_points_absolute_world:
-            min_x_world = min(p[0] for p in rotated_outline_points_absolute_world)
-            max_x_world = max(p[0] for p in rotated_outline_points_absolute_world)
-            min_y_world = min(p[1] for p in rotated_outline_points_absolute_world)
-            max_y_world = max(p[1] for p in rotated_outline_points_absolute_world)
-        else: # Should not happen if rack has dimensions
-            min_x_world, max_x_world = base_x_world, base_x_world + unrotated_rack_width_world
-            min_y_world, max_y_world = base_y_world, base_y_world + unrotated_rack_height_world
-            
-        rotated_bbox_width_world = max_x_world - min_x_world
-        rotated_bbox_height_world = max_y_world - min_y_world
+        # Bounding box of the rotated rack (the outline always has its 4 corners)
+        outline_xs_world = [x for x, _ in rotated_outline_points_absolute_world]
+        outline_ys_world = [y for _, y in rotated_outline_points_absolute_world]
+        rotated_bbox_width_world = max(outline_xs_world) - min(outline_xs_world)
+        rotated_bbox_height_world = max(outline_ys_world) - min(outline_ys_world)
 
-        # Calculate tube center points
+        # Calculate tube center points: each is a per-row (or per-segment) rotated origin plus a per-column (or per-tube)
+        # rotated offset, both computed once, so a tube costs two additions; zip() then builds the tuples at C level
         tube_center_points_info_world = []
         effective_tube_diameter_world = max(tube_diameter_world, 10) # Ensure a minimum size for calculations
-        tube_idx_counter = 0
 
         if rack_type == "Crate":
             spacing_world = self.DEFAULT_TUBE_SPACING_RATIO * tube_diameter_world
-            for r_idx in range(rows_or_tubes_per_fan):
-                for c_idx in range(cols_or_fans):
-                    local_center_x_world = self.RACK_OUTER_PADDING + c_idx * (tube_diameter_world + spacing_world) + tube_diameter_world / 2
-                    local_center_y_world = self.RACK_OUTER_PADDING + r_idx * (tube_diameter_world + spacing_world) + tube_diameter_world / 2
-                    
-                    rotated_x_world, rotated_y_world = self._rotate_point(local_center_x_world, local_center_y_world, angle_deg, center_local_x_world, center_local_y_world)
-                    abs_tube_cx_world = base_x_world - center_local_x_world + rotated_x_world
-                    abs_tube_cy_world = base_y_world - center_local_y_world + rotated_y_world
-                    tube_center_points_info_world.append((tube_idx_counter, abs_tube_cx_world, abs_tube_cy_world, effective_tube_diameter_world))
-                    tube_idx_counter += 1
+            pitch_world = tube_diameter_world + spacing_world
+            first_tube_offset_x_world = self.RACK_OUTER_PADDING + tube_diameter_world / 2 - center_local_x_world
+            first_tube_offset_y_world = self.RACK_OUTER_PADDING + tube_diameter_world / 2 - center_local_y_world
+            column_offsets_world = [first_tube_offset_x_world + c_idx * pitch_world for c_idx in range(cols_or_fans)]
+            row_offsets_world = [first_tube_offset_y_world + r_idx * pitch_world for r_idx in range(rows_or_tubes_per_fan)]
+            column_dx = [ox * cos_a for ox in column_offsets_world]; column_dy = [ox * sin_a for ox in column_offsets_world]
+            row_xs = [base_x_world - oy * sin_a for oy in row_offsets_world]; row_ys = [base_y_world + oy * cos_a for oy in row_offsets_world]
+            tube_center_points_info_world = list(zip(range(cols_or_fans * rows_or_tubes_per_fan), # Row-major
+                                                     [row_x + dx for row_x in row_xs for dx in column_dx],
+                                                     [row_y + dy for row_y in row_ys for dy in column_dy], repeat(effective_tube_diameter_world)))
         elif rack_type == "Fan":
             spacing_y_in_fan_world = self.DEFAULT_TUBE_SPACING_RATIO * tube_diameter_world
             fan_visual_padding_world = self.DEFAULT_FAN_PADDING_RATIO * tube_diameter_world
             fan_rect_width_per_segment_world = tube_diameter_world + 2 * fan_visual_padding_world
             spacing_x_between_fans_world = self.DEFAULT_INTER_FAN_SPACING_RATIO * tube_diameter_world
             
-            for f_idx in range(cols_or_fans):
-                fan_segment_content_start_x_local_world = self.RACK_OUTER_PADDING + f_idx * (fan_rect_width_per_segment_world + spacing_x_between_fans_world)
-                fan_segment_content_start_y_local_world = self.RACK_OUTER_PADDING
-                
-                tube_center_x_in_segment_local_world = fan_segment_content_start_x_local_world + fan_visual_padding_world + tube_diameter_world / 2
-                for t_idx in range(rows_or_tubes_per_fan):
-                    tube_center_y_in_segment_local_world = fan_segment_content_start_y_local_world + fan_visual_padding_world + t_idx * (tube_diameter_world + spacing_y_in_fan_world) + tube_diameter_world / 2
-                    
-                    rotated_x_world, rotated_y_world = self._rotate_point(tube_center_x_in_segment_local_world, tube_center_y_in_segment_local_world, angle_deg, center_local_x_world, center_local_y_world)
-                    abs_tube_cx_world = base_x_world - center_local_x_world + rotated_x_world
-                    abs_tube_cy_world = base_y_world - center_local_y_world + rotated_y_world
-                    tube_center_points_info_world.append((tube_idx_counter, abs_tube_cx_world, abs_tube_cy_world, effective_tube_diameter_world))
-                    tube_idx_counter += 1
+            # Tube offsets down a segment are the same for every segment
+            first_tube_offset_y_world = self.RACK_OUTER_PADDING + fan_visual_padding_world + tube_diameter_world / 2 - center_local_y_world
+            tube_offsets_y_world = [first_tube_offset_y_world + t_idx * (tube_diameter_world + spacing_y_in_fan_world) for t_idx in range(rows_or_tubes_per_fan)]
+            # Segment offsets across the rack, straight from the segment index like the tube offsets above
+            segment_pitch_world = fan_rect_width_per_segment_world + spacing_x_between_fans_world
+            segment_offsets_x_world = [self.RACK_OUTER_PADDING + f_idx * segment_pitch_world + fan_visual_padding_world + tube_diameter_world / 2
+                                       - center_local_x_world for f_idx in range(cols_or_fans)]
+            tube_dx = [oy * sin_a for oy in tube_offsets_y_world]; tube_dy = [oy * cos_a for oy in tube_offsets_y_world]
+            segment_xs = [base_x_world + ox * cos_a for ox in segment_offsets_x_world]; segment_ys = [base_y_world + ox * sin_a for ox in segment_offsets_x_world]
+            tube_center_points_info_world = list(zip(range(cols_or_fans * rows_or_tubes_per_fan), # Segment-major
+                                                     [segment_x - dx for segment_x in segment_xs for dx in tube_dx],
+                                                     [segment_y + dy for segment_y in segment_ys for dy in tube_dy], repeat(effective_tube_diameter_world)))
 
         return (tube_center_points_info_world, rotated_outline_points_absolute_world,
                 (unrotated_rack_width_world, unrotated_rack_height_world),
                 rotated_bbox_width_world, rotated_bbox_height_world)
 
-    def _is_point_in_polygon(self,x_w,y_w,poly_v_w): # Expects world coordinates
-        nv=len(poly_v_w); ins=False; p1x_w,p1y_w=poly_v_w[0]
-        if nv<3:return False 
-        for i in range(nv+1): 
-            p2x_w,p2y_w=poly_v_w[i%nv] 
-            if y_w>min(p1y_w,p2y_w) and y_w<=max(p1y_w,p2y_w) and x_w<=max(p1x_w,p2x_w):
-                if p1y_w!=p2y_w: xi_w=(y_w-p1y_w)*(p2x_w-p1x_w)/(p2y_w-p1y_w)+p1x_w 
-                if p1x_w==p2x_w or x_w<=xi_w: ins=not ins 
-            p1x_w,p1y_w=p2x_w,p2y_w 
-        return ins
-
     def _draw_rack_outline(self,rack_config,rotated_outline_points_world):
         oc=self.RACK_OUTLINE_COLOR;ow_world=self.RACK_OUTLINE_WIDTH
-        if rack_config['id'] in self.selected_rack_ids: oc=self.SELECTED_RACK_OUTLINE_COLOR;ow_world=self.SELECTED_RACK_OUTLINE_WIDTH
+        if rack_config['id'] in self._drawn_selected_ids: oc=self.SELECTED_RACK_OUTLINE_COLOR;ow_world=self.SELECTED_RACK_OUTLINE_WIDTH
         
         ow_canvas = max(1, ow_world * self.zoom_level) # Scale outline width
         if rotated_outline_points_world:
-            # Convert world outline points to canvas points
-            canvas_outline_points = [self.world_to_canvas(px_w, py_w) for px_w, py_w in rotated_outline_points_world]
-            flat_points_canvas=[c for p in canvas_outline_points for c in p]; 
-            self.canvas.create_polygon(flat_points_canvas,outline=oc,width=ow_canvas,fill='') 
+            flat_points_canvas = self.world_to_canvas_flat(rotated_outline_points_world) # World outline -> canvas points
+            self.canvas.create_polygon(flat_points_canvas,outline=oc,width=ow_canvas,fill='',tags=self._rack_item_tags) 
 
-    def _draw_tube_shape(self, cx_w, cy_w, diameter_w, angle_deg, fill_color,
-                           outline_color="black", outline_width_world=1, shape_type="oval"):
-        """
-        Draws a specified shape (oval or rectangle) for a tube, rotated as needed.
-        All input dimensions (cx_w, cy_w, diameter_w) are in world coordinates.
-        """
-        cx_c, cy_c = self.world_to_canvas(cx_w, cy_w)
-        diameter_c = diameter_w * self.zoom_level
-        outline_width_c = max(1, outline_width_world * self.zoom_level)
-
-        if shape_type == "oval":
-            rx_c, ry_c = diameter_c / 2, diameter_c / 2
-            if angle_deg % 180 == 0: # Optimization for non-rotated or 180-deg rotated ovals
-                self.canvas.create_oval(cx_c - rx_c, cy_c - ry_c, cx_c + rx_c, cy_c + ry_c,
-                                        fill=fill_color, outline=outline_color, width=outline_width_c)
-            else: # Draw as a polygon for other rotations
-                ns = 20; pts_c = []
-                for i in range(ns):
-                    th = (i / ns) * 2 * math.pi
-                    x0_c = rx_c * math.cos(th)
-                    y0_c = ry_c * math.sin(th)
-                    xr_c, yr_c = self._rotate_point(x0_c, y0_c, angle_deg, 0, 0)
-                    pts_c.extend([xr_c + cx_c, yr_c + cy_c])
-                self.canvas.create_polygon(pts_c, fill=fill_color, outline=outline_color,
-                                           width=outline_width_c, smooth=tk.TRUE)
-        elif shape_type == "rectangle":
-            half_w_c, half_h_c = diameter_c / 2, diameter_c / 2 # Rectangles will be squares based on diameter
-            
-            # Define corners relative to center (0,0) in canvas scale
-            local_corners_c = [
-                (-half_w_c, -half_h_c), (half_w_c, -half_h_c),
-                (half_w_c, half_h_c), (-half_w_c, half_h_c)
-            ]
-            
-            rotated_corners_c = []
-            for x_loc_c, y_loc_c in local_corners_c:
-                # Rotate point around (0,0)
-                xr_c, yr_c = self._rotate_point(x_loc_c, y_loc_c, angle_deg, 0, 0)
-                # Translate to final canvas center
-                rotated_corners_c.extend([xr_c + cx_c, yr_c + cy_c])
-            
-            self.canvas.create_polygon(rotated_corners_c, fill=fill_color, outline=outline_color,
-                                       width=outline_width_c)
-        # Add other shapes here with elif shape_type == "other_shape":
-
-
-    def _draw_crate_rack(self, rack_config, global_start_tube_number=0, use_global_numbering=False):
+    def _draw_crate_rack(self, rack_config, global_start_tube_number=0, use_global_numbering=False, tube_viewport=None,
+                         tube_visuals=None):
         cols,rows=rack_config['x_tubes'],rack_config['y_tubes'];
         tube_diameter_w=rack_config['tube_diameter'];angle=rack_config.get('rotation_angle',0)
         if cols==0 or rows==0:return 
@@ -2535,35 +3124,11 @@ class FireworkRackPlanner:
         tube_centers_world,rotated_outline_world,_,_,_=self._get_rack_dimensions_and_points(rack_config)
         self._draw_rack_outline(rack_config,rotated_outline_world) 
         
-        # tube_diameter_w is the full diameter for the shape's bounding box
-        for tube_idx, tube_data in enumerate(rack_config['tubes']): 
-            # Find the pre-calculated world center for this tube_idx
-            current_tube_info_w = next((info for info in tube_centers_world if info[0] == tube_idx), None)
-            if not current_tube_info_w: continue
-            
-            _, world_cx, world_cy, _ = current_tube_info_w # World center and diameter
-
-            tube_type = tube_data.get('type', "Standard")
-            visual_props = self.FIREWORK_TYPE_VISUALS.get(tube_type, self.FIREWORK_TYPE_VISUALS["Standard"])
-            tube_outline_color = visual_props["outline"]
-            tube_outline_width_w = self.DEFAULT_TUBE_OUTLINE_WIDTH_WORLD * visual_props["width_factor"]
-            shape_type = visual_props.get("shape", "oval") # Default to oval if not specified
-
-            self._draw_tube_shape(world_cx, world_cy, tube_diameter_w, angle, tube_data['color'], outline_color=tube_outline_color, outline_width_world=tube_outline_width_w, shape_type=shape_type)
-
-            if self.show_tube_numbers_var.get(): 
-                canvas_cx, canvas_cy = self.world_to_canvas(world_cx, world_cy)
-                font_size = max(6, int(8 * self.zoom_level)) # Scale font size
-                display_text = tube_data.get('cue', '') 
-                if not display_text: # If no cue, use number
-                    if use_global_numbering:
-                        display_text = str(global_start_tube_number + tube_idx + 1)
-                    else:
-                        display_text = str(tube_idx + 1) # Original local numbering
-                self.canvas.create_text(canvas_cx, canvas_cy, text=display_text, fill="black", font=("Arial", font_size), anchor=tk.CENTER,
-                                        tags=(f"rack_element_{rack_config['id']}", f"tube_num_text_{rack_config['id']}_{tube_idx}")) 
-
-    def _draw_fan_rack(self, rack_config, global_start_tube_number=0, use_global_numbering=False):
+        self._draw_rack_tubes(rack_config, tube_centers_world, tube_diameter_w, angle, global_start_tube_number, use_global_numbering,
+                              tube_viewport, tube_visuals)
+
+    def _draw_fan_rack(self, rack_config, global_start_tube_number=0, use_global_numbering=False, tube_viewport=None,
+                       tube_visuals=None):
         num_fans,tubes_per_fan=rack_config['x_tubes'],rack_config['y_tubes'];
         tube_diameter_w=rack_config['tube_diameter'];angle=rack_config.get('rotation_angle',0)
         if num_fans==0 or tubes_per_fan==0:return
@@ -2579,47 +3144,81 @@ class FireworkRackPlanner:
         fan_rect_width_per_segment_w=tube_diameter_w+2*fan_visual_padding_w; 
         spacing_x_between_fans_w=self.DEFAULT_INTER_FAN_SPACING_RATIO*tube_diameter_w
         # tube_diameter_w is the full diameter for the shape's bounding box
+        local_fan_rect_y1_w=self.RACK_OUTER_PADDING
+        height_of_tubes_in_fan_w=tubes_per_fan*tube_diameter_w+max(0,tubes_per_fan-1)*spacing_y_in_fan_w
+        local_fan_rect_y2_w=local_fan_rect_y1_w+height_of_tubes_in_fan_w+2*fan_visual_padding_w 
+        # Rotate about the local center, place at the rack position and map to the canvas in one pass per corner,
+        # with sin/cos, the placement origin and the view transform resolved once for all segments
+        sin_a, cos_a = _rotation_sin_cos(angle)
+        origin_x_w = base_x_w-center_lx_w; origin_y_w = base_y_w-center_ly_w
+        zoom = self.zoom_level; pan_x = self.pan_offset_x; pan_y = self.pan_offset_y
+        segment_outline_width_c = max(1,1.5*zoom); create_polygon = self.canvas.create_polygon
+        rack_item_tags = self._rack_item_tags
 
         for f_idx in range(num_fans): 
             local_fan_rect_x1_w=self.RACK_OUTER_PADDING+f_idx*(fan_rect_width_per_segment_w+spacing_x_between_fans_w)
-            local_fan_rect_y1_w=self.RACK_OUTER_PADDING
             local_fan_rect_x2_w=local_fan_rect_x1_w+fan_rect_width_per_segment_w
-            height_of_tubes_in_fan_w=tubes_per_fan*tube_diameter_w+max(0,tubes_per_fan-1)*spacing_y_in_fan_w
-            local_fan_rect_y2_w=local_fan_rect_y1_w+height_of_tubes_in_fan_w+2*fan_visual_padding_w 
-            fan_corners_w=[(local_fan_rect_x1_w,local_fan_rect_y1_w),(local_fan_rect_x2_w,local_fan_rect_y1_w),
-                         (local_fan_rect_x2_w,local_fan_rect_y2_w),(local_fan_rect_x1_w,local_fan_rect_y2_w)]
-            rotated_poly_local_w=[self._rotate_point(px,py,angle,center_lx_w,center_ly_w) for px,py in fan_corners_w]
-            rotated_poly_world_coords=[(base_x_w-center_lx_w+prx,base_y_w-center_ly_w+pry) for prx,pry in rotated_poly_local_w]
-            # Convert segment outline to canvas coords
-            canvas_segment_outline = [self.world_to_canvas(px_w, py_w) for px_w, py_w in rotated_poly_world_coords]
-            flat_poly_canvas=[c for p in canvas_segment_outline for c in p] 
-            if flat_poly_canvas: 
-                self.canvas.create_polygon(flat_poly_canvas,outline="darkslateblue",width=max(1,1.5*self.zoom_level),dash=(4,2),fill='')
-
-        for tube_idx, tube_data in enumerate(rack_config['tubes']): 
-            current_tube_info_w = next((info for info in tube_centers_world if info[0] == tube_idx), None)
-            if not current_tube_info_w: continue
-            _, world_cx, world_cy, _ = current_tube_info_w
-
-            tube_type = tube_data.get('type', "Standard")
-            visual_props = self.FIREWORK_TYPE_VISUALS.get(tube_type, self.FIREWORK_TYPE_VISUALS["Standard"])
-            tube_outline_color = visual_props["outline"]
-            tube_outline_width_w = self.DEFAULT_TUBE_OUTLINE_WIDTH_WORLD * visual_props["width_factor"]
-            shape_type = visual_props.get("shape", "oval") # Default to oval if not specified
-
-            self._draw_tube_shape(world_cx, world_cy, tube_diameter_w, angle, tube_data['color'], outline_color=tube_outline_color, outline_width_world=tube_outline_width_w, shape_type=shape_type)
-
-            if self.show_tube_numbers_var.get():
-                canvas_cx, canvas_cy = self.world_to_canvas(world_cx, world_cy)
-                font_size = max(6, int(8 * self.zoom_level))
-                display_text = tube_data.get('cue', '')
-                if not display_text: # If no cue, use number
-                    if use_global_numbering:
-                        display_text = str(global_start_tube_number + tube_idx + 1)
-                    else:
-                        display_text = str(tube_idx + 1) # Original local numbering
-                self.canvas.create_text(canvas_cx, canvas_cy, text=display_text,fill="black", font=("Arial", font_size), anchor=tk.CENTER,
-                                        tags=(f"rack_element_{rack_config['id']}",f"tube_num_text_{rack_config['id']}_{tube_idx}"))
+            flat_poly_canvas = [] # Segment outline -> canvas coords
+            for px, py in ((local_fan_rect_x1_w,local_fan_rect_y1_w),(local_fan_rect_x2_w,local_fan_rect_y1_w),
+                           (local_fan_rect_x2_w,local_fan_rect_y2_w),(local_fan_rect_x1_w,local_fan_rect_y2_w)):
+                px -= center_lx_w; py -= center_ly_w
+                flat_poly_canvas.append((origin_x_w+(px*cos_a-py*sin_a+center_lx_w)-pan_x)*zoom)
+                flat_poly_canvas.append((origin_y_w+(px*sin_a+py*cos_a+center_ly_w)-pan_y)*zoom)
+            create_polygon(flat_poly_canvas,outline="darkslateblue",width=segment_outline_width_c,dash=(4,2),fill='',tags=rack_item_tags)
+
+        self._draw_rack_tubes(rack_config, tube_centers_world, tube_diameter_w, angle, global_start_tube_number, use_global_numbering,
+                              tube_viewport, tube_visuals)
+
+    def _draw_rack_tubes(self, rack_config, tube_centers_world, tube_diameter_w, angle, global_start_tube_number=0, use_global_numbering=False,
+                         tube_viewport=None, tube_visuals=None):
+        """
+        Draws the tube shapes and number/cue labels of a rack from its precomputed world tube centers.
+        With a world tube_viewport (x0, y0, x1, y1), tubes lying entirely outside it are skipped.
+        tube_visuals is _tube_visuals(rack_config['tubes']) when the caller already has it.
+        """
+        if tube_visuals is None: tube_visuals = _tube_visuals(rack_config['tubes'])
+        rack_id = rack_config['id']
+        # Level of detail: one text item per tube is the costliest part of a rack, and is skipped once it can't be read
+        show_tube_numbers = self._show_tube_numbers and tube_diameter_w * self.zoom_level >= self.TUBE_LABEL_MIN_DIAMETER_PX
+        # Label font, tags and numbering base are the same for every tube of the rack
+        label_font = ("Arial", max(6, int(8 * self.zoom_level))) # Scale font size
+        rack_element_tag = f"rack_element_{rack_id}"; number_tag_prefix = f"tube_num_text_{rack_id}_"
+        first_number = global_start_tube_number + 1 if use_global_numbering else 1 # Otherwise original local numbering
+        create_text = self.canvas.create_text; rack_item_tags = self._rack_item_tags
+        standard_props = self._TUBE_DRAW_PROPS["Standard"]
+        zoom = self.zoom_level; pan_x = self.pan_offset_x; pan_y = self.pan_offset_y # World -> canvas, hoisted out of the loop
+        radius_c = tube_diameter_w * zoom / 2; create_oval = self.canvas.create_oval; create_polygon = self.canvas.create_polygon
+        # Tube type -> (outline color, canvas width, square corner offsets or None for a circle), resolved once per type in
+        # this rack, so the loop picks its shape without comparing shape names. Circles are unchanged by rotation; squares
+        # share the rack's rotated corner offsets. Shapes other than "rectangle" draw as circles.
+        shape_by_type = {}
+        if tube_viewport is not None: # Centers within a tube diameter of the region, so no partly visible tube is dropped
+            clip_x0 = tube_viewport[0] - tube_diameter_w; clip_y0 = tube_viewport[1] - tube_diameter_w
+            clip_x1 = tube_viewport[2] + tube_diameter_w; clip_y1 = tube_viewport[3] + tube_diameter_w
+        # Tube centers are generated in tube index order, so they pair with the tube list directly
+        for (tube_idx, world_cx, world_cy, _), (tube_color, tube_type, tube_cue) in zip(tube_centers_world, tube_visuals):
+            if tube_viewport is not None and (world_cx < clip_x0 or world_cx > clip_x1 or world_cy < clip_y0 or world_cy > clip_y1): continue
+            canvas_cx = (world_cx - pan_x) * zoom; canvas_cy = (world_cy - pan_y) * zoom
+            tube_shape = shape_by_type.get(tube_type)
+            if tube_shape is None:
+                tube_outline_color, width_factor, shape_type = self._TUBE_DRAW_PROPS.get(tube_type, standard_props)
+                outline_width_c = max(1, self.DEFAULT_TUBE_OUTLINE_WIDTH_WORLD * width_factor * zoom)
+                corner_offsets = _square_corner_offsets(radius_c, angle) if shape_type == "rectangle" else None
+                tube_shape = shape_by_type[tube_type] = (tube_outline_color, outline_width_c, corner_offsets)
+            tube_outline_color, outline_width_c, corner_offsets = tube_shape
+            if corner_offsets is None:
+                create_oval(canvas_cx - radius_c, canvas_cy - radius_c, canvas_cx + radius_c, canvas_cy + radius_c,
+                            fill=tube_color, outline=tube_outline_color, width=outline_width_c, tags=rack_item_tags)
+            else:
+                dx0, dy0, dx1, dy1, dx2, dy2, dx3, dy3 = corner_offsets
+                create_polygon([dx0 + canvas_cx, dy0 + canvas_cy, dx1 + canvas_cx, dy1 + canvas_cy,
+                                dx2 + canvas_cx, dy2 + canvas_cy, dx3 + canvas_cx, dy3 + canvas_cy],
+                               fill=tube_color, outline=tube_outline_color, width=outline_width_c, tags=rack_item_tags)
+
+            if show_tube_numbers:
+                display_text = tube_cue or str(first_number + tube_idx) # If no cue, use number
+                create_text(canvas_cx, canvas_cy, text=display_text, fill="black", font=label_font, anchor=tk.CENTER,
+                            tags=(rack_element_tag, f"{number_tag_prefix}{tube_idx}") + rack_item_tags)
 
 if __name__ == '__main__':
     root = tk.Tk()